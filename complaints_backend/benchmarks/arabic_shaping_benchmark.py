@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+"""
+Arabic shaping throughput: uncached vs memoized vs batched
+
+The workload mimics report and SMS generation: status names, category
+names and template phrases repeated many times, mixed with unique long
+free-text descriptions that bypass the memo.
+
+Usage:
+    python benchmarks/arabic_shaping_benchmark.py [--strings 50000]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils import arabic_text
+
+LABELS = [
+    'جديدة', 'قيد المراجعة', 'مغلقة', 'مفتوحة', 'مرفوضة',
+    'جودة المنتج', 'الأسعار', 'التوصيل', 'خدمة العملاء', 'الضمان',
+    'تم تفعيل اشتراكك بنجاح! استمتع بكامل مزايا النظام.',
+    'ينتهي اشتراكك خلال 3 أيام، يرجى التجديد.',
+    'تمت إضافة تعليق جديد على شكواك',
+]
+DESCRIPTION = 'تم طلب البضاعة منذ أكثر من شهر ولم يتم تسليمها حتى الآن رغم التواصل المتكرر مع التاجر. '
+
+
+def workload(count, long_ratio=0.05):
+    rng = random.Random(42)
+    texts = []
+    for i in range(count):
+        if rng.random() < long_ratio:
+            texts.append(f'{DESCRIPTION * 3} رقم {i}')
+        else:
+            texts.append(rng.choice(LABELS))
+    return texts
+
+
+def timed(label, func, texts, baseline=None):
+    started = time.perf_counter()
+    func(texts)
+    elapsed = time.perf_counter() - started
+    speedup = f'{baseline / elapsed:>9.1f}x' if baseline else f'{"1.0x":>10}'
+    print(f'{label:<22}{elapsed * 1000:>10.1f} ms{len(texts) / elapsed:>14,.0f}/s {speedup}')
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--strings', type=int, default=50000)
+    args = parser.parse_args()
+
+    texts = workload(args.strings)
+    print(f'{args.strings} strings, {len(set(texts))} distinct')
+
+    baseline = timed('uncached', lambda items: [arabic_text._shape(text) for text in items], texts)
+    arabic_text.cache_clear()
+    timed('shape (cold memo)', lambda items: [arabic_text.shape(text) for text in items], texts, baseline)
+    timed('shape (warm memo)', lambda items: [arabic_text.shape(text) for text in items], texts, baseline)
+    arabic_text.cache_clear()
+    timed('shape_many', arabic_text.shape_many, texts, baseline)
+
+    info = arabic_text.cache_info()
+    print(f'memo entries: {info.currsize}/{info.maxsize} (long texts bypass the memo)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Backup storage: one gzip file per backup vs the deduplicating chunk repository
+
+Simulates a series of daily plain-SQL dumps of a growing complaints table:
+each day some rows are updated in place, mostly recent (still open)
+complaints, and new rows are appended, the way consecutive pg_dump outputs
+differ. Reports the total bytes kept on disk by each format and the chunked
+write throughput.
+
+Usage:
+    python benchmarks/backup_dedup_benchmark.py [--rows 200000] [--days 30] [--churn 0.002] [--open 0.05]
+"""
+import os
+import io
+import sys
+import time
+import gzip
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services.backup_repository import ChunkRepository
+
+STATUSES = ['جديدة', 'قيد المراجعة', 'محالة للجنة الفنية', 'مقبولة', 'مغلقة']
+
+
+def render_dump(rows):
+    lines = ['COPY public.complaints (complaint_id, title, status, description) FROM stdin;']
+    lines.extend(f'{i}\tشكوى رقم {i}\t{status}\t{description}' for i, (status, description) in enumerate(rows))
+    lines.append('\\.')
+    return '\n'.join(lines).encode()
+
+
+def next_day(rows, rng, churn, open_ratio):
+    open_from = int(len(rows) * (1 - open_ratio))
+    for _ in range(int(len(rows) * churn)):
+        # Nine in ten updates touch open complaints, the newest rows
+        index = rng.randrange(open_from, len(rows)) if rng.random() < 0.9 else rng.randrange(len(rows))
+        rows[index] = (rng.choice(STATUSES), rows[index][1])
+    rows.extend(
+        (STATUSES[0], f'وصف الشكوى {rng.getrandbits(32):08x}')
+        for _ in range(int(len(rows) * churn))
+    )
+
+
+def directory_size(path):
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--churn', type=float, default=0.002, help='fraction of rows updated, and appended, per day')
+    parser.add_argument('--open', type=float, default=0.05, help='fraction of newest rows still being worked on')
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    rows = [(rng.choice(STATUSES), f'وصف الشكوى {rng.getrandbits(32):08x}') for _ in range(args.rows)]
+    workdir = tempfile.mkdtemp()
+    repository = ChunkRepository(os.path.join(workdir, 'chunks'))
+
+    gzip_total = 0
+    raw_total = 0
+    chunked_seconds = 0.0
+    print(f'{"day":>4}{"dump":>12}{"gzip":>12}{"new chunks":>14}{"added":>12}')
+    try:
+        for day in range(args.days):
+            dump = render_dump(rows)
+            raw_total += len(dump)
+            gzip_size = len(gzip.compress(dump, 6))
+            gzip_total += gzip_size
+
+            started = time.perf_counter()
+            manifest = repository.write(io.BytesIO(dump), os.path.join(workdir, f'backup_{day:03d}.sql.manifest.json'))
+            chunked_seconds += time.perf_counter() - started
+
+            print(f'{day:>4}{len(dump) / 2**20:>10.1f}MB{gzip_size / 2**20:>10.1f}MB'
+                  f'{manifest["new_chunks"]:>8}/{len(manifest["chunks"]):<5}{manifest["stored_bytes"] / 2**20:>10.2f}MB')
+            next_day(rows, rng, args.churn, args.open)
+
+        chunked_total = directory_size(workdir)
+        print(f'\ngzip files:       {gzip_total / 2**20:>10.1f} MB')
+        print(f'chunk repository: {chunked_total / 2**20:>10.1f} MB ({gzip_total / chunked_total:.1f}x smaller)')
+        print(f'chunked writes:   {raw_total / 2**20 / chunked_seconds:>10.1f} MB/s')
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+PDF rendering throughput by pool size
+
+Renders the complaint report template with a representative context through
+pdf_renderer.RenderPool for each pool size and prints renders per second.
+Warm-up renders (one per worker) are excluded from the measurement.
+
+Usage:
+    python benchmarks/pdf_render_benchmark.py [--renders 48] [--sizes 1,2,4,8]
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from jinja2 import Environment, FileSystemLoader
+from src.services.pdf_renderer import RenderPool, render_html
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'templates')
+
+
+def sample_html():
+    """Complaint report HTML with ten comments and three attachments"""
+    template = Environment(loader=FileSystemLoader(TEMPLATES_DIR)).get_template('pdfs/complaint_report.html')
+    return template.render(
+        complaint={
+            'complaint_id': 'b3f1c2d4-0000-4000-8000-000000000001',
+            'title': 'تأخر في تسليم البضاعة',
+            'description': 'تم طلب البضاعة منذ أكثر من شهر ولم يتم تسليمها حتى الآن. ' * 8,
+            'trader_name': 'محمد أحمد',
+            'category_name': 'التوصيل',
+            'status_name': 'قيد المراجعة',
+            'priority': 'High',
+            'submitted_at': '2026-01-05 10:30',
+            'last_updated_at': '2026-01-12 14:00',
+            'assigned_committee_member_name': 'علي حسن',
+            'resolution_details': '',
+            'closed_at': ''
+        },
+        comments=[
+            {
+                'created_at': f'2026-01-{6 + i:02d} 09:00',
+                'author_name': 'علي حسن',
+                'author_role': 'Technical Committee',
+                'comment_text': 'تمت مراسلة التاجر وطلب توضيح حول موعد التسليم.'
+            }
+            for i in range(10)
+        ],
+        attachments=[
+            {'file_name': f'receipt_{i}.jpg', 'file_type': 'image/jpeg', 'uploaded_at': '2026-01-05 10:31'}
+            for i in range(3)
+        ],
+        processing_days=7,
+        current_date='2026-01-12 14:00',
+        current_year=2026
+    )
+
+
+def measure(pool_size, html, renders):
+    pool = RenderPool(workers=pool_size, max_pending=renders)
+    try:
+        # Start and warm every worker before timing
+        for future in [pool.submit(html) for _ in range(pool_size)]:
+            pool.result(future)
+
+        started = time.perf_counter()
+        futures = [pool.submit(html) for _ in range(renders)]
+        for future in futures:
+            pool.result(future)
+        return renders / (time.perf_counter() - started)
+    finally:
+        pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    cores = os.cpu_count() or 1
+    default_sizes = sorted({1, 2, 4, cores} & set(range(1, cores + 1)))
+    parser.add_argument('--renders', type=int, default=48)
+    parser.add_argument('--sizes', default=','.join(str(size) for size in default_sizes))
+    args = parser.parse_args()
+
+    html = sample_html()
+
+    render_html(html)
+    started = time.perf_counter()
+    for _ in range(5):
+        render_html(html)
+    inline = 5 / (time.perf_counter() - started)
+
+    print(f'CPU cores: {cores}, renders per measurement: {args.renders}')
+    print(f'{"mode":<12}{"renders/sec":>14}{"speedup":>10}')
+    print(f'{"inline":<12}{inline:>14.2f}{1.0:>10.2f}')
+    for size in (int(value) for value in args.sizes.split(',')):
+        rate = measure(size, html, args.renders)
+        print(f'{f"pool x{size}":<12}{rate:>14.2f}{rate / inline:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
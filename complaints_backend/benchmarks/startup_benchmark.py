@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Worker startup cost: import time and memory baseline of the application
+
+Each run imports src.main in a fresh interpreter with `-X importtime` (as a
+gunicorn worker does on boot) and reports the wall time of the import, the
+peak RSS of the process and which heavy dependencies were loaded. The
+'eager' row imports the heavy dependencies up front, i.e. the cost every
+worker paid before they were loaded lazily.
+
+Usage:
+    python benchmarks/startup_benchmark.py [--runs 5] [--top 15]
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = [
+    'weasyprint', 'matplotlib', 'pandas', 'numpy', 'openpyxl', 'pyarrow',
+    'twilio', 'qrcode', 'PIL', 'pyotp', 'arabic_reshaper', 'bidi', 'boto3'
+]
+
+PROBE = """
+import sys, time, json, resource, importlib
+sys.path.insert(0, {backend_dir!r})
+started = time.perf_counter()
+for name in {preload!r}:
+    try:
+        importlib.import_module(name)
+    except Exception:
+        pass
+import src.main
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    'seconds': elapsed,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'loaded': [name for name in {heavy!r} if name in sys.modules]
+}}))
+"""
+
+
+def run_once(preload):
+    code = PROBE.format(backend_dir=BACKEND_DIR, preload=preload, heavy=HEAVY_MODULES)
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        capture_output=True, text=True, cwd=BACKEND_DIR, check=True
+    )
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+
+    # -X importtime lines: "import time: self [us] | cumulative | imported package"
+    cumulative = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, timing, name = line.split('|')
+        cumulative[name.strip()] = int(timing)
+    stats['cumulative_us'] = cumulative
+    return stats
+
+
+def measure(label, preload, runs):
+    samples = [run_once(preload) for _ in range(runs)]
+    seconds = statistics.median(sample['seconds'] for sample in samples)
+    rss_mb = statistics.median(sample['max_rss_kb'] for sample in samples) / 1024
+    print(f'{label:<8}{seconds * 1000:>12.0f} ms{rss_mb:>12.1f} MB   loaded: {", ".join(samples[-1]["loaded"]) or "-"}')
+    return samples[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--top', type=int, default=15, help='slowest top-level imports to list')
+    args = parser.parse_args()
+
+    print(f'{"mode":<8}{"import time":>15}{"peak RSS":>15}')
+    lazy = measure('lazy', [], args.runs)
+    measure('eager', HEAVY_MODULES, args.runs)
+
+    print(f'\nSlowest imports under src.main (lazy, cumulative):')
+    slowest = sorted(lazy['cumulative_us'].items(), key=lambda item: -item[1])[:args.top]
+    for name, micros in slowest:
+        print(f'  {micros / 1000:>9.1f} ms  {name}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Migration Script: Add maintained unread-notification counter to users
+Created: 2026-10-19
+Description: Adds users.unread_notifications_count and backfills it from the notifications table
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text, inspect
+from src.database.db import db
+from src.main import app
+from src.services.scheduler import reconcile_unread_notification_counts
+
+def column_exists(table_name, column_name):
+    """Check if a column exists in a table"""
+    columns = inspect(db.engine).get_columns(table_name)
+    return column_name in [column['name'] for column in columns]
+
+def run_migration():
+    """Execute migration to add and backfill the unread counter"""
+    
+    with app.app_context():
+        try:
+            print("Starting migration: Adding unread notifications counter...")
+            
+            print("\n1. Checking users table...")
+            
+            if not column_exists('users', 'unread_notifications_count'):
+                db.session.execute(text("""
+                    ALTER TABLE users ADD COLUMN unread_notifications_count INTEGER NOT NULL DEFAULT 0
+                """))
+                db.session.commit()
+                print("   ✓ Added 'unread_notifications_count' column to users")
+            else:
+                print("   - 'unread_notifications_count' column already exists")
+            
+            print("\n2. Creating indexes...")
+            
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS idx_notifications_user_unread ON notifications(user_id, is_read)
+            """))
+            db.session.commit()
+            print("   ✓ Created index: idx_notifications_user_unread")
+            
+            print("\n3. Backfilling counters...")
+            
+            result = reconcile_unread_notification_counts()
+            if not result['success']:
+                raise RuntimeError(result['error'])
+            print(f"   ✓ Backfilled {result['repaired_count']} users")
+            
+            print("\n✅ Migration completed successfully!")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n❌ Migration failed: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    run_migration()
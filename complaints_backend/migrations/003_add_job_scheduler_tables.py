@@ -0,0 +1,45 @@
+"""
+Migration Script: Add job scheduler tables
+Created: 2026-10-19
+Description: Creates job_runs (scheduler run history) and job_locks (lock leases used without Redis)
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect
+from src.database.db import db
+from src.main import app
+from src.models.complaint import JobRun, JobLock
+
+def table_exists(table_name):
+    """Check if a table exists"""
+    return table_name in inspect(db.engine).get_table_names()
+
+def run_migration():
+    """Execute migration to create the scheduler tables"""
+    
+    with app.app_context():
+        try:
+            print("Starting migration: Adding job scheduler tables...")
+            
+            print("\n1. Creating tables...")
+            
+            for model in (JobRun, JobLock):
+                table_name = model.__tablename__
+                if not table_exists(table_name):
+                    model.__table__.create(db.engine)
+                    print(f"   ✓ Created table: {table_name}")
+                else:
+                    print(f"   - '{table_name}' table already exists")
+            
+            print("\n✅ Migration completed successfully!")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n❌ Migration failed: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    run_migration()
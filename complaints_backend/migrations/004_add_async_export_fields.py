@@ -0,0 +1,64 @@
+"""
+Migration Script: Add asynchronous export fields to exports
+Created: 2026-10-19
+Description: Adds fingerprint, format, filters, file path, progress and outcome columns to exports
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text, inspect
+from src.database.db import db
+from src.main import app
+
+def column_exists(table_name, column_name):
+    """Check if a column exists in a table"""
+    columns = inspect(db.engine).get_columns(table_name)
+    return column_name in [column['name'] for column in columns]
+
+COLUMNS = [
+    ('fingerprint', 'VARCHAR(64)'),
+    ('export_format', 'VARCHAR(20)'),
+    ('filters', 'TEXT'),
+    ('file_path', 'VARCHAR(500)'),
+    ('total_rows', 'INTEGER'),
+    ('rows_written', 'INTEGER DEFAULT 0'),
+    ('error_message', 'TEXT'),
+    ('completed_at', 'DATETIME'),
+]
+
+def run_migration():
+    """Execute migration to add asynchronous export columns"""
+    
+    with app.app_context():
+        try:
+            print("Starting migration: Adding asynchronous export fields...")
+            
+            print("\n1. Checking exports table...")
+            
+            for column_name, column_type in COLUMNS:
+                if not column_exists('exports', column_name):
+                    db.session.execute(text(f"ALTER TABLE exports ADD COLUMN {column_name} {column_type}"))
+                    db.session.commit()
+                    print(f"   ✓ Added '{column_name}' column to exports")
+                else:
+                    print(f"   - '{column_name}' column already exists")
+            
+            print("\n2. Creating indexes...")
+            
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_exports_fingerprint ON exports(fingerprint)
+            """))
+            db.session.commit()
+            print("   ✓ Created index: ix_exports_fingerprint")
+            
+            print("\n✅ Migration completed successfully!")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n❌ Migration failed: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    run_migration()
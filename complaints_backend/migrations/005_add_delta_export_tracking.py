@@ -0,0 +1,57 @@
+"""
+Migration Script: Add delta export tracking
+Created: 2026-10-19
+Description: Creates the tombstones table and indexes the change timestamps scanned by delta exports
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text, inspect
+from src.database.db import db
+from src.main import app
+from src.models.complaint import Tombstone
+
+def table_exists(table_name):
+    """Check if a table exists"""
+    return table_name in inspect(db.engine).get_table_names()
+
+INDEXES = [
+    ('ix_complaints_last_updated_at', 'complaints', 'last_updated_at'),
+    ('ix_payments_created_at', 'payments', 'created_at'),
+    ('ix_payments_reviewed_at', 'payments', 'reviewed_at'),
+    ('ix_subscriptions_updated_at', 'subscriptions', 'updated_at'),
+]
+
+def run_migration():
+    """Execute migration to add delta export tracking"""
+    
+    with app.app_context():
+        try:
+            print("Starting migration: Adding delta export tracking...")
+            
+            print("\n1. Creating tables...")
+            
+            if not table_exists(Tombstone.__tablename__):
+                Tombstone.__table__.create(db.engine)
+                print(f"   ✓ Created table: {Tombstone.__tablename__}")
+            else:
+                print(f"   - '{Tombstone.__tablename__}' table already exists")
+            
+            print("\n2. Creating indexes...")
+            
+            for index_name, table_name, column_name in INDEXES:
+                db.session.execute(text(f"CREATE INDEX IF NOT EXISTS {index_name} ON {table_name}({column_name})"))
+                db.session.commit()
+                print(f"   ✓ Created index: {index_name}")
+            
+            print("\n✅ Migration completed successfully!")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n❌ Migration failed: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    run_migration()
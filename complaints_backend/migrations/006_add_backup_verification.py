@@ -0,0 +1,71 @@
+"""
+Migration Script: Add backup verification tracking
+Created: 2026-10-19
+Description: Adds verification columns to backup_logs and creates backup_restore_tests (restore drills and their RTO)
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text, inspect
+from src.database.db import db
+from src.main import app
+from src.models.complaint import BackupRestoreTest
+
+def table_exists(table_name):
+    """Check if a table exists"""
+    return table_name in inspect(db.engine).get_table_names()
+
+def column_exists(table_name, column_name):
+    """Check if a column exists in a table"""
+    columns = inspect(db.engine).get_columns(table_name)
+    return column_name in [column['name'] for column in columns]
+
+COLUMNS = [
+    ('verified_at', 'TIMESTAMP'),
+    ('verification_status', 'VARCHAR(20)'),
+]
+
+def run_migration():
+    """Execute migration to add backup verification tracking"""
+    
+    with app.app_context():
+        try:
+            print("Starting migration: Adding backup verification tracking...")
+            
+            print("\n1. Checking backup_logs table...")
+            
+            for column_name, column_type in COLUMNS:
+                if not column_exists('backup_logs', column_name):
+                    db.session.execute(text(f"ALTER TABLE backup_logs ADD COLUMN {column_name} {column_type}"))
+                    db.session.commit()
+                    print(f"   ✓ Added '{column_name}' column to backup_logs")
+                else:
+                    print(f"   - '{column_name}' column already exists")
+            
+            print("\n2. Creating tables...")
+            
+            if not table_exists(BackupRestoreTest.__tablename__):
+                BackupRestoreTest.__table__.create(db.engine)
+                print(f"   ✓ Created table: {BackupRestoreTest.__tablename__}")
+            else:
+                print(f"   - '{BackupRestoreTest.__tablename__}' table already exists")
+            
+            print("\n3. Creating indexes...")
+            
+            db.session.execute(text("""
+                CREATE INDEX IF NOT EXISTS ix_backup_logs_filename ON backup_logs(filename)
+            """))
+            db.session.commit()
+            print("   ✓ Created index: ix_backup_logs_filename")
+            
+            print("\n✅ Migration completed successfully!")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n❌ Migration failed: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,44 @@
+"""
+Migration Script: Add export job lease
+Created: 2026-10-19
+Description: Adds started_at to exports, so exports whose job died are re-enqueued instead of staying running forever
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import text, inspect
+from src.database.db import db
+from src.main import app
+
+def column_exists(table_name, column_name):
+    """Check if a column exists in a table"""
+    columns = inspect(db.engine).get_columns(table_name)
+    return column_name in [column['name'] for column in columns]
+
+def run_migration():
+    """Execute migration to add the export job lease"""
+    
+    with app.app_context():
+        try:
+            print("Starting migration: Adding export job lease...")
+            
+            print("\n1. Checking exports table...")
+            
+            if not column_exists('exports', 'started_at'):
+                db.session.execute(text("ALTER TABLE exports ADD COLUMN started_at TIMESTAMP"))
+                db.session.commit()
+                print("   ✓ Added 'started_at' column to exports")
+            else:
+                print("   - 'started_at' column already exists")
+            
+            print("\n✅ Migration completed successfully!")
+            
+        except Exception as e:
+            db.session.rollback()
+            print(f"\n❌ Migration failed: {str(e)}")
+            raise
+
+if __name__ == "__main__":
+    run_migration()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Continuous replication of the SQLite database to object storage
+Run with: python replicate.py
+
+Ships the write-ahead log of the database in DATABASE_URL (default
+src/database/app.db) to STORAGE_BACKEND every few seconds, with periodic
+snapshots, so losing the disk costs seconds of writes instead of everything
+since the nightly backup. Run exactly one replicator per database, next to
+the app. SIGTERM/SIGINT ship the last frames and stop.
+
+Restore, optionally to a point in time (UTC):
+    python replicate.py restore <target.db> [--timestamp 2026-01-31T12:00:00]
+    python replicate.py generations
+
+Configuration:
+    SQLITE_REPLICATION_PREFIX             Key prefix in the storage backend (default: replication)
+    SQLITE_REPLICATION_INTERVAL           Seconds between WAL shipments (default: 1)
+    SQLITE_REPLICATION_SNAPSHOT_INTERVAL  Seconds between full snapshots (default: 86400)
+    SQLITE_REPLICATION_RETENTION_HOURS    Point-in-time restore window (default: 72)
+    SQLITE_REPLICATION_CHECKPOINT_PAGES   WAL frames that trigger a checkpoint (default: 1000)
+"""
+import os
+import sys
+import signal
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.core.storage import get_storage_backend
+from src.services.backup_service import BackupService
+from src.services.sqlite_replication import SQLiteReplicator, list_generations, restore
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command')
+    restore_parser = commands.add_parser('restore', help='rebuild the database from the replica')
+    restore_parser.add_argument('target', help='path of the database file to write')
+    restore_parser.add_argument('--timestamp', type=datetime.fromisoformat, help='UTC point in time (default: latest)')
+    restore_parser.add_argument('--force', action='store_true', help='overwrite an existing target')
+    commands.add_parser('generations', help='list the replicated generations')
+    args = parser.parse_args()
+
+    storage = get_storage_backend()
+    prefix = os.environ.get('SQLITE_REPLICATION_PREFIX', 'replication')
+
+    if args.command == 'restore':
+        if os.path.exists(args.target) and not args.force:
+            print(f'{args.target} exists; stop the app and pass --force to overwrite it')
+            sys.exit(1)
+        result = restore(storage, args.target, args.timestamp, prefix)
+        print(f'Restored {args.target} from generation {result["generation"]}: '
+              f'snapshot + {result["segments"]} WAL segments, as of {result["restored_to"].isoformat()} UTC')
+        return
+
+    if args.command == 'generations':
+        for generation, objects in list_generations(storage, prefix).items():
+            print(f'{generation}: {len(objects["snapshots"])} snapshots, {len(objects["wal"])} WAL segments')
+        return
+
+    backups = BackupService()
+    if not backups._is_sqlite():
+        print('DATABASE_URL is not a SQLite database; PostgreSQL uses pg_dump backups')
+        sys.exit(1)
+
+    replicator = SQLiteReplicator(backups._sqlite_path(), storage)
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stopping.append(signum))
+    signal.signal(signal.SIGINT, lambda signum, frame: stopping.append(signum))
+
+    print(f'Replicating {replicator.db_path} to {prefix}/ every {replicator.interval:g}s')
+    replicator.run(lambda: bool(stopping))
+    print('Replication stopped')
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        print(f'Replication failed: {str(e)}')
+        sys.exit(1)
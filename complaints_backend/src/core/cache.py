@@ -3,25 +3,14 @@ import os
 import json
 from datetime import datetime, timedelta
 
-try:
-    from redis import Redis
-    redis_url = os.environ.get('REDIS_URL', '')
-    if redis_url:
-        redis_client = Redis.from_url(redis_url)
-        redis_client.ping()
-        use_redis = True
-    else:
-        use_redis = False
-        redis_client = None
-except:
-    use_redis = False
-    redis_client = None
+from src.core.redis_connection import get_redis
 
 _memory_cache = {}
 
 def cache_get(key):
     """Get value from cache"""
-    if use_redis and redis_client:
+    redis_client = get_redis()
+    if redis_client:
         try:
             value = redis_client.get(key)
             if value:
@@ -40,7 +29,8 @@ def cache_get(key):
 
 def cache_set(key, value, timeout=3600):
     """Set value in cache with timeout in seconds"""
-    if use_redis and redis_client:
+    redis_client = get_redis()
+    if redis_client:
         try:
             redis_client.setex(key, timeout, json.dumps(value))
         except:
@@ -55,7 +45,8 @@ def cache_clear_pattern(pattern):
     """Clear cache keys matching pattern"""
     cleared = 0
     
-    if use_redis and redis_client:
+    redis_client = get_redis()
+    if redis_client:
         try:
             keys = redis_client.keys(pattern)
             if keys:
@@ -75,7 +66,8 @@ def cache_clear_pattern(pattern):
 
 def invalidate_cache_key(key):
     """Delete a specific cache key"""
-    if use_redis and redis_client:
+    redis_client = get_redis()
+    if redis_client:
         try:
             redis_client.delete(key)
         except:
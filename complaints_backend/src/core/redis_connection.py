@@ -0,0 +1,60 @@
+"""
+Per-process Redis clients and post-fork hooks
+
+Nothing connects at import time. A client is created, and checked with a
+single PING, the first time a process needs it. After a fork (gunicorn
+--preload workers, RQ work horses) the child forgets the parent's clients
+and connects again on first use, so no socket is shared between processes.
+Modules holding their own per-process state register an `on_fork` callback.
+"""
+import os
+import threading
+from redis import Redis
+
+REDIS_URL = os.environ.get('REDIS_URL', '')
+
+_lock = threading.Lock()
+_clients = {}
+_fork_callbacks = []
+
+
+def get_redis(decode_responses=False):
+    """
+    Redis client of this process
+
+    Returns:
+        Redis or None when REDIS_URL is unset or the server did not answer
+        (callers fall back to their in-memory implementation)
+    """
+    if not REDIS_URL:
+        return None
+
+    with _lock:
+        if decode_responses not in _clients:
+            try:
+                client = Redis.from_url(REDIS_URL, decode_responses=decode_responses)
+                client.ping()
+            except Exception as e:
+                print(f'Redis connection failed, using in-memory fallback: {str(e)}')
+                client = None
+            _clients[decode_responses] = client
+        return _clients[decode_responses]
+
+
+def on_fork(callback):
+    """Register a callback run in the child process after every fork"""
+    _fork_callbacks.append(callback)
+    return callback
+
+
+def _after_fork_in_child():
+    global _lock
+    # Another thread of the parent may have held the lock while forking
+    _lock = threading.Lock()
+    # Drop, don't close: the sockets still belong to the parent
+    _clients.clear()
+    for callback in _fork_callbacks:
+        callback()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
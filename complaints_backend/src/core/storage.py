@@ -1,6 +1,6 @@
 import os
 from abc import ABC, abstractmethod
-from typing import Optional, BinaryIO
+from typing import Optional, BinaryIO, List
 from werkzeug.utils import secure_filename
 import uuid
 
@@ -21,6 +21,24 @@ class StorageBackend(ABC):
     @abstractmethod
     def exists(self, filepath: str) -> bool:
         pass
+    
+    @abstractmethod
+    def put(self, data: bytes, key: str) -> str:
+        """Store data under an exact key, replacing any existing object"""
+        pass
+    
+    @abstractmethod
+    def open(self, key: str) -> BinaryIO:
+        pass
+    
+    @abstractmethod
+    def list(self, prefix: str = '') -> List[str]:
+        """Keys starting with prefix"""
+        pass
+    
+    def local_path(self, key: str) -> Optional[str]:
+        """Filesystem path of a key when the backend is local, else None"""
+        return None
 
 class LocalStorage(StorageBackend):
     
@@ -60,6 +78,35 @@ class LocalStorage(StorageBackend):
     def exists(self, filepath: str) -> bool:
         full_path = os.path.join(self.base_path, filepath)
         return os.path.exists(full_path)
+    
+    def put(self, data: bytes, key: str) -> str:
+        full_path = os.path.join(self.base_path, key)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        
+        # Write then rename so readers never see a partial object
+        tmp_path = f'{full_path}.{uuid.uuid4().hex[:8]}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, full_path)
+        
+        return key
+    
+    def open(self, key: str) -> BinaryIO:
+        return open(os.path.join(self.base_path, key), 'rb')
+    
+    def list(self, prefix: str = '') -> List[str]:
+        folder, _ = os.path.split(prefix)
+        root = os.path.join(self.base_path, folder)
+        keys = []
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                key = os.path.relpath(os.path.join(dirpath, filename), self.base_path).replace(os.sep, '/')
+                if key.startswith(prefix) and not key.endswith('.tmp'):
+                    keys.append(key)
+        return sorted(keys)
+    
+    def local_path(self, key: str) -> Optional[str]:
+        return os.path.abspath(os.path.join(self.base_path, key))
 
 class S3Storage(StorageBackend):
     
@@ -119,6 +166,20 @@ class S3Storage(StorageBackend):
             return True
         except Exception:
             return False
+    
+    def put(self, data: bytes, key: str) -> str:
+        self.s3_client.put_object(Bucket=self.bucket_name, Key=key, Body=data)
+        return key
+    
+    def open(self, key: str) -> BinaryIO:
+        return self.s3_client.get_object(Bucket=self.bucket_name, Key=key)['Body']
+    
+    def list(self, prefix: str = '') -> List[str]:
+        keys = []
+        paginator = self.s3_client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket_name, Prefix=prefix):
+            keys.extend(item['Key'] for item in page.get('Contents', []))
+        return sorted(keys)
 
 def get_storage_backend() -> StorageBackend:
     storage_type = os.getenv('STORAGE_BACKEND', 'local').lower()
@@ -1,7 +1,9 @@
 #!/usr/bin/env python3
 """
 Automated Backup Tasks
-Runs daily database backups and cleanup
+Runs daily database backups and cleanup through the job scheduler, so it
+never overlaps another backup run and skips a slot already executed by the
+in-app scheduler (SCHEDULER_ENABLED=true)
 
 Usage:
     python complaints_backend/src/cron/backup_tasks.py
@@ -21,6 +23,7 @@ sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 from flask import Flask
 from src.database.db import db
 from src.services.backup_service import BackupService
+from src.services.job_scheduler import run_latest_slot
 
 def setup_app():
     """Setup Flask app for standalone execution"""
@@ -51,22 +54,26 @@ def run_backup_job():
         print(f"Timestamp: {os.popen('date').read().strip()}")
         print("=" * 60)
         
-        backup_service = BackupService()
+        print("\n[1/3] Creating database backup and cleaning up old backups...")
+        outcome = run_latest_slot('database_backup')
         
-        print("\n[1/3] Creating database backup...")
-        backup_result = backup_service.create_backup()
+        if outcome.get('skipped'):
+            print(f"- Skipped: {outcome['error']}")
+            return 0
         
-        if backup_result['success']:
-            print(f"✓ Backup created successfully")
-            print(f"  - Filename: {backup_result['filename']}")
-            print(f"  - Size: {backup_result['size_bytes'] / (1024 * 1024):.2f} MB")
-            print(f"  - Checksum: {backup_result['checksum'][:16]}...")
-        else:
-            print(f"✗ Backup failed: {backup_result['error']}")
+        result = outcome['result']
+        if not result['success']:
+            print(f"✗ Backup failed: {result['error']}")
             return 1
         
-        print("\n[2/3] Cleaning up old backups...")
-        cleanup_result = backup_service.cleanup_old_backups()
+        backup_result = result['backup']
+        print(f"✓ Backup created successfully")
+        print(f"  - Filename: {backup_result['filename']}")
+        print(f"  - Size: {backup_result['size_bytes'] / (1024 * 1024):.2f} MB")
+        print(f"  - Checksum: {backup_result['checksum'][:16]}...")
+        
+        print("\n[2/3] Cleanup results...")
+        cleanup_result = result['cleanup']
         
         if cleanup_result['success']:
             print(f"✓ Cleanup completed")
@@ -76,7 +83,7 @@ def run_backup_job():
             print(f"⚠ Cleanup had issues: {cleanup_result.get('error', 'Unknown error')}")
         
         print("\n[3/3] Listing current backups...")
-        backups = backup_service.list_backups()
+        backups = BackupService().list_backups()
         print(f"✓ Total backups: {len(backups)}")
         
         if backups:
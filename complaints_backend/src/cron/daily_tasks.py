@@ -3,6 +3,10 @@
 وظيفة مجدولة (Scheduler/Cron) يومية:
 - إرسال تذكيرات انتهاء (D-14, D-7, D-3) داخل التطبيق
 - تغيير الاشتراكات المنتهية إلى expired
+- مطابقة عدادات الإشعارات غير المقروءة
+
+يُنفَّذ عبر المجدول الداخلي (job_scheduler) تحت قفل موزّع، فلا يتكرر التشغيل
+إذا نفّذ المجدول الداخلي (SCHEDULER_ENABLED=true) نفس الموعد مسبقاً
 
 تشغيل يدوي:
     python complaints_backend/src/cron/daily_tasks.py
@@ -21,13 +25,14 @@ import os
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
 
 from src.database.db import db
-from src.services.scheduler import run_daily_tasks
+from src.services.job_scheduler import run_latest_slot
 from flask import Flask
 
 def setup_app():
     """إعداد Flask app للتشغيل خارج السياق الرئيسي"""
     app = Flask(__name__)
-    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), '..', 'database', 'app.db')}"
+    # نفس قاعدة بيانات التطبيق، فهي تحمل أقفال المهام وسجل تشغيلها
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or f"sqlite:///{os.path.join(os.path.dirname(__file__), '..', 'database', 'app.db')}"
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     db.init_app(app)
     return app
@@ -38,7 +43,13 @@ def main():
     
     with app.app_context():
         print("بدء تشغيل المهام اليومية...")
-        results = run_daily_tasks()
+        outcome = run_latest_slot('daily_tasks')
+        
+        if outcome.get('skipped'):
+            print(f"- تم تخطي التنفيذ: {outcome['error']}")
+            return
+        
+        results = outcome['result']
         
         print("\n=== نتائج التنفيذ ===")
         
@@ -56,6 +67,15 @@ def main():
         else:
             print(f"✗ خطأ في إرسال التذكيرات: {reminder_result.get('error', 'خطأ غير معروف')}")
         
+        # نتائج مطابقة عدادات الإشعارات غير المقروءة
+        unread_result = results.get('unread_counts', {})
+        if unread_result.get('success'):
+            print(f"✓ تم إصلاح {unread_result.get('repaired_count', 0)} عداد إشعارات غير مقروءة")
+        else:
+            print(f"✗ خطأ في مطابقة عدادات الإشعارات: {unread_result.get('error', 'خطأ غير معروف')}")
+        
+        run = outcome['run']
+        print(f"\nالمدة: {run['duration_ms']} ms - السجلات المتأثرة: {run['rows_affected']}")
         print("\n=== اكتمل التنفيذ ===")
 
 if __name__ == '__main__':
@@ -1,3 +1,7 @@
+import os
 from flask_sqlalchemy import SQLAlchemy
 
 db = SQLAlchemy()
+
+# Used when DATABASE_URL is unset, by the app and by background job apps alike
+DEFAULT_DATABASE_URI = f"sqlite:///{os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.db')}"
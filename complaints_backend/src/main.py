@@ -1,5 +1,6 @@
 import os
 import sys
+import weakref
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
@@ -7,7 +8,7 @@ from flask import Flask, send_from_directory
 from flask_cors import CORS
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
-from src.database.db import db
+from src.database.db import db, DEFAULT_DATABASE_URI
 from src.routes.user import user_bp
 from src.routes.complaint import complaint_bp
 from src.routes.auth import auth_bp
@@ -19,35 +20,59 @@ from src.routes.analytics import analytics_bp
 from src.routes.analytics_api import analytics_api_bp
 from src.routes.security_api import security_api_bp
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = os.environ.get('SESSION_SECRET', 'dev-secret-key-please-change-in-production')
-app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_FILE_SIZE_MB', 5)) * 1024 * 1024
+from src.core.redis_connection import on_fork
 
-app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
-app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
-app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', 'true').lower() == 'true'
-app.config['MAIL_USE_SSL'] = os.environ.get('MAIL_USE_SSL', 'false').lower() == 'true'
-app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME', '')
-app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD', '')
-app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER', os.environ.get('MAIL_USERNAME', ''))
+# Apps created in this process, whose engines a forked child must not reuse
+_apps = weakref.WeakSet()
 
-cors_origins = os.environ.get('CORS_ORIGINS', '*').split(',')
-CORS(app, origins=cors_origins, supports_credentials=True)
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'migrations')
 
-redis_url = os.environ.get('REDIS_URL', '')
-storage_uri = f'redis://{redis_url}' if redis_url and not redis_url.startswith('redis://') else (redis_url if redis_url else 'memory://')
 
-limiter = Limiter(
-    app=app,
-    key_func=get_remote_address,
-    storage_uri=storage_uri,
-    default_limits=[os.environ.get('RATELIMIT_DEFAULT', '200 per day;50 per hour')],
-    storage_options={'socket_connect_timeout': 30, 'socket_timeout': 30} if redis_url else {}
-)
+def _load_config(app, config=None):
+    app.config['SECRET_KEY'] = os.environ.get('SESSION_SECRET', 'dev-secret-key-please-change-in-production')
+    app.config['MAX_CONTENT_LENGTH'] = int(os.environ.get('MAX_FILE_SIZE_MB', 5)) * 1024 * 1024
+
+    app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
+    app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
+    app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', 'true').lower() == 'true'
+    app.config['MAIL_USE_SSL'] = os.environ.get('MAIL_USE_SSL', 'false').lower() == 'true'
+    app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME', '')
+    app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD', '')
+    app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER', os.environ.get('MAIL_USERNAME', ''))
+
+    database_url = os.environ.get('DATABASE_URL')
+    if database_url:
+        app.config['SQLALCHEMY_DATABASE_URI'] = database_url
+        app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+            "pool_recycle": 300,
+            "pool_pre_ping": True,
+        }
+    else:
+        app.config['SQLALCHEMY_DATABASE_URI'] = DEFAULT_DATABASE_URI
+
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['SCHEDULER_ENABLED'] = os.environ.get('SCHEDULER_ENABLED', 'false').lower() == 'true'
+
+    if config:
+        app.config.update(config)
+
+
+def _init_limiter(app):
+    redis_url = os.environ.get('REDIS_URL', '')
+    storage_uri = f'redis://{redis_url}' if redis_url and not redis_url.startswith('redis://') else (redis_url if redis_url else 'memory://')
+
+    # The storage client connects on first hit, in the process serving it
+    limiter = Limiter(
+        app=app,
+        key_func=get_remote_address,
+        storage_uri=storage_uri,
+        default_limits=[os.environ.get('RATELIMIT_DEFAULT', '200 per day;50 per hour')],
+        storage_options={'socket_connect_timeout': 30, 'socket_timeout': 30} if redis_url else {}
+    )
+    app.limiter = limiter  # type: ignore
+    return limiter
 
-app.limiter = limiter  # type: ignore
 
-@app.after_request
 def add_security_headers(response):
     """Add security headers to all responses"""
     response.headers['X-Content-Type-Options'] = 'nosniff'
@@ -59,52 +84,130 @@ def add_security_headers(response):
     response.headers['Permissions-Policy'] = 'geolocation=(), microphone=(), camera=()'
     return response
 
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(complaint_bp, url_prefix='/api')
-app.register_blueprint(auth_bp, url_prefix='/api')
-app.register_blueprint(subscription_bp, url_prefix='/api')
-app.register_blueprint(subscription_v2_bp, url_prefix='/api')
-app.register_blueprint(subscription_api_bp)
-app.register_blueprint(export_bp, url_prefix='/api')
-app.register_blueprint(analytics_bp, url_prefix='/api')
-app.register_blueprint(analytics_api_bp)
-app.register_blueprint(security_api_bp)
-
-database_url = os.environ.get('DATABASE_URL')
-if database_url:
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-        "pool_recycle": 300,
-        "pool_pre_ping": True,
-    }
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-
-from src.services.notification_service import mail
-mail.init_app(app)
-
-with app.app_context():
-    db.create_all()
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
-            return "Static folder not configured", 404
-
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
+
+def _register_blueprints(app):
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(complaint_bp, url_prefix='/api')
+    app.register_blueprint(auth_bp, url_prefix='/api')
+    app.register_blueprint(subscription_bp, url_prefix='/api')
+    app.register_blueprint(subscription_v2_bp, url_prefix='/api')
+    app.register_blueprint(subscription_api_bp)
+    app.register_blueprint(export_bp, url_prefix='/api')
+    app.register_blueprint(analytics_bp, url_prefix='/api')
+    app.register_blueprint(analytics_api_bp)
+    app.register_blueprint(security_api_bp)
+
+
+def _register_static(app):
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        static_folder_path = app.static_folder
+        if static_folder_path is None:
+                return "Static folder not configured", 404
+
+        if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
+            return send_from_directory(static_folder_path, path)
         else:
-            return "index.html not found", 404
+            index_path = os.path.join(static_folder_path, 'index.html')
+            if os.path.exists(index_path):
+                return send_from_directory(static_folder_path, 'index.html')
+            else:
+                return "index.html not found", 404
+
+
+def run_migrations(app):
+    """
+    Create missing tables, then apply migrations/NNN_*.py in order
+
+    Every migration is idempotent, so this runs on each deploy before the
+    web workers start.
+    """
+    import glob
+    import importlib.util
+
+    with app.app_context():
+        db.create_all()
+
+    for path in sorted(glob.glob(os.path.join(MIGRATIONS_DIR, '[0-9][0-9][0-9]_*.py'))):
+        name = os.path.splitext(os.path.basename(path))[0]
+        spec = importlib.util.spec_from_file_location(f'migrations.{name}', path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        print(f'Applying {name}...')
+        module.run_migration()
+
+
+def _register_commands(app):
+    @app.cli.command('migrate')
+    def migrate_command():
+        """Create the schema and apply pending migrations."""
+        run_migrations(app)
+
+
+@on_fork
+def _reset_after_fork():
+    # Pooled connections were opened by the parent; leave them to it and let
+    # the child open its own
+    for app in list(_apps):
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+
+
+def start_background_tasks(app):
+    """
+    Start the in-app scheduler when SCHEDULER_ENABLED
+
+    Called by the process that serves requests, after any fork: the gunicorn
+    post_worker_init hook (gunicorn.conf.py) or the development server. Never
+    from create_app, so neither a preloading master nor a migration or test
+    starts threads.
+    """
+    if app.config['SCHEDULER_ENABLED']:
+        from src.services.job_scheduler import start_scheduler
+        start_scheduler(app)
+
+
+def create_app(config=None):
+    """
+    Build the application
+
+    Creating the app opens no connection and starts no thread (see
+    start_background_tasks): database engines, Redis clients and
+    the rate limiter storage connect on first use in the process that uses
+    them, so the app can be imported once by a preloading master (gunicorn
+    --preload) and shared copy-on-write by its forked workers. The schema is
+    not touched here either; run `flask --app src.main migrate` on deploy.
+
+    Args:
+        config: Optional mapping applied over the environment defaults
+    """
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    _load_config(app, config)
+
+    cors_origins = os.environ.get('CORS_ORIGINS', '*').split(',')
+    CORS(app, origins=cors_origins, supports_credentials=True)
+    _init_limiter(app)
+    app.after_request(add_security_headers)
+
+    _register_blueprints(app)
+
+    db.init_app(app)
+
+    from src.services.notification_service import mail
+    mail.init_app(app)
+
+    _register_static(app)
+    _register_commands(app)
+
+    _apps.add(app)
+    return app
+
+
+app = create_app()
 
 
 if __name__ == '__main__':
+    start_background_tasks(app)
     app.run(host='0.0.0.0', port=8000, debug=True)
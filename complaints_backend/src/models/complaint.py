@@ -1,5 +1,6 @@
 from datetime import datetime
 import uuid
+from sqlalchemy import event
 from src.database.db import db
 
 class Role(db.Model):
@@ -44,6 +45,9 @@ class User(db.Model):
     account_locked_until = db.Column(db.DateTime)
     failed_login_attempts = db.Column(db.Integer, default=0)
     
+    # Maintained by notification insert/read paths, repaired by daily reconciliation
+    unread_notifications_count = db.Column(db.Integer, default=0, nullable=False)
+    
     # Relationships
     complaints_submitted = db.relationship('Complaint', foreign_keys='Complaint.trader_id', backref='trader', lazy=True)
     complaints_assigned = db.relationship('Complaint', foreign_keys='Complaint.assigned_to_committee_id', backref='assigned_committee_member', lazy=True)
@@ -113,7 +117,7 @@ class Complaint(db.Model):
     status_id = db.Column(db.Integer, db.ForeignKey('complaint_statuses.status_id'), nullable=False)
     priority = db.Column(db.String(50), default='Medium')
     submitted_at = db.Column(db.DateTime, default=datetime.utcnow)
-    last_updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    last_updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     assigned_to_committee_id = db.Column(db.String(36), db.ForeignKey('users.user_id'))
     resolution_details = db.Column(db.Text)
     closed_at = db.Column(db.DateTime)
@@ -215,6 +219,21 @@ class Notification(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+@event.listens_for(Notification, 'after_insert')
+def increment_unread_notifications_count(mapper, connection, target):
+    """Increment the recipient's unread counter for every inserted notification"""
+    if target.is_read:
+        return
+    users = User.__table__
+    connection.execute(
+        users.update()
+        .where(users.c.user_id == target.user_id)
+        .values(
+            unread_notifications_count=users.c.unread_notifications_count + 1,
+            updated_at=users.c.updated_at
+        )
+    )
+
 class AuditLog(db.Model):
     __tablename__ = 'audit_logs'
     
@@ -259,7 +278,7 @@ class Subscription(db.Model):
     notified_7d = db.Column(db.Boolean, default=False)
     notified_3d = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     user = db.relationship('User', backref='subscriptions', lazy=True)
     previous_subscription = db.relationship('Subscription', remote_side=[subscription_id], backref='renewals', lazy=True)
@@ -324,8 +343,8 @@ class Payment(db.Model):
     status = db.Column(db.String(20), default='pending')
     reviewed_by_id = db.Column(db.String(36), db.ForeignKey('users.user_id'))
     review_notes = db.Column(db.Text)
-    reviewed_at = db.Column(db.DateTime)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    reviewed_at = db.Column(db.DateTime, index=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     user = db.relationship('User', foreign_keys=[user_id], backref='payments')
     payment_method = db.relationship('PaymentMethod', backref='payments')
@@ -375,12 +394,14 @@ class BackupLog(db.Model):
     __tablename__ = 'backup_logs'
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    filename = db.Column(db.String(255), nullable=False)
+    filename = db.Column(db.String(255), nullable=False, index=True)
     size_bytes = db.Column(db.BigInteger, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     status = db.Column(db.String(20), default='success')
     error_message = db.Column(db.Text)
     checksum = db.Column(db.String(64))
+    verified_at = db.Column(db.DateTime)
+    verification_status = db.Column(db.String(20))  # ok, mismatch, corrupt_chunks, missing
     
     def to_dict(self):
         return {
@@ -390,7 +411,33 @@ class BackupLog(db.Model):
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'status': self.status,
             'error_message': self.error_message,
-            'checksum': self.checksum
+            'checksum': self.checksum,
+            'verified_at': self.verified_at.isoformat() if self.verified_at else None,
+            'verification_status': self.verification_status
+        }
+
+class BackupRestoreTest(db.Model):
+    __tablename__ = 'backup_restore_tests'
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    backup_log_id = db.Column(db.String(36), db.ForeignKey('backup_logs.id'), index=True)
+    filename = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.String(20), nullable=False)  # success, failed
+    started_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    duration_seconds = db.Column(db.Float)  # time to a usable restored database (RTO)
+    row_counts = db.Column(db.Text)  # JSON {table: restored rows}
+    error_message = db.Column(db.Text)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'backup_log_id': self.backup_log_id,
+            'filename': self.filename,
+            'status': self.status,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'duration_seconds': self.duration_seconds,
+            'row_counts': self.row_counts,
+            'error_message': self.error_message
         }
 
 class Export(db.Model):
@@ -400,19 +447,116 @@ class Export(db.Model):
     user_id = db.Column(db.String(36), db.ForeignKey('users.user_id'), nullable=False)
     export_type = db.Column(db.String(50), nullable=False)
     filename = db.Column(db.String(255), nullable=False)
-    status = db.Column(db.String(20), default='pending')
+    status = db.Column(db.String(20), default='pending')  # pending, running, completed, failed
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     expires_at = db.Column(db.DateTime)
+    # Asynchronous exports: identical requests share a fingerprint and one generated file
+    fingerprint = db.Column(db.String(64), index=True)
+    export_format = db.Column(db.String(20))
+    filters = db.Column(db.Text)  # JSON of the normalized filters
+    file_path = db.Column(db.String(500))
+    total_rows = db.Column(db.Integer)
+    rows_written = db.Column(db.Integer, default=0)
+    error_message = db.Column(db.Text)
+    # When the job generating the file claimed it; the lease on running exports
+    started_at = db.Column(db.DateTime)
+    completed_at = db.Column(db.DateTime)
     
     user = db.relationship('User', backref='exports', lazy=True)
     
     def to_dict(self):
+        progress = None
+        if self.status == 'completed':
+            progress = 100
+        elif self.total_rows:
+            progress = min(99, int((self.rows_written or 0) * 100 / self.total_rows))
+        
         return {
             'id': self.id,
             'user_id': self.user_id,
             'export_type': self.export_type,
+            'export_format': self.export_format,
             'filename': self.filename,
             'status': self.status,
+            'total_rows': self.total_rows,
+            'rows_written': self.rows_written,
+            'progress': progress,
+            'error_message': self.error_message,
+            'download_url': f'/api/export/{self.id}/download' if self.status == 'completed' and self.file_path else None,
             'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
             'expires_at': self.expires_at.isoformat() if self.expires_at else None
         }
+
+class JobRun(db.Model):
+    __tablename__ = 'job_runs'
+    __table_args__ = (
+        db.UniqueConstraint('job_name', 'scheduled_for', name='uq_job_runs_job_slot'),
+    )
+    
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    job_name = db.Column(db.String(100), nullable=False, index=True)
+    scheduled_for = db.Column(db.DateTime)  # cron slot, NULL for manual runs
+    triggered_by = db.Column(db.String(100), nullable=False)  # 'schedule', 'cron' or 'manual:<username>'
+    status = db.Column(db.String(20), default='running')  # running, success, failed
+    started_at = db.Column(db.DateTime, default=datetime.utcnow)
+    finished_at = db.Column(db.DateTime)
+    duration_ms = db.Column(db.Integer)
+    rows_affected = db.Column(db.Integer)
+    result = db.Column(db.Text)  # JSON summary returned by the job
+    error_message = db.Column(db.Text)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_name': self.job_name,
+            'scheduled_for': self.scheduled_for.isoformat() if self.scheduled_for else None,
+            'triggered_by': self.triggered_by,
+            'status': self.status,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration_ms': self.duration_ms,
+            'rows_affected': self.rows_affected,
+            'result': self.result,
+            'error_message': self.error_message
+        }
+
+class JobLock(db.Model):
+    """Lease-based lock used by the scheduler when Redis is not available"""
+    __tablename__ = 'job_locks'
+    
+    name = db.Column(db.String(100), primary_key=True)
+    owner = db.Column(db.String(36), nullable=False)
+    acquired_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False)
+
+class Tombstone(db.Model):
+    """Deleted complaint, payment or subscription, reported by delta exports"""
+    __tablename__ = 'tombstones'
+    __table_args__ = (
+        db.Index('idx_tombstones_type_deleted', 'entity_type', 'deleted_at'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    entity_type = db.Column(db.String(50), nullable=False)  # complaints, payments, subscriptions
+    entity_id = db.Column(db.String(36), nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'entity_type': self.entity_type,
+            'entity_id': self.entity_id,
+            'deleted_at': self.deleted_at.isoformat() if self.deleted_at else None
+        }
+
+def _record_tombstone(entity_type, key):
+    def record(mapper, connection, target):
+        connection.execute(Tombstone.__table__.insert().values(
+            entity_type=entity_type,
+            entity_id=getattr(target, key),
+            deleted_at=datetime.utcnow()
+        ))
+    return record
+
+for _model, _key in ((Complaint, 'complaint_id'), (Payment, 'payment_id'), (Subscription, 'subscription_id')):
+    event.listen(_model, 'after_delete', _record_tombstone(_model.__tablename__, _key))
@@ -1,8 +1,6 @@
 from flask import Blueprint, request, jsonify, current_app
 from werkzeug.security import generate_password_hash, check_password_hash
 import jwt
-import pyotp
-import qrcode
 import io
 import base64
 import json
@@ -10,6 +8,7 @@ import os
 from datetime import datetime, timedelta
 from functools import wraps
 from marshmallow import ValidationError
+from src.utils.lazy_import import lazy_module
 from src.models.complaint import db, User, Role
 from src.services.job_queue import enqueue_notification
 from src.services.session_service import session_service
@@ -20,6 +19,9 @@ from src.schemas.user import (
     ChangePasswordSchema, RefreshTokenSchema, RevokeSessionSchema
 )
 
+pyotp = lazy_module('pyotp')
+qrcode = lazy_module('qrcode')
+
 auth_bp = Blueprint('auth', __name__)
 
 def rate_limit(limit_string):
@@ -35,10 +37,27 @@ def rate_limit(limit_string):
         return decorated_function
     return decorator
 
+STREAM_TICKET_SCOPE = 'notification_stream'
+STREAM_TICKET_SECONDS = int(os.environ.get('SSE_TICKET_SECONDS', 60))
+
+def create_stream_ticket(user_id):
+    """Short-lived token that only opens the notification stream (EventSource cannot send headers)"""
+    return jwt.encode({
+        'user_id': user_id,
+        'scope': STREAM_TICKET_SCOPE,
+        'exp': datetime.utcnow() + timedelta(seconds=STREAM_TICKET_SECONDS)
+    }, current_app.config['SECRET_KEY'], algorithm='HS256')
+
+def stream_ticket_accepted(f):
+    """Let token_required accept a stream ticket as ?ticket= on this route"""
+    f.accepts_stream_ticket = True
+    return f
+
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
         token = None
+        scope = None
         
         if 'Authorization' in request.headers:
             auth_header = request.headers['Authorization']
@@ -47,11 +66,18 @@ def token_required(f):
             except IndexError:
                 return jsonify({'message': 'تنسيق رمز التوثيق غير صالح'}), 401
         
+        if not token and getattr(f, 'accepts_stream_ticket', False):
+            token = request.args.get('ticket')
+            scope = STREAM_TICKET_SCOPE
+        
         if not token:
             return jsonify({'message': 'رمز التوثيق مفقود'}), 401
         
         try:
             data = jwt.decode(token, current_app.config['SECRET_KEY'], algorithms=['HS256'])
+            # Access tokens carry no scope; a stream ticket only opens the stream
+            if data.get('scope') != scope:
+                return jsonify({'message': 'رمز التوثيق غير صالح'}), 401
             current_user = User.query.filter_by(user_id=data['user_id']).first()
             if not current_user:
                 return jsonify({'message': 'رمز التوثيق غير صالح'}), 401
@@ -1,14 +1,14 @@
 # type: ignore
-from flask import Blueprint, request, jsonify, send_file, current_app
+from flask import Blueprint, request, jsonify, send_file, current_app, Response, stream_with_context, redirect
 from datetime import datetime, timedelta
 from functools import wraps
 import os
 import io
 from src.routes.auth import token_required, role_required, rate_limit
-from src.services.export_service import ExportService
-from src.services.pdf_service import PDFService
+from src.services.export_service import ExportService, ASYNC_FORMATS, FORMATS
+from src.services.pdf_service import PDFService, BUNDLE_MAX_REPORTS
+from src.services.pdf_renderer import RenderQueueFull, RenderTimeout
 from src.models.complaint import db, Export
-from src.services.job_queue import use_redis, notification_queue
 
 export_bp = Blueprint('export', __name__)
 
@@ -24,7 +24,8 @@ def track_export(export_type):
                     response, status_code = result[:2]
                 else:
                     response = result
-                    status_code = 200
+                    # Conditional and range responses of a repeat download are not new exports
+                    status_code = getattr(response, 'status_code', 200)
                 
                 if status_code == 200:
                     filename = kwargs.get('filename', f'{export_type}_{datetime.now().strftime("%Y%m%d_%H%M%S")}')
@@ -46,44 +47,147 @@ def track_export(export_type):
     return decorator
 
 
+def _parse_date_range():
+    """Parse start_date/end_date (YYYY-MM-DD) query parameters"""
+    filters = {}
+    
+    if request.args.get('start_date'):
+        try:
+            filters['start_date'] = datetime.strptime(request.args.get('start_date'), '%Y-%m-%d')
+        except ValueError:
+            return None, (jsonify({'error': 'تنسيق تاريخ البدء غير صالح. استخدم YYYY-MM-DD'}), 400)
+    
+    if request.args.get('end_date'):
+        try:
+            filters['end_date'] = datetime.strptime(request.args.get('end_date'), '%Y-%m-%d')
+        except ValueError:
+            return None, (jsonify({'error': 'تنسيق تاريخ النهاية غير صالح. استخدم YYYY-MM-DD'}), 400)
+    
+    return filters, None
+
+
+def _complaint_filters(current_user):
+    """Complaint export filters from the query string (traders only see their own)"""
+    filters, error = _parse_date_range()
+    if error:
+        return None, error
+    
+    for name in ('status_id', 'category_id'):
+        if request.args.get(name):
+            try:
+                filters[name] = int(request.args.get(name))
+            except ValueError:
+                return None, (jsonify({'error': f'قيمة {name} غير صالحة. يجب أن تكون رقماً صحيحاً'}), 400)
+    
+    if current_user.role.role_name == 'Trader':
+        filters['trader_id'] = current_user.user_id
+    elif request.args.get('trader_id'):
+        filters['trader_id'] = request.args.get('trader_id')
+    
+    return filters, None
+
+
+def _payment_filters(current_user):
+    """Payment export filters from the query string (traders only see their own)"""
+    filters, error = _parse_date_range()
+    if error:
+        return None, error
+    
+    if request.args.get('status'):
+        filters['status'] = request.args.get('status')
+    
+    if current_user.role.role_name == 'Trader':
+        filters['user_id'] = current_user.user_id
+    elif request.args.get('user_id'):
+        filters['user_id'] = request.args.get('user_id')
+    
+    return filters, None
+
+
+def _user_filters():
+    """User export filters from the query string (comma separated role names)"""
+    role_filter = request.args.get('role')
+    return {'role_filter': role_filter.split(',') if role_filter else None}
+
+
+def _audit_log_filters():
+    """Audit log export filters from the query string"""
+    filters, error = _parse_date_range()
+    if error:
+        return None, error
+    
+    if request.args.get('action_type'):
+        filters['action_type'] = request.args.get('action_type')
+    
+    return filters, None
+
+
+ADMIN_DATASETS = ('users', 'subscriptions', 'audit_logs')
+
+
+def _dataset_filters(current_user, dataset):
+    """
+    Filters of any dataset from the query string, after checking access
+    (users, subscriptions and audit logs are Higher Committee only)
+    
+    Returns:
+        tuple: (filters, error response or None)
+    """
+    if dataset in ADMIN_DATASETS and current_user.role.role_name != 'Higher Committee':
+        return None, (jsonify({'message': 'صلاحيات غير كافية'}), 403)
+    
+    if dataset == 'complaints':
+        return _complaint_filters(current_user)
+    if dataset == 'payments':
+        return _payment_filters(current_user)
+    if dataset == 'users':
+        return _user_filters(), None
+    if dataset == 'audit_logs':
+        return _audit_log_filters()
+    return {}, None
+
+
+STREAM_FORMATS = {
+    'csv': (ExportService.stream_csv, 'text/csv'),
+    'ndjson': (ExportService.stream_ndjson, 'application/x-ndjson')
+}
+
+
+def _stream_export(dataset_name, fmt, filters):
+    """Chunked streaming response for a dataset (?gzip=true compresses the stream)"""
+    stream, mimetype = STREAM_FORMATS[fmt]
+    compress = request.args.get('gzip', 'false').lower() == 'true'
+    
+    response = Response(
+        stream_with_context(stream(dataset_name, filters, compress=compress)),
+        mimetype=mimetype
+    )
+    filename = f'{dataset_name}_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{fmt}'
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.headers['X-Accel-Buffering'] = 'no'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
 @export_bp.route('/export/complaints/excel', methods=['GET'])
 @token_required
 @rate_limit('10 per hour')
 @track_export('complaints_excel')
 def export_complaints_excel(current_user):
-    """Export complaints to Excel"""
+    """Export complaints to Excel (?summary=true adds pivot/summary sheets)"""
     try:
-        filters = {}
-        
-        if request.args.get('start_date'):
-            try:
-                filters['start_date'] = datetime.strptime(request.args.get('start_date'), '%Y-%m-%d')
-            except ValueError:
-                return jsonify({'error': 'تنسيق تاريخ البدء غير صالح. استخدم YYYY-MM-DD'}), 400
-        
-        if request.args.get('end_date'):
-            try:
-                filters['end_date'] = datetime.strptime(request.args.get('end_date'), '%Y-%m-%d')
-            except ValueError:
-                return jsonify({'error': 'تنسيق تاريخ النهاية غير صالح. استخدم YYYY-MM-DD'}), 400
-        
-        if request.args.get('status_id'):
-            filters['status_id'] = int(request.args.get('status_id'))
+        filters, error = _complaint_filters(current_user)
+        if error:
+            return error
         
-        if request.args.get('category_id'):
-            filters['category_id'] = int(request.args.get('category_id'))
-        
-        if current_user.role.role_name == 'Trader':
-            filters['trader_id'] = current_user.user_id
-        elif request.args.get('trader_id'):
-            filters['trader_id'] = request.args.get('trader_id')
-        
-        file_path = ExportService.export_complaints_to_excel(filters)
+        include_summary = request.args.get('summary', 'false').lower() == 'true'
+        file_path = ExportService.export_complaints_to_excel(filters, include_summary)
         
         return send_file(
             file_path,
             as_attachment=True,
-            download_name=os.path.basename(file_path),
+            download_name=ExportService.download_name('complaints'),
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
     
@@ -99,34 +203,16 @@ def export_complaints_excel(current_user):
 def export_payments_excel(current_user):
     """Export payments to Excel"""
     try:
-        filters = {}
-        
-        if request.args.get('start_date'):
-            try:
-                filters['start_date'] = datetime.strptime(request.args.get('start_date'), '%Y-%m-%d')
-            except ValueError:
-                return jsonify({'error': 'تنسيق تاريخ البدء غير صالح. استخدم YYYY-MM-DD'}), 400
-        
-        if request.args.get('end_date'):
-            try:
-                filters['end_date'] = datetime.strptime(request.args.get('end_date'), '%Y-%m-%d')
-            except ValueError:
-                return jsonify({'error': 'تنسيق تاريخ النهاية غير صالح. استخدم YYYY-MM-DD'}), 400
-        
-        if request.args.get('status'):
-            filters['status'] = request.args.get('status')
-        
-        if current_user.role.role_name == 'Trader':
-            filters['user_id'] = current_user.user_id
-        elif request.args.get('user_id'):
-            filters['user_id'] = request.args.get('user_id')
+        filters, error = _payment_filters(current_user)
+        if error:
+            return error
         
         file_path = ExportService.export_payments_to_excel(filters)
         
         return send_file(
             file_path,
             as_attachment=True,
-            download_name=os.path.basename(file_path),
+            download_name=ExportService.download_name('payments'),
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
     
@@ -153,7 +239,7 @@ def export_users_excel(current_user):
         return send_file(
             file_path,
             as_attachment=True,
-            download_name=os.path.basename(file_path),
+            download_name=ExportService.download_name('users'),
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
     
@@ -175,7 +261,7 @@ def export_subscriptions_excel(current_user):
         return send_file(
             file_path,
             as_attachment=True,
-            download_name=os.path.basename(file_path),
+            download_name=ExportService.download_name('subscriptions'),
             mimetype='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
     
@@ -184,6 +270,202 @@ def export_subscriptions_excel(current_user):
         return jsonify({'error': f'فشل تصدير الاشتراكات: {str(e)}'}), 500
 
 
+@export_bp.route('/export/complaints.<any(csv, ndjson):fmt>', methods=['GET'])
+@token_required
+@rate_limit('10 per hour')
+@track_export('complaints_stream')
+def stream_complaints(current_user, fmt):
+    """Stream complaints as CSV or NDJSON"""
+    filters, error = _complaint_filters(current_user)
+    return error or _stream_export('complaints', fmt, filters)
+
+
+@export_bp.route('/export/payments.<any(csv, ndjson):fmt>', methods=['GET'])
+@token_required
+@rate_limit('10 per hour')
+@track_export('payments_stream')
+def stream_payments(current_user, fmt):
+    """Stream payments as CSV or NDJSON"""
+    filters, error = _payment_filters(current_user)
+    return error or _stream_export('payments', fmt, filters)
+
+
+@export_bp.route('/export/users.<any(csv, ndjson):fmt>', methods=['GET'])
+@token_required
+@role_required(['Higher Committee'])
+@rate_limit('5 per hour')
+@track_export('users_stream')
+def stream_users(current_user, fmt):
+    """Stream users as CSV or NDJSON (admin only)"""
+    return _stream_export('users', fmt, _user_filters())
+
+
+@export_bp.route('/export/subscriptions.<any(csv, ndjson):fmt>', methods=['GET'])
+@token_required
+@role_required(['Higher Committee'])
+@rate_limit('5 per hour')
+@track_export('subscriptions_stream')
+def stream_subscriptions(current_user, fmt):
+    """Stream subscriptions as CSV or NDJSON (admin only)"""
+    return _stream_export('subscriptions', fmt, {})
+
+
+@export_bp.route('/export/<any(complaints, payments, subscriptions):dataset>/changes.ndjson', methods=['GET'])
+@token_required
+@role_required(['Higher Committee'])
+@rate_limit('60 per hour')
+@track_export('delta_stream')
+def stream_changes(current_user, dataset):
+    """
+    Delta export: rows changed since ?since=<cursor> plus deletions, as NDJSON
+    (omit since for the initial full sync). The next cursor is returned in the
+    X-Next-Cursor header and as the last line of the stream.
+    """
+    since = None
+    if request.args.get('since'):
+        try:
+            since = ExportService.decode_cursor(request.args.get('since'))
+        except ValueError:
+            return jsonify({'error': 'مؤشر المزامنة غير صالح'}), 400
+        if ExportService.cursor_expired(since):
+            return jsonify({'error': 'انتهت صلاحية مؤشر المزامنة، يلزم تصدير كامل'}), 410
+    
+    filters, error = _dataset_filters(current_user, dataset)
+    if error:
+        return error
+    
+    compress = request.args.get('gzip', 'false').lower() == 'true'
+    next_cursor, stream = ExportService.stream_changes(dataset, since, filters, compress=compress)
+    
+    response = Response(stream_with_context(stream), mimetype='application/x-ndjson')
+    response.headers['X-Next-Cursor'] = next_cursor
+    response.headers['X-Accel-Buffering'] = 'no'
+    if compress:
+        response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+
+@export_bp.route('/export/<any(complaints, payments, subscriptions, audit_logs):dataset>.<any(parquet, arrow):fmt>', methods=['GET'])
+@token_required
+@rate_limit('10 per hour')
+@track_export('columnar')
+def export_columnar(current_user, dataset, fmt):
+    """Typed columnar export for analysis tools: zstd Parquet or Arrow IPC stream"""
+    try:
+        filters, error = _dataset_filters(current_user, dataset)
+        if error:
+            return error
+        
+        file_path = ExportService.cached_export(dataset, fmt, filters)
+        extension, mimetype = FORMATS[fmt]
+        
+        return send_file(
+            file_path,
+            as_attachment=True,
+            download_name=ExportService.download_name(dataset, extension),
+            mimetype=mimetype
+        )
+    
+    except Exception as e:
+        current_app.logger.error(f'Error exporting {dataset} to {fmt}: {str(e)}')
+        return jsonify({'error': f'فشل التصدير: {str(e)}'}), 500
+
+
+@export_bp.route('/export/<any(complaints, payments, users, subscriptions, audit_logs):dataset>', methods=['POST'])
+@token_required
+@rate_limit('10 per hour')
+def submit_export(current_user, dataset):
+    """
+    Start an asynchronous export (?format=xlsx|csv|ndjson|parquet|arrow plus the dataset filters)
+    
+    Returns the export id immediately; poll GET /export/<id> for progress.
+    """
+    try:
+        export_format = request.args.get('format', 'xlsx')
+        if export_format not in ASYNC_FORMATS:
+            return jsonify({'error': f'صيغة التصدير غير مدعومة. الصيغ المتاحة: {", ".join(ASYNC_FORMATS)}'}), 400
+        
+        filters, error = _dataset_filters(current_user, dataset)
+        if error:
+            return error
+        
+        export = ExportService.submit_export(current_user, dataset, export_format, filters)
+        
+        return jsonify({
+            'message': 'تم استلام طلب التصدير',
+            'export': ExportService.live_progress(export).to_dict(),
+            'status_url': f'/api/export/{export.id}'
+        }), 202
+    
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f'Error submitting export: {str(e)}')
+        return jsonify({'error': f'فشل بدء التصدير: {str(e)}'}), 500
+
+
+def _get_owned_export(current_user, export_id):
+    """Export visible to the user (its owner or the Higher Committee)"""
+    export = db.session.get(Export, export_id)
+    if export is None:
+        return None, (jsonify({'error': 'التصدير غير موجود'}), 404)
+    if export.user_id != current_user.user_id and current_user.role.role_name != 'Higher Committee':
+        return None, (jsonify({'error': 'ليس لديك صلاحية للوصول إلى هذا التصدير'}), 403)
+    return export, None
+
+
+@export_bp.route('/export/<export_id>', methods=['GET'])
+@token_required
+def get_export_status(current_user, export_id):
+    """Status and progress of an asynchronous export"""
+    export, error = _get_owned_export(current_user, export_id)
+    if error:
+        return error
+    
+    return jsonify({'export': ExportService.live_progress(export).to_dict()}), 200
+
+
+@export_bp.route('/export/<export_id>/download', methods=['GET'])
+@token_required
+def download_export(current_user, export_id):
+    """Download the file of a completed asynchronous export"""
+    export, error = _get_owned_export(current_user, export_id)
+    if error:
+        return error
+    
+    if export.status != 'completed' or not export.file_path:
+        return jsonify({'error': 'التصدير لم يكتمل بعد', 'status': export.status}), 409
+    
+    if (export.expires_at and export.expires_at < datetime.utcnow()) or not os.path.exists(export.file_path):
+        return jsonify({'error': 'انتهت صلاحية ملف التصدير'}), 410
+    
+    return send_file(
+        export.file_path,
+        as_attachment=True,
+        download_name=export.filename,
+        mimetype=FORMATS.get(export.export_format, (None, 'application/octet-stream'))[1]
+    )
+
+
+def _send_pdf_artifact(key, download_name):
+    """
+    Serve a stored PDF artifact: local files with ETag / Range support,
+    object storage through a presigned URL (which handles both itself)
+    """
+    storage = PDFService.storage()
+    path = storage.local_path(key)
+    if path is None:
+        return redirect(storage.get_url(key))
+    
+    return send_file(
+        path,
+        as_attachment=True,
+        download_name=download_name,
+        mimetype='application/pdf',
+        conditional=True,
+        etag=PDFService.artifact_etag(key)
+    )
+
+
 @export_bp.route('/export/complaint/<complaint_id>/pdf', methods=['GET'])
 @token_required
 @rate_limit('20 per hour')
@@ -200,27 +482,52 @@ def export_complaint_pdf(current_user, complaint_id):
         if current_user.role.role_name == 'Trader' and complaint.trader_id != current_user.user_id:
             return jsonify({'error': 'ليس لديك صلاحية لتصدير هذه الشكوى'}), 403
         
-        pdf_content = PDFService.generate_complaint_report(complaint_id)
-        
-        pdf_buffer = io.BytesIO(pdf_content)
-        pdf_buffer.seek(0)
+        key = PDFService.complaint_report_artifact(complaint)
         
         filename = f'complaint_report_{complaint_id}_{datetime.now().strftime("%Y%m%d")}.pdf'
         
-        return send_file(
-            pdf_buffer,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/pdf'
-        )
+        return _send_pdf_artifact(key, filename)
     
     except ValueError as e:
         return jsonify({'error': str(e)}), 404
+    except RenderQueueFull:
+        return jsonify({'error': 'خدمة إنشاء ملفات PDF مشغولة حالياً، يرجى المحاولة بعد قليل'}), 503, {'Retry-After': '10'}
+    except RenderTimeout:
+        return jsonify({'error': 'استغرق إنشاء ملف PDF وقتاً أطول من المسموح'}), 504
     except Exception as e:
         current_app.logger.error(f'Error generating complaint PDF: {str(e)}')
         return jsonify({'error': f'فشل إنشاء تقرير PDF: {str(e)}'}), 500
 
 
+@export_bp.route('/export/complaints/pdf-bundle', methods=['GET'])
+@token_required
+@role_required(['Higher Committee', 'Technical Committee'])
+@rate_limit('5 per hour')
+@track_export('complaint_pdf_bundle')
+def export_complaint_pdf_bundle(current_user):
+    """Stream a zip of the reports of every complaint matching the export filters"""
+    filters, error = _complaint_filters(current_user)
+    if error:
+        return error
+    
+    complaints = PDFService.bundle_complaints(filters)
+    if not complaints:
+        return jsonify({'error': 'لا توجد شكاوى مطابقة للفلاتر'}), 404
+    if len(complaints) > BUNDLE_MAX_REPORTS:
+        return jsonify({
+            'error': f'عدد الشكاوى ({len(complaints)}) يتجاوز الحد الأقصى للحزمة ({BUNDLE_MAX_REPORTS})، يرجى تضييق الفلاتر'
+        }), 400
+    
+    response = Response(
+        stream_with_context(PDFService.stream_complaint_bundle(complaints)),
+        mimetype='application/zip'
+    )
+    filename = f'complaint_reports_{datetime.now().strftime("%Y%m%d_%H%M%S")}.zip'
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @export_bp.route('/export/monthly-report/<int:year>/<int:month>/pdf', methods=['GET'])
 @token_required
 @role_required(['Higher Committee', 'Technical Committee'])
@@ -235,6 +542,11 @@ def export_monthly_report_pdf(current_user, year, month):
         if year < 2020 or year > datetime.now().year + 1:
             return jsonify({'error': 'السنة غير صالحة'}), 400
         
+        # Closed months are computed once at month close and served as a file
+        if PDFService.is_month_closed(month, year):
+            key = PDFService.monthly_report_artifact(month, year)
+            return _send_pdf_artifact(key, f'monthly_report_{year}_{month:02d}.pdf')
+        
         pdf_content = PDFService.generate_monthly_report(month, year)
         
         pdf_buffer = io.BytesIO(pdf_content)
@@ -249,6 +561,10 @@ def export_monthly_report_pdf(current_user, year, month):
             mimetype='application/pdf'
         )
     
+    except RenderQueueFull:
+        return jsonify({'error': 'خدمة إنشاء ملفات PDF مشغولة حالياً، يرجى المحاولة بعد قليل'}), 503, {'Retry-After': '10'}
+    except RenderTimeout:
+        return jsonify({'error': 'استغرق إنشاء ملف PDF وقتاً أطول من المسموح'}), 504
     except Exception as e:
         current_app.logger.error(f'Error generating monthly report PDF: {str(e)}')
         return jsonify({'error': f'فشل إنشاء التقرير الشهري: {str(e)}'}), 500
@@ -270,22 +586,18 @@ def export_payment_receipt_pdf(current_user, payment_id):
         if current_user.role.role_name == 'Trader' and payment.user_id != current_user.user_id:
             return jsonify({'error': 'ليس لديك صلاحية لتصدير إيصال هذا الدفع'}), 403
         
-        pdf_content = PDFService.generate_payment_receipt(payment_id)
-        
-        pdf_buffer = io.BytesIO(pdf_content)
-        pdf_buffer.seek(0)
+        key = PDFService.payment_receipt_artifact(payment)
         
         filename = f'payment_receipt_{payment_id}_{datetime.now().strftime("%Y%m%d")}.pdf'
         
-        return send_file(
-            pdf_buffer,
-            as_attachment=True,
-            download_name=filename,
-            mimetype='application/pdf'
-        )
+        return _send_pdf_artifact(key, filename)
     
     except ValueError as e:
         return jsonify({'error': str(e)}), 404
+    except RenderQueueFull:
+        return jsonify({'error': 'خدمة إنشاء ملفات PDF مشغولة حالياً، يرجى المحاولة بعد قليل'}), 503, {'Retry-After': '10'}
+    except RenderTimeout:
+        return jsonify({'error': 'استغرق إنشاء ملف PDF وقتاً أطول من المسموح'}), 504
     except Exception as e:
         current_app.logger.error(f'Error generating payment receipt PDF: {str(e)}')
         return jsonify({'error': f'فشل إنشاء إيصال الدفع: {str(e)}'}), 500
@@ -3,11 +3,13 @@ from src.database.db import db
 from src.models.complaint import User, AuditLog, Role
 from src.routes.auth import token_required, role_required
 from datetime import datetime, timedelta
-import pyotp
-import qrcode
 import io
 import base64
 from werkzeug.security import check_password_hash
+from src.utils.lazy_import import lazy_module
+
+pyotp = lazy_module('pyotp')
+qrcode = lazy_module('qrcode')
 
 security_api_bp = Blueprint('security_api', __name__, url_prefix='/api/security')
 
@@ -3,6 +3,8 @@ from src.database.db import db
 from src.models.complaint import User, Subscription, Payment, PaymentMethod, Settings, Notification
 from src.routes.auth import token_required, role_required, rate_limit
 from src.utils.security import validate_and_save_file, validate_payment_data
+from src.services.job_scheduler import run_job
+from src.services.job_queue import enqueue_receipt_render
 from datetime import datetime, timedelta
 import os
 
@@ -221,6 +223,8 @@ def approve_payment(current_user, payment_id):
         db.session.add(notification)
         db.session.commit()
         
+        enqueue_receipt_render(payment.payment_id)
+        
         return jsonify({
             'message': 'تم اعتماد الدفع بنجاح',
             'subscription': new_subscription.to_dict()
@@ -461,46 +465,15 @@ def check_renewal_status(current_user):
 @role_required(['Technical Committee', 'Higher Committee'])
 def send_renewal_reminders(current_user):
     try:
-        now = datetime.utcnow()
-        reminders_sent = 0
-        
-        subscriptions = Subscription.query.filter_by(status='active').all()
-        
-        for subscription in subscriptions:
-            days_remaining = (subscription.end_date - now).days
-            
-            if days_remaining == 14 and not subscription.notified_14d:
-                notification = Notification(
-                    user_id=subscription.user_id,
-                    message=f'تنبيه: اشتراكك سينتهي بعد 14 يوماً في {subscription.end_date.strftime("%Y-%m-%d")}. يرجى التجديد قريباً.',
-                    type='renewal_reminder_14d'
-                )
-                subscription.notified_14d = True
-                db.session.add(notification)
-                reminders_sent += 1
-            
-            elif days_remaining == 7 and not subscription.notified_7d:
-                notification = Notification(
-                    user_id=subscription.user_id,
-                    message=f'تنبيه مهم: اشتراكك سينتهي بعد 7 أيام في {subscription.end_date.strftime("%Y-%m-%d")}. يرجى التجديد.',
-                    type='renewal_reminder_7d'
-                )
-                subscription.notified_7d = True
-                db.session.add(notification)
-                reminders_sent += 1
-            
-            elif days_remaining == 3 and not subscription.notified_3d:
-                notification = Notification(
-                    user_id=subscription.user_id,
-                    message=f'تنبيه عاجل: اشتراكك سينتهي بعد 3 أيام في {subscription.end_date.strftime("%Y-%m-%d")}. يرجى التجديد فوراً.',
-                    type='renewal_reminder_3d'
-                )
-                subscription.notified_3d = True
-                db.session.add(notification)
-                reminders_sent += 1
+        outcome = run_job('renewal_reminders', triggered_by=f'manual:{current_user.username}')
         
-        db.session.commit()
+        if outcome.get('skipped'):
+            return jsonify({'message': 'التذكيرات قيد الإرسال حالياً، يرجى المحاولة لاحقاً'}), 409
+        
+        if not outcome['success']:
+            return jsonify({'message': f"خطأ في إرسال التذكيرات: {outcome['result'].get('error')}"}), 500
         
+        reminders_sent = outcome['result']['reminders_sent']
         return jsonify({
             'message': f'تم إرسال {reminders_sent} تذكير تجديد',
             'reminders_sent': reminders_sent
@@ -1,12 +1,12 @@
 from flask import Blueprint, request, current_app
 from src.database.db import db
-from src.models.complaint import User, Subscription, Payment, PaymentMethod, Settings, Notification
+from src.models.complaint import User, Subscription, Payment, PaymentMethod, Settings, Notification, JobRun
 from src.routes.auth import token_required, role_required, rate_limit
 from src.utils.security import validate_and_save_file, validate_payment_data
 from src.utils.response import success_response, error_response
 from src.services.subscription_service import create_or_extend_subscription
-from src.services.scheduler import run_daily_tasks, send_renewal_reminders, check_and_expire_subscriptions
-from src.services.job_queue import enqueue_notification
+from src.services.job_scheduler import JOBS, run_job
+from src.services.job_queue import enqueue_notification, get_queue_metrics
 from datetime import datetime
 import os
 
@@ -170,16 +170,13 @@ def approve_payment(current_user, payment_id):
         result = create_or_extend_subscription(
             user_id=payment.user_id,
             payment_id=payment_id,
-            reviewed_by_id=current_user.user_id
+            reviewed_by_id=current_user.user_id,
+            review_notes=notes
         )
         
         if not result['success']:
             return error_response(error=result['error'], message='خطأ في اعتماد الدفع', status_code=500)
         
-        if notes:
-            payment.review_notes = notes
-            db.session.commit()
-        
         user = User.query.get(payment.user_id)
         if user:
             subscription_data = result.get('subscription', {})
@@ -403,11 +400,73 @@ def update_delete_payment_method(current_user, method_id):
 @role_required(['Technical Committee', 'Higher Committee'])
 def trigger_daily_tasks(current_user):
     """تشغيل المهام اليومية (للـ cron أو trigger يدوي)"""
+    return _run_job_response('daily_tasks', current_user)
+
+@subscription_v2_bp.route('/admin/tasks', methods=['GET'])
+@token_required
+@role_required(['Technical Committee', 'Higher Committee'])
+def list_scheduled_jobs(current_user):
+    """GET /api/admin/tasks → المهام المسجلة وجداولها وموعد تشغيلها القادم"""
+    return success_response(data=[job.to_dict() for job in JOBS.values()])
+
+@subscription_v2_bp.route('/admin/tasks/<job_name>/run', methods=['POST'])
+@token_required
+@role_required(['Technical Committee', 'Higher Committee'])
+def trigger_job(current_user, job_name):
+    """POST /api/admin/tasks/<job_name>/run → تشغيل مهمة يدوياً"""
+    if job_name not in JOBS:
+        return error_response(error='Job not found', message='المهمة غير موجودة', status_code=404)
+    return _run_job_response(job_name, current_user)
+
+@subscription_v2_bp.route('/admin/tasks/runs', methods=['GET'])
+@token_required
+@role_required(['Technical Committee', 'Higher Committee'])
+def list_job_runs(current_user):
+    """GET /api/admin/tasks/runs?job=&status=&page=&per_page= → سجل تشغيل المهام"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 20, type=int), 100)
+        
+        query = JobRun.query
+        if request.args.get('job'):
+            query = query.filter_by(job_name=request.args.get('job'))
+        if request.args.get('status'):
+            query = query.filter_by(status=request.args.get('status'))
+        
+        pagination = query.order_by(JobRun.started_at.desc()).paginate(
+            page=page, per_page=per_page, error_out=False
+        )
+        
+        return success_response(data={
+            'runs': [run.to_dict() for run in pagination.items],
+            'total': pagination.total,
+            'pages': pagination.pages,
+            'current_page': page
+        })
+    except Exception as e:
+        return error_response(error=str(e), message='خطأ في جلب سجل المهام', status_code=500)
+
+@subscription_v2_bp.route('/admin/tasks/queues', methods=['GET'])
+@token_required
+@role_required(['Technical Committee', 'Higher Committee'])
+def get_queue_lanes_metrics(current_user):
+    """GET /api/admin/tasks/queues → عمق وزمن انتظار كل مسار أولوية في طابور المهام"""
+    try:
+        return success_response(data=get_queue_metrics())
+    except Exception as e:
+        return error_response(error=str(e), message='خطأ في جلب مقاييس الطوابير', status_code=500)
+
+def _run_job_response(job_name, current_user):
+    """تشغيل مهمة تحت القفل الموزّع وإرجاع نتيجتها (409 إذا كانت قيد التشغيل)"""
     try:
-        results = run_daily_tasks()
-        return success_response(data=results, message='تم تشغيل المهام اليومية بنجاح')
+        outcome = run_job(job_name, triggered_by=f'manual:{current_user.username}')
+        if outcome.get('skipped'):
+            return error_response(error=outcome['error'], message='المهمة قيد التشغيل حالياً', status_code=409)
+        if not outcome['success']:
+            return error_response(error=outcome['run']['error_message'], message='فشل تشغيل المهمة', status_code=500)
+        return success_response(data=outcome['result'], message='تم تشغيل المهمة بنجاح')
     except Exception as e:
-        return error_response(error=str(e), message='خطأ في تشغيل المهام اليومية', status_code=500)
+        return error_response(error=str(e), message='خطأ في تشغيل المهمة', status_code=500)
 
 # ===================== Webhook Endpoints (اختياري) =====================
 
@@ -1,8 +1,10 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response, stream_with_context
 from src.database.db import db
 from src.models.complaint import User, Role, AuditLog, Notification
 from werkzeug.security import generate_password_hash
-from src.routes.auth import token_required, role_required
+from src.routes.auth import token_required, role_required, stream_ticket_accepted, create_stream_ticket, STREAM_TICKET_SECONDS
+from src.services.notification_service import NotificationService
+from src.services.notification_stream import stream_notifications
 from datetime import datetime
 
 user_bp = Blueprint('user', __name__)
@@ -318,22 +320,52 @@ def get_notifications(current_user):
             page=page, per_page=per_page, error_out=False
         )
         
-        unread_count = Notification.query.filter_by(
-            user_id=current_user.user_id,
-            is_read=False
-        ).count()
-        
         return jsonify({
             'notifications': [notif.to_dict() for notif in pagination.items],
             'total': pagination.total,
             'pages': pagination.pages,
             'current_page': page,
-            'unread_count': unread_count
+            'unread_count': current_user.unread_notifications_count
         }), 200
         
     except Exception as e:
         return jsonify({'message': f'خطأ في جلب الإشعارات: {str(e)}'}), 500
 
+@user_bp.route('/notifications/unread-count', methods=['GET'])
+@token_required
+def get_unread_notifications_count(current_user):
+    """Get current user's unread notifications count (badge polling)"""
+    return jsonify({'unread_count': current_user.unread_notifications_count}), 200
+
+@user_bp.route('/notifications/stream/ticket', methods=['POST'])
+@token_required
+def create_notification_stream_ticket(current_user):
+    """Issue a short-lived ticket for opening the notification stream with EventSource"""
+    return jsonify({
+        'ticket': create_stream_ticket(current_user.user_id),
+        'expires_in': STREAM_TICKET_SECONDS
+    }), 200
+
+@user_bp.route('/notifications/stream', methods=['GET'])
+@token_required
+@stream_ticket_accepted
+def stream_user_notifications(current_user):
+    """
+    Server-Sent Events stream of the current user's new notifications
+    
+    EventSource clients pass ?ticket= from POST /notifications/stream/ticket
+    and fetch a new ticket before reconnecting.
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    
+    response = Response(
+        stream_with_context(stream_notifications(current_user.user_id, last_event_id)),
+        mimetype='text/event-stream'
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @user_bp.route('/notifications/<notification_id>/read', methods=['PUT'])
 @token_required
 def mark_notification_read(current_user, notification_id):
@@ -347,7 +379,7 @@ def mark_notification_read(current_user, notification_id):
         if notification.user_id != current_user.user_id:
             return jsonify({'message': 'غير مصرح'}), 403
         
-        notification.is_read = True
+        NotificationService.mark_read(current_user.user_id, notification_id)
         db.session.commit()
         
         return jsonify({
@@ -364,11 +396,7 @@ def mark_notification_read(current_user, notification_id):
 def mark_all_notifications_read(current_user):
     """Mark all notifications as read"""
     try:
-        Notification.query.filter_by(
-            user_id=current_user.user_id,
-            is_read=False
-        ).update({'is_read': True})
-        
+        NotificationService.mark_read(current_user.user_id)
         db.session.commit()
         
         return jsonify({'message': 'تم تحديد جميع الإشعارات كمقروءة'}), 200
@@ -0,0 +1,295 @@
+"""
+Deduplicating backup repository
+
+Dump streams are split into content-defined chunks: a rolling hash over the
+last WINDOW bytes picks the cut points, so a change early in a dump only
+alters the chunks around it and every later chunk keeps its identity. Each
+distinct chunk is stored once, zlib-compressed, under the SHA-256 of its
+content, and a backup is a manifest listing its chunks in order:
+
+    <backup dir>/backup_<timestamp>.<kind>.manifest.json
+    <backup dir>/chunks/ab/abcdef...
+"""
+import os
+import json
+import time
+import uuid
+import zlib
+import hashlib
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from src.utils.lazy_import import lazy_module
+
+np = lazy_module('numpy')
+
+MANIFEST_SUFFIX = '.manifest.json'
+
+WINDOW = 48
+MIN_CHUNK_SIZE = 4 * 1024
+AVG_CHUNK_SIZE = 16 * 1024  # power of two: the cut condition is a bit mask
+MAX_CHUNK_SIZE = 64 * 1024
+READ_SIZE = 4 * 1024 * 1024
+
+# Chunks younger than this are never collected: a running backup may have
+# written or reused them before its manifest exists (BackupService raises it
+# to BACKUP_TIMEOUT when backups may run longer)
+GC_GRACE_SECONDS = 3600
+
+# Per-byte values of the rolling hash, derived from SHA-256 so cut points
+# (and therefore deduplication against older backups) never change
+_GEAR = [int.from_bytes(hashlib.sha256(bytes([value])).digest()[:4], 'big') for value in range(256)]
+
+
+def cut_points(data, final=False):
+    """
+    End offsets of the chunks in `data`, which must start at a chunk boundary
+
+    Unless `final`, the bytes after the last offset are not a complete chunk
+    yet and must be passed again, followed by the next block of the stream.
+    """
+    size = len(data)
+    cuts = []
+    start = 0
+
+    if size > WINDOW:
+        gear = np.array(_GEAR, dtype=np.uint32)[np.frombuffer(data, dtype=np.uint8)]
+        sums = np.cumsum(gear, dtype=np.uint32)
+        # Sum of the gear values of the WINDOW bytes ending at each offset
+        rolling = sums[WINDOW:] - sums[:-WINDOW]
+        ends = np.flatnonzero((rolling & (AVG_CHUNK_SIZE - 1)) == 0) + WINDOW + 1
+
+        for end in ends.tolist():
+            while end - start > MAX_CHUNK_SIZE:
+                start += MAX_CHUNK_SIZE
+                cuts.append(start)
+            if end - start >= MIN_CHUNK_SIZE:
+                cuts.append(end)
+                start = end
+
+    while size - start >= MAX_CHUNK_SIZE:
+        start += MAX_CHUNK_SIZE
+        cuts.append(start)
+
+    if final and start < size:
+        cuts.append(size)
+    return cuts
+
+
+def load_manifest(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+class ChunkRepository:
+    """Content-addressed chunk store shared by all chunked backups"""
+
+    def __init__(self, root, threads=0):
+        self.root = root
+        self.threads = threads or os.cpu_count() or 1
+
+    def chunk_path(self, chunk_id):
+        return os.path.join(self.root, chunk_id[:2], chunk_id)
+
+    def _store_chunk(self, data):
+        """
+        Store one chunk unless it is already present
+
+        Returns:
+            tuple: (chunk id, length, compressed bytes written)
+        """
+        chunk_id = hashlib.sha256(data).hexdigest()
+        path = self.chunk_path(chunk_id)
+
+        if os.path.exists(path):
+            # Refresh the mtime so garbage collection's grace period covers
+            # reuse; a chunk collected since the check is stored again
+            try:
+                os.utime(path)
+                return chunk_id, len(data), 0
+            except FileNotFoundError:
+                pass
+
+        compressed = zlib.compress(data, 6)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(compressed)
+        os.replace(tmp_path, path)
+        return chunk_id, len(data), len(compressed)
+
+    def write(self, source, manifest_path):
+        """
+        Store the byte stream `source` and write its manifest
+
+        Chunks are hashed and compressed on a thread pool (zlib and hashlib
+        release the GIL) while the next block is read.
+
+        Returns:
+            dict: The manifest; `stored_bytes` is what this backup added
+        """
+        digest = hashlib.sha256()
+        chunks = []
+        size_bytes = 0
+        stored_bytes = 0
+        new_chunks = 0
+        pending = b''
+        stored = []
+
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            while True:
+                block = source.read(READ_SIZE)
+
+                # The previous block's chunks were stored during the read
+                for chunk_id, length, written in stored:
+                    chunks.append([chunk_id, length])
+                    stored_bytes += written
+                    new_chunks += 1 if written else 0
+
+                digest.update(block)
+                size_bytes += len(block)
+
+                data = pending + block
+                pieces = []
+                start = 0
+                for end in cut_points(data, final=not block):
+                    pieces.append(data[start:end])
+                    start = end
+                pending = data[start:]
+
+                stored = executor.map(self._store_chunk, pieces)
+                if not block:
+                    break
+
+            for chunk_id, length, written in stored:
+                chunks.append([chunk_id, length])
+                stored_bytes += written
+                new_chunks += 1 if written else 0
+
+        manifest = {
+            'version': 1,
+            'created_at': datetime.utcnow().isoformat(),
+            'size_bytes': size_bytes,
+            'sha256': digest.hexdigest(),
+            'stored_bytes': stored_bytes,
+            'new_chunks': new_chunks,
+            'chunks': chunks
+        }
+
+        tmp_path = f'{manifest_path}.partial'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, manifest_path)
+        return manifest
+
+    def read(self, manifest_path, out):
+        """
+        Reassemble a backup into the writable `out`, verifying every chunk
+        and the whole stream against the manifest
+
+        Raises:
+            ValueError: when a chunk or the stream does not match its hash
+        """
+        manifest = load_manifest(manifest_path)
+        digest = hashlib.sha256()
+
+        for chunk_id, length in manifest['chunks']:
+            with open(self.chunk_path(chunk_id), 'rb') as f:
+                data = zlib.decompress(f.read())
+            if len(data) != length or hashlib.sha256(data).hexdigest() != chunk_id:
+                raise ValueError(f'Corrupt chunk {chunk_id}')
+            digest.update(data)
+            out.write(data)
+
+        if digest.hexdigest() != manifest['sha256']:
+            raise ValueError(f'Checksum mismatch for {os.path.basename(manifest_path)}')
+        return manifest
+
+    def verify_chunk(self, chunk_id):
+        """Whether the stored chunk exists and still matches its hash"""
+        try:
+            with open(self.chunk_path(chunk_id), 'rb') as f:
+                data = zlib.decompress(f.read())
+        except (OSError, zlib.error):
+            return False
+        return hashlib.sha256(data).hexdigest() == chunk_id
+
+    def collect_garbage(self, manifest_paths, grace_seconds=GC_GRACE_SECONDS):
+        """
+        Delete chunks no remaining manifest references
+
+        A running backup may reuse an old chunk at any moment: the chunk is
+        moved aside before its mtime is checked again, so a reuse either
+        refreshed it first and it is put back, or finds it missing and
+        stores it again.
+
+        Returns:
+            dict: deleted_chunks, freed_bytes
+        """
+        referenced = set()
+        for path in manifest_paths:
+            referenced.update(chunk_id for chunk_id, _ in load_manifest(path)['chunks'])
+
+        cutoff = time.time() - grace_seconds
+        deleted_chunks = 0
+        freed_bytes = 0
+
+        for dirpath, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                if filename in referenced:
+                    continue
+                path = os.path.join(dirpath, filename)
+                if os.stat(path).st_mtime > cutoff:
+                    continue
+
+                doomed = f'{path}.{uuid.uuid4().hex}.gc'
+                try:
+                    os.rename(path, doomed)
+                except FileNotFoundError:
+                    continue
+                stat = os.stat(doomed)
+                if stat.st_mtime > cutoff:
+                    os.replace(doomed, path)
+                    continue
+                os.remove(doomed)
+                deleted_chunks += 1
+                freed_bytes += stat.st_size
+
+        return {'deleted_chunks': deleted_chunks, 'freed_bytes': freed_bytes}
+
+    def upload(self, manifest_path, storage, prefix='backups'):
+        """
+        Upload a backup to a StorageBackend, sending only the chunks the
+        remote does not have yet, then the manifest
+
+        Returns:
+            dict: uploaded_chunks, skipped_chunks, uploaded_bytes, manifest key
+        """
+        manifest = load_manifest(manifest_path)
+        existing = set(storage.list(f'{prefix}/chunks/'))
+
+        missing = []
+        for chunk_id in dict.fromkeys(chunk_id for chunk_id, _ in manifest['chunks']):
+            key = f'{prefix}/chunks/{chunk_id[:2]}/{chunk_id}'
+            if key not in existing:
+                missing.append((chunk_id, key))
+
+        def put(item):
+            chunk_id, key = item
+            with open(self.chunk_path(chunk_id), 'rb') as f:
+                data = f.read()
+            storage.put(data, key)
+            return len(data)
+
+        with ThreadPoolExecutor(max_workers=self.threads) as executor:
+            uploaded_bytes = sum(executor.map(put, missing))
+
+        manifest_key = f'{prefix}/manifests/{os.path.basename(manifest_path)}'
+        with open(manifest_path, 'rb') as f:
+            storage.put(f.read(), manifest_key)
+
+        return {
+            'uploaded_chunks': len(missing),
+            'skipped_chunks': len(set(chunk_id for chunk_id, _ in manifest['chunks'])) - len(missing),
+            'uploaded_bytes': uploaded_bytes,
+            'manifest_key': manifest_key
+        }
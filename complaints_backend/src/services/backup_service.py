@@ -1,16 +1,28 @@
 # type: ignore
 import os
+import gzip
 import subprocess
 import hashlib
-import gzip
 import shutil
+import sqlite3
+import tempfile
+import time
+import threading
+import zlib
 from datetime import datetime, timedelta
 from pathlib import Path
 from src.models.complaint import db, BackupLog
-from src.services.notification_service import NotificationService
+from src.services.job_queue import enqueue_notifications
+from src.services.backup_repository import ChunkRepository, MANIFEST_SUFFIX, GC_GRACE_SECONDS
+
+# Compressed dumps are streamed in blocks of this size (pipes, hashing, disk)
+BUFFER_SIZE = int(os.environ.get('BACKUP_BUFFER_SIZE', 4 * 1024 * 1024))
+
+# Default database of the app when DATABASE_URL is unset (see src/main.py)
+DEFAULT_SQLITE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'database', 'app.db')
 
 class BackupService:
-    """Service for automated PostgreSQL database backups"""
+    """Service for automated PostgreSQL and SQLite database backups"""
     
     def __init__(self):
         self.backup_dir = os.environ.get('BACKUP_DIRECTORY', os.path.join(
@@ -18,9 +30,38 @@ class BackupService:
         ))
         self.retention_days = int(os.environ.get('BACKUP_RETENTION_DAYS', 30))
         self.database_url = os.environ.get('DATABASE_URL', '')
+        self.timeout = int(os.environ.get('BACKUP_TIMEOUT', 600))
+        # auto: zstd if installed, then pigz, then gzip in-process
+        self.compressor = os.environ.get('BACKUP_COMPRESSOR', 'auto').lower()
+        # 0 lets zstd/pigz use every core
+        self.compression_threads = int(os.environ.get('BACKUP_COMPRESSION_THREADS', 0))
+        # plain: one pg_dump stream; directory: pg_dump -Fd with BACKUP_DUMP_JOBS parallel workers
+        self.dump_format = os.environ.get('BACKUP_DUMP_FORMAT', 'plain').lower()
+        self.dump_jobs = int(os.environ.get('BACKUP_DUMP_JOBS', 4))
+        # SQLite pages copied per backup step, and the pause between steps
+        # during which writers can take the database lock
+        self.sqlite_pages_per_step = int(os.environ.get('BACKUP_SQLITE_PAGES_PER_STEP', 1024))
+        self.sqlite_step_sleep = float(os.environ.get('BACKUP_SQLITE_STEP_SLEEP', 0.05))
+        # files: one compressed file per backup; chunked: deduplicated chunks
+        # shared between backups plus a manifest per backup
+        self.repository_format = os.environ.get('BACKUP_REPOSITORY', 'files').lower()
+        self.repository = ChunkRepository(os.path.join(self.backup_dir, 'chunks'), self.compression_threads)
         
         os.makedirs(self.backup_dir, exist_ok=True)
     
+    def _is_sqlite(self):
+        return not self.database_url or self.database_url.startswith('sqlite:')
+    
+    def _sqlite_path(self):
+        """Path of the SQLite database file"""
+        if not self.database_url:
+            return DEFAULT_SQLITE_PATH
+        
+        path = self.database_url.split(':///', 1)[-1].split('?', 1)[0]
+        if not path or path == ':memory:':
+            raise ValueError('DATABASE_URL must point to a SQLite database file')
+        return os.path.abspath(path)
+    
     def _parse_database_url(self):
         """Parse DATABASE_URL into connection parameters"""
         if not self.database_url:
@@ -46,65 +87,281 @@ class BackupService:
         """Calculate SHA256 checksum of a file"""
         sha256_hash = hashlib.sha256()
         with open(file_path, "rb") as f:
-            for byte_block in iter(lambda: f.read(4096), b""):
+            for byte_block in iter(lambda: f.read(BUFFER_SIZE), b""):
                 sha256_hash.update(byte_block)
         return sha256_hash.hexdigest()
     
-    def create_backup(self):
+    def _compressor_command(self):
         """
-        Create PostgreSQL backup using pg_dump
+        Multi-threaded compressor to pipe dumps through
         
         Returns:
-            dict: Backup result with status and details
+            tuple: (argv, extension); argv is None for the in-process gzip fallback
+        """
+        if self.compressor in ('auto', 'zstd') and shutil.which('zstd'):
+            return ['zstd', '-q', '-3', f'-T{self.compression_threads}', '-c'], '.zst'
+        if self.compressor in ('auto', 'pigz') and shutil.which('pigz'):
+            threads = ['-p', str(self.compression_threads)] if self.compression_threads else []
+            return ['pigz', '-c', *threads], '.gz'
+        return None, '.gz'
+    
+    def _write_compressed(self, source, path):
         """
+        Compress the byte stream `source` into `path` in a single pass
+        
+        The compressed bytes are hashed while they are written, so the dump is
+        never stored uncompressed and never re-read. `source` is closed here.
+        
+        Returns:
+            tuple: (size_bytes, sha256 hex digest)
+        """
+        argv, _ = self._compressor_command()
+        partial_path = f'{path}.partial'
+        digest = hashlib.sha256()
+        size_bytes = 0
+        process = None
+        
         try:
-            db_params = self._parse_database_url()
+            with open(partial_path, 'wb') as out, tempfile.TemporaryFile() as stderr:
+                if argv:
+                    # The producer's pipe is handed to the compressor directly
+                    process = subprocess.Popen(argv, stdin=source, stdout=subprocess.PIPE,
+                                               stderr=stderr, bufsize=BUFFER_SIZE)
+                    source.close()
+                    chunks = iter(lambda: process.stdout.read(BUFFER_SIZE), b'')
+                else:
+                    chunks = self._gzip_chunks(source)
+                
+                for chunk in chunks:
+                    digest.update(chunk)
+                    out.write(chunk)
+                    size_bytes += len(chunk)
+                
+                if process:
+                    process.stdout.close()
+                    if process.wait() != 0:
+                        stderr.seek(0)
+                        raise RuntimeError(f'{argv[0]} failed: {stderr.read().decode(errors="replace")}')
             
-            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-            backup_filename = f'backup_{timestamp}.sql'
-            backup_path = os.path.join(self.backup_dir, backup_filename)
-            compressed_filename = f'{backup_filename}.gz'
-            compressed_path = os.path.join(self.backup_dir, compressed_filename)
+            os.replace(partial_path, path)
+        except BaseException:
+            if process and process.poll() is None:
+                process.kill()
+            if os.path.exists(partial_path):
+                os.remove(partial_path)
+            raise
+        finally:
+            source.close()
+        
+        return size_bytes, digest.hexdigest()
+    
+    def _write_chunked(self, source, path):
+        """
+        Store the byte stream `source` in the chunk repository with its
+        manifest at `path`
+        
+        Returns:
+            tuple: (bytes added to the repository, sha256 of the manifest)
+        """
+        try:
+            manifest = self.repository.write(source, path)
+        finally:
+            source.close()
+        return manifest['stored_bytes'], self._calculate_checksum(path)
+    
+    def _store(self, source, path):
+        if self.repository_format == 'chunked':
+            return self._write_chunked(source, path)
+        return self._write_compressed(source, path)
+    
+    def _gzip_chunks(self, source):
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        for block in iter(lambda: source.read(BUFFER_SIZE), b''):
+            chunk = compressor.compress(block)
+            if chunk:
+                yield chunk
+        yield compressor.flush()
+    
+    def _stream_backup(self, cmd, path, env=None):
+        """
+        Run `cmd` and store its stdout at `path`
+        
+        Raises:
+            subprocess.TimeoutExpired: when the run exceeds BACKUP_TIMEOUT
+            RuntimeError: when `cmd` exits with an error
+        """
+        with tempfile.TemporaryFile() as stderr:
+            producer = subprocess.Popen(cmd, env=env, stdout=subprocess.PIPE, stderr=stderr, bufsize=BUFFER_SIZE)
             
-            env = os.environ.copy()
-            env['PGPASSWORD'] = db_params['password']
+            timed_out = threading.Event()
+            def expire():
+                timed_out.set()
+                producer.kill()
+            timer = threading.Timer(self.timeout, expire)
+            timer.start()
             
-            pg_dump_cmd = [
-                'pg_dump',
-                '-h', db_params['host'],
-                '-p', str(db_params['port']),
-                '-U', db_params['username'],
-                '-d', db_params['database'],
-                '-F', 'p',
-                '-f', backup_path,
-                '--no-owner',
-                '--no-acl'
-            ]
+            try:
+                size_bytes, checksum = self._store(producer.stdout, path)
+            except BaseException:
+                producer.kill()
+                raise
+            finally:
+                producer.wait()
+                timer.cancel()
             
+            if timed_out.is_set() or producer.returncode != 0:
+                os.remove(path)
+                if timed_out.is_set():
+                    raise subprocess.TimeoutExpired(cmd, self.timeout)
+                stderr.seek(0)
+                raise RuntimeError(f'{os.path.basename(cmd[0])} failed: {stderr.read().decode(errors="replace")}')
+        
+        return size_bytes, checksum
+    
+    def _dump_postgres(self, path):
+        """Dump PostgreSQL into the backup `path`"""
+        db_params = self._parse_database_url()
+        
+        env = os.environ.copy()
+        env['PGPASSWORD'] = db_params['password']
+        
+        pg_dump_cmd = [
+            'pg_dump',
+            '-h', db_params['host'],
+            '-p', str(db_params['port']),
+            '-U', db_params['username'],
+            '-d', db_params['database'],
+            '--no-owner',
+            '--no-acl'
+        ]
+        
+        if self.dump_format != 'directory':
+            return self._stream_backup(pg_dump_cmd + ['-F', 'p'], path, env=env)
+        
+        # Tables are dumped by parallel workers into a directory, then the
+        # directory is streamed as a tar archive through the same compressor
+        dump_dir = tempfile.mkdtemp(prefix='.dump_', dir=self.backup_dir)
+        try:
             result = subprocess.run(
-                pg_dump_cmd,
+                pg_dump_cmd + ['-F', 'd', '-j', str(self.dump_jobs), '-Z', '0', '-f', os.path.join(dump_dir, 'dump')],
                 env=env,
                 capture_output=True,
                 text=True,
-                timeout=600
+                timeout=self.timeout
             )
-            
             if result.returncode != 0:
-                error_msg = f'pg_dump failed: {result.stderr}'
-                self._log_backup(compressed_filename, 0, 'failed', error_msg)
-                return {
-                    'success': False,
-                    'error': error_msg
-                }
-            
-            with open(backup_path, 'rb') as f_in:
-                with gzip.open(compressed_path, 'wb') as f_out:
-                    shutil.copyfileobj(f_in, f_out)
+                raise RuntimeError(f'pg_dump failed: {result.stderr}')
+            return self._stream_backup(['tar', '-cf', '-', '-C', dump_dir, 'dump'], path)
+        finally:
+            shutil.rmtree(dump_dir, ignore_errors=True)
+    
+    def _dump_sqlite(self, path):
+        """
+        Back up SQLite into the backup `path`
+        
+        The online backup API copies the database in steps of
+        BACKUP_SQLITE_PAGES_PER_STEP pages, releasing the read lock and
+        sleeping between steps so writers are never blocked for long. The
+        consistent snapshot is then stored (compressed and hashed) in one pass.
+        """
+        database_path = self._sqlite_path()
+        if not os.path.exists(database_path):
+            raise ValueError(f'SQLite database not found: {database_path}')
+        
+        fd, snapshot_path = tempfile.mkstemp(prefix='.snapshot_', suffix='.sqlite3', dir=self.backup_dir)
+        os.close(fd)
+        started = time.monotonic()
+        
+        def pause(status, remaining, total):
+            if time.monotonic() - started > self.timeout:
+                raise subprocess.TimeoutExpired('sqlite3 backup', self.timeout)
+            if remaining:
+                time.sleep(self.sqlite_step_sleep)
+        
+        try:
+            source = sqlite3.connect(f'file:{database_path}?mode=ro', uri=True)
+            target = sqlite3.connect(snapshot_path)
+            try:
+                source.backup(target, pages=self.sqlite_pages_per_step, progress=pause)
+            finally:
+                target.close()
+                source.close()
             
-            os.remove(backup_path)
+            return self._store(open(snapshot_path, 'rb', buffering=BUFFER_SIZE), path)
+        finally:
+            os.remove(snapshot_path)
+    
+    def _backup_filename(self, timestamp):
+        if self.repository_format == 'chunked':
+            extension = MANIFEST_SUFFIX
+        else:
+            _, extension = self._compressor_command()
+        if self._is_sqlite():
+            kind = 'sqlite3'
+        elif self.dump_format == 'directory':
+            kind = 'dir.tar'
+        else:
+            kind = 'sql'
+        return f'backup_{timestamp}.{kind}{extension}'
+    
+    @staticmethod
+    def backup_kind(filename):
+        """'sqlite3', 'dir.tar' (pg_dump -Fd as tar) or 'sql' (plain pg_dump)"""
+        rest = filename.split('.', 1)[-1]
+        if rest.startswith('sqlite3'):
+            return 'sqlite3'
+        if rest.startswith('dir.tar'):
+            return 'dir.tar'
+        return 'sql'
+    
+    def read_backup(self, path, out):
+        """Write the uncompressed dump of the backup at `path` into the writable `out`"""
+        if path.endswith(MANIFEST_SUFFIX):
+            self.repository.read(path, out)
+            return
+        
+        if path.endswith('.zst'):
+            with tempfile.TemporaryFile() as stderr:
+                process = subprocess.Popen(['zstd', '-d', '-q', '-c', path], stdout=subprocess.PIPE,
+                                           stderr=stderr, bufsize=BUFFER_SIZE)
+                for block in iter(lambda: process.stdout.read(BUFFER_SIZE), b''):
+                    out.write(block)
+                process.stdout.close()
+                if process.wait() != 0:
+                    stderr.seek(0)
+                    raise RuntimeError(f'zstd failed: {stderr.read().decode(errors="replace")}')
+            return
+        
+        with gzip.open(path, 'rb') as f:
+            shutil.copyfileobj(f, out, BUFFER_SIZE)
+    
+    def _backup_files(self):
+        """Backup files in the backup directory, excluding unfinished ones"""
+        return [
+            path for path in Path(self.backup_dir).glob('backup_*')
+            if path.is_file() and not path.name.endswith('.partial')
+        ]
+    
+    def create_backup(self):
+        """
+        Create a compressed database backup
+        
+        pg_dump's output (or the SQLite snapshot) is piped through a
+        multi-threaded compressor and hashed in the same pass, so the
+        compressed backup is written once and never re-read.
+        
+        Returns:
+            dict: Backup result with status and details
+        """
+        try:
+            timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+            compressed_filename = self._backup_filename(timestamp)
+            compressed_path = os.path.join(self.backup_dir, compressed_filename)
             
-            file_size = os.path.getsize(compressed_path)
-            checksum = self._calculate_checksum(compressed_path)
+            if self._is_sqlite():
+                file_size, checksum = self._dump_sqlite(compressed_path)
+            else:
+                file_size, checksum = self._dump_postgres(compressed_path)
             
             backup_log = self._log_backup(compressed_filename, file_size, 'success', None, checksum)
             
@@ -116,11 +373,11 @@ class BackupService:
                 'path': compressed_path,
                 'size_bytes': file_size,
                 'checksum': checksum,
-                'log_id': backup_log.id
+                'log_id': backup_log.id if backup_log else None
             }
         
         except subprocess.TimeoutExpired:
-            error_msg = 'Backup timed out after 10 minutes'
+            error_msg = f'Backup timed out after {self.timeout // 60} minutes'
             self._log_backup('timeout', 0, 'failed', error_msg)
             self._notify_backup_failure(error_msg)
             return {
@@ -166,18 +423,19 @@ class BackupService:
                 
                 size_mb = size_bytes / (1024 * 1024)
                 
-                for admin in admins:
-                    try:
-                        NotificationService.queue_notification(
-                            user=admin,
-                            notification_type='backup_success',
-                            message=f'تم إنشاء نسخة احتياطية بنجاح: {filename} (الحجم: {size_mb:.2f} ميجابايت)',
-                            channel='in_app',
-                            filename=filename,
-                            size_mb=f'{size_mb:.2f}'
-                        )
-                    except Exception as e:
-                        print(f'Failed to notify admin {admin.user_id}: {str(e)}')
+                result = enqueue_notifications([
+                    {
+                        'user_id': admin.user_id,
+                        'notification_type': 'backup_success',
+                        'message': f'تم إنشاء نسخة احتياطية بنجاح: {filename} (الحجم: {size_mb:.2f} ميجابايت)',
+                        'channel': 'in_app',
+                        'filename': filename,
+                        'size_mb': f'{size_mb:.2f}'
+                    }
+                    for admin in admins
+                ], lane='bulk')
+                if not result['success']:
+                    print('Failed to notify some admins about backup success')
         except Exception as e:
             print(f'Failed to send backup success notifications: {str(e)}')
     
@@ -190,17 +448,18 @@ class BackupService:
             if admin_role:
                 admins = User.query.filter_by(role_id=admin_role.role_id, is_active=True).all()
                 
-                for admin in admins:
-                    try:
-                        NotificationService.queue_notification(
-                            user=admin,
-                            notification_type='backup_failure',
-                            message=f'فشل إنشاء النسخة الاحتياطية: {error_message}',
-                            channel='email',
-                            error=error_message
-                        )
-                    except Exception as e:
-                        print(f'Failed to notify admin {admin.user_id}: {str(e)}')
+                result = enqueue_notifications([
+                    {
+                        'user_id': admin.user_id,
+                        'notification_type': 'backup_failure',
+                        'message': f'فشل إنشاء النسخة الاحتياطية: {error_message}',
+                        'channel': 'email',
+                        'error': error_message
+                    }
+                    for admin in admins
+                ], lane='critical')
+                if not result['success']:
+                    print('Failed to notify some admins about backup failure')
         except Exception as e:
             print(f'Failed to send backup failure notifications: {str(e)}')
     
@@ -211,6 +470,8 @@ class BackupService:
         - Daily backups: 7 days
         - Weekly backups: 30 days
         - Monthly backups: 1 year
+        Chunks of the chunked repository that no kept manifest references
+        are deleted afterwards.
         
         Returns:
             dict: Cleanup result
@@ -221,7 +482,7 @@ class BackupService:
             kept_count = 0
             
             backup_files = sorted(
-                Path(self.backup_dir).glob('backup_*.sql.gz'),
+                self._backup_files(),
                 key=lambda p: p.stat().st_mtime,
                 reverse=True
             )
@@ -268,10 +529,22 @@ class BackupService:
             
             db.session.commit()
             
+            # Chunks only the pruned manifests referenced are freed now. A
+            # backup writes its manifest last, so the grace period must cover
+            # the longest backup that may still be running
+            garbage = {'deleted_chunks': 0, 'freed_bytes': 0}
+            if os.path.isdir(self.repository.root):
+                garbage = self.repository.collect_garbage(
+                    (str(path) for path in self._backup_files() if path.name.endswith(MANIFEST_SUFFIX)),
+                    grace_seconds=max(GC_GRACE_SECONDS, self.timeout)
+                )
+            
             return {
                 'success': True,
                 'deleted_count': deleted_count,
-                'kept_count': kept_count
+                'kept_count': kept_count,
+                'deleted_chunks': garbage['deleted_chunks'],
+                'freed_bytes': garbage['freed_bytes']
             }
         
         except Exception as e:
@@ -281,6 +554,13 @@ class BackupService:
                 'error': str(e)
             }
     
+    def logs_by_filename(self, filenames):
+        """Latest BackupLog of each filename, loaded in one query"""
+        if not filenames:
+            return {}
+        logs = BackupLog.query.filter(BackupLog.filename.in_(filenames)).order_by(BackupLog.created_at).all()
+        return {log.filename: log for log in logs}
+    
     def list_backups(self):
         """
         List all available backups with timestamps and sizes
@@ -290,11 +570,13 @@ class BackupService:
         """
         try:
             backups = []
+            backup_files = sorted(self._backup_files(), reverse=True)
+            logs = self.logs_by_filename([backup_file.name for backup_file in backup_files])
             
-            for backup_file in sorted(Path(self.backup_dir).glob('backup_*.sql.gz'), reverse=True):
+            for backup_file in backup_files:
                 file_stats = backup_file.stat()
                 
-                backup_log = BackupLog.query.filter_by(filename=backup_file.name).first()
+                backup_log = logs.get(backup_file.name)
                 
                 backups.append({
                     'filename': backup_file.name,
@@ -303,7 +585,8 @@ class BackupService:
                     'size_mb': file_stats.st_size / (1024 * 1024),
                     'created_at': datetime.fromtimestamp(file_stats.st_mtime).isoformat(),
                     'status': backup_log.status if backup_log else 'unknown',
-                    'checksum': backup_log.checksum if backup_log else None
+                    'checksum': backup_log.checksum if backup_log else None,
+                    'verification_status': backup_log.verification_status if backup_log else None
                 })
             
             return backups
@@ -316,6 +599,9 @@ class BackupService:
         """
         Upload backup to cloud storage (optional, requires S3 credentials)
         
+        For a chunked backup (its manifest) only the chunks the bucket does
+        not hold yet are sent.
+        
         Args:
             backup_file: str - Path to backup file
         
@@ -332,6 +618,31 @@ class BackupService:
                 'error': 'S3 credentials not configured'
             }
         
+        if backup_file.endswith(MANIFEST_SUFFIX):
+            try:
+                from src.core.storage import S3Storage
+                
+                storage = S3Storage(
+                    bucket_name=s3_bucket,
+                    endpoint_url=os.environ.get('S3_ENDPOINT'),
+                    access_key=s3_access_key,
+                    secret_key=s3_secret_key
+                )
+                result = self.repository.upload(backup_file, storage)
+                return {
+                    'success': True,
+                    'bucket': s3_bucket,
+                    'key': result['manifest_key'],
+                    'uploaded_chunks': result['uploaded_chunks'],
+                    'skipped_chunks': result['skipped_chunks'],
+                    'uploaded_bytes': result['uploaded_bytes']
+                }
+            except Exception as e:
+                return {
+                    'success': False,
+                    'error': f'S3 upload failed: {str(e)}'
+                }
+        
         try:
             import boto3
             
@@ -0,0 +1,305 @@
+# type: ignore
+"""
+Backup verification and restore drills
+
+verify_backups re-hashes every backup (and every chunk of the chunked
+repository) on a thread pool against the checksums recorded in BackupLog.
+test_restore restores a backup into a scratch database, checks it against the
+live row counts and records how long the restore took, the recovery time a
+real incident would need (RTO).
+"""
+import os
+import json
+import time
+import shutil
+import tempfile
+import subprocess
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import create_engine, inspect, select, func
+from src.models.complaint import db, BackupLog, BackupRestoreTest
+from src.services.backup_service import BackupService
+from src.services.backup_repository import MANIFEST_SUFFIX, load_manifest
+from src.services.job_queue import enqueue_notifications
+
+# Bookkeeping written while or after the backup is taken: always ahead of it
+UNCHECKED_TABLES = {'backup_logs', 'backup_restore_tests', 'job_runs', 'job_locks'}
+
+
+class BackupVerificationService:
+    """Service for verifying backups and testing restores"""
+
+    def __init__(self, backup_service=None):
+        self.backups = backup_service or BackupService()
+        # hashlib and zlib release the GIL, so threads hash on every core
+        self.workers = int(os.environ.get('BACKUP_VERIFY_WORKERS', 0)) or os.cpu_count() or 1
+        # Scratch PostgreSQL database that restore drills overwrite
+        self.restore_database_url = os.environ.get('BACKUP_RESTORE_DATABASE_URL', '')
+        self.restore_jobs = int(os.environ.get('BACKUP_RESTORE_JOBS', 4))
+        # A restored table with fewer rows than this fraction of the live table fails the drill
+        self.min_row_ratio = float(os.environ.get('BACKUP_RESTORE_MIN_ROW_RATIO', 0.5))
+
+    def verify_backups(self):
+        """
+        Re-hash all backups and compare them with their logged checksums
+
+        Returns:
+            dict: {'success', 'verified', 'failed': [filenames], 'results': [...]}
+        """
+        try:
+            backup_files = sorted(self.backups._backup_files())
+            logs = self.backups.logs_by_filename([backup_file.name for backup_file in backup_files])
+
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                checksums = dict(zip(
+                    backup_files,
+                    executor.map(lambda path: self.backups._calculate_checksum(str(path)), backup_files)
+                ))
+
+                # Chunks are shared between manifests: verify each one once
+                manifests = {
+                    backup_file: load_manifest(backup_file)
+                    for backup_file in backup_files
+                    if backup_file.name.endswith(MANIFEST_SUFFIX)
+                    and backup_file.name in logs
+                    and checksums[backup_file] == logs[backup_file.name].checksum
+                }
+                chunk_ids = list({chunk_id for manifest in manifests.values() for chunk_id, _ in manifest['chunks']})
+                bad_chunks = {
+                    chunk_id
+                    for chunk_id, valid in zip(chunk_ids, executor.map(self.backups.repository.verify_chunk, chunk_ids))
+                    if not valid
+                }
+
+            now = datetime.utcnow()
+            results = []
+
+            for backup_file in backup_files:
+                backup_log = logs.get(backup_file.name)
+                if backup_log is None:
+                    status = 'unlogged'
+                elif checksums[backup_file] != backup_log.checksum:
+                    status = 'mismatch'
+                elif any(chunk_id in bad_chunks for chunk_id, _ in manifests.get(backup_file, {}).get('chunks', [])):
+                    status = 'corrupt_chunks'
+                else:
+                    status = 'ok'
+
+                if backup_log is not None:
+                    backup_log.verified_at = now
+                    backup_log.verification_status = status
+                results.append({'filename': backup_file.name, 'status': status})
+
+            # Successful backups whose file disappeared without retention deleting it
+            present = {backup_file.name for backup_file in backup_files}
+            for backup_log in BackupLog.query.filter_by(status='success').all():
+                if backup_log.filename not in present:
+                    backup_log.verified_at = now
+                    backup_log.verification_status = 'missing'
+                    results.append({'filename': backup_log.filename, 'status': 'missing'})
+
+            db.session.commit()
+
+            failed = [result['filename'] for result in results if result['status'] not in ('ok', 'unlogged')]
+            if failed:
+                self._notify_failure(f'{len(failed)} backups failed verification: {", ".join(failed[:5])}')
+
+            return {
+                'success': not failed,
+                'verified': len(results),
+                'failed': failed,
+                'corrupt_chunks': len(bad_chunks),
+                'results': results,
+                'error': f'{len(failed)} backups failed verification' if failed else None
+            }
+
+        except Exception as e:
+            db.session.rollback()
+            return {
+                'success': False,
+                'error': f'Verification failed: {str(e)}'
+            }
+
+    def _latest_backup_log(self, filename=None):
+        present = {backup_file.name for backup_file in self.backups._backup_files()}
+        query = BackupLog.query.filter_by(status='success')
+        if filename:
+            query = query.filter_by(filename=filename)
+        for backup_log in query.order_by(BackupLog.created_at.desc()).all():
+            if backup_log.filename in present:
+                return backup_log
+        return None
+
+    def _run(self, cmd, stdin_path=None, **kwargs):
+        """Run a restore command, feeding it the dump of `stdin_path` if given"""
+        with tempfile.TemporaryFile() as stderr:
+            if stdin_path is None:
+                process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=stderr, **kwargs)
+            else:
+                process = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr, **kwargs)
+                try:
+                    self.backups.read_backup(stdin_path, process.stdin)
+                    process.stdin.close()
+                except BrokenPipeError:
+                    # The command exited early; its status and stderr say why
+                    pass
+                except BaseException:
+                    process.kill()
+                    process.wait()
+                    raise
+
+            try:
+                returncode = process.wait(timeout=self.backups.timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+                raise
+            if returncode != 0:
+                stderr.seek(0)
+                raise RuntimeError(f'{cmd[0]} failed: {stderr.read().decode(errors="replace")[-2000:]}')
+
+    def _restore(self, path, kind, scratch_dir):
+        """
+        Restore the backup at `path` into a scratch database
+
+        Returns:
+            str: SQLAlchemy URL of the restored database
+        """
+        if kind == 'sqlite3':
+            restored_path = os.path.join(scratch_dir, 'restored.db')
+            with open(restored_path, 'wb') as out:
+                self.backups.read_backup(path, out)
+            return f'sqlite:///{restored_path}'
+
+        url = self.restore_database_url.replace('postgres://', 'postgresql://', 1)
+        if not url:
+            raise ValueError('BACKUP_RESTORE_DATABASE_URL not set')
+        if url == self.backups.database_url.replace('postgres://', 'postgresql://', 1):
+            raise ValueError('BACKUP_RESTORE_DATABASE_URL must not be the live database')
+
+        self._run(['psql', '-X', '-q', '-v', 'ON_ERROR_STOP=1', '-d', url,
+                   '-c', 'DROP SCHEMA IF EXISTS public CASCADE; CREATE SCHEMA public;'])
+
+        if kind == 'sql':
+            # A plain dump replays as a single psql session
+            self._run(['psql', '-X', '-q', '-v', 'ON_ERROR_STOP=1', '-d', url], stdin_path=path)
+        else:
+            self._run(['tar', '-xf', '-', '-C', scratch_dir], stdin_path=path)
+            self._run(['pg_restore', '-j', str(self.restore_jobs), '--no-owner', '--no-acl',
+                       '-d', url, os.path.join(scratch_dir, 'dump')])
+        return url
+
+    def _check_restored(self, url):
+        """
+        Compare the restored database with the live one
+
+        Returns:
+            tuple: ({table: restored rows}, [problems])
+        """
+        row_counts = {}
+        problems = []
+        engine = create_engine(url)
+
+        try:
+            with engine.connect() as conn:
+                if url.startswith('sqlite'):
+                    integrity = conn.exec_driver_sql('PRAGMA quick_check').scalar()
+                    if integrity != 'ok':
+                        problems.append(f'integrity check: {integrity}')
+
+                restored_tables = set(inspect(conn).get_table_names())
+                for table in db.metadata.sorted_tables:
+                    if table.name not in restored_tables:
+                        problems.append(f'{table.name}: missing')
+                        continue
+
+                    restored = conn.execute(select(func.count()).select_from(table)).scalar()
+                    live = db.session.execute(select(func.count()).select_from(table)).scalar()
+                    row_counts[table.name] = restored
+                    if table.name not in UNCHECKED_TABLES and restored < live * self.min_row_ratio:
+                        problems.append(f'{table.name}: {restored} rows restored, {live} live')
+        finally:
+            engine.dispose()
+
+        return row_counts, problems
+
+    def test_restore(self, filename=None):
+        """
+        Restore a backup (the latest successful one by default) into a
+        scratch database and run row-count sanity checks
+
+        SQLite backups restore into a temporary file. PostgreSQL backups
+        restore into BACKUP_RESTORE_DATABASE_URL, with pg_restore -j for
+        directory-format dumps.
+
+        Returns:
+            dict: {'success', 'restore_test': dict} or {'success': False, 'error'}
+        """
+        backup_log = self._latest_backup_log(filename)
+        if backup_log is None:
+            return {
+                'success': False,
+                'error': 'No backup available to restore'
+            }
+
+        path = os.path.join(self.backups.backup_dir, backup_log.filename)
+        scratch_dir = tempfile.mkdtemp(prefix='.restore_', dir=self.backups.backup_dir)
+        restore_test = BackupRestoreTest(
+            backup_log_id=backup_log.id,
+            filename=backup_log.filename,
+            started_at=datetime.utcnow()
+        )
+
+        try:
+            started = time.monotonic()
+            url = self._restore(path, self.backups.backup_kind(backup_log.filename), scratch_dir)
+            restore_test.duration_seconds = time.monotonic() - started
+
+            row_counts, problems = self._check_restored(url)
+            restore_test.row_counts = json.dumps(row_counts)
+            restore_test.status = 'failed' if problems else 'success'
+            restore_test.error_message = '; '.join(problems) or None
+        except Exception as e:
+            restore_test.status = 'failed'
+            restore_test.error_message = f'Restore failed: {str(e)}'
+        finally:
+            shutil.rmtree(scratch_dir, ignore_errors=True)
+
+        try:
+            db.session.add(restore_test)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            print(f'Failed to record restore test: {str(e)}')
+
+        if restore_test.status != 'success':
+            self._notify_failure(f'{backup_log.filename}: {restore_test.error_message}')
+
+        return {
+            'success': restore_test.status == 'success',
+            'restore_test': restore_test.to_dict(),
+            'error': restore_test.error_message
+        }
+
+    def _notify_failure(self, error_message):
+        """Notify admins that a backup could not be verified or restored"""
+        try:
+            from src.models.complaint import User, Role
+
+            admin_role = Role.query.filter_by(role_name='Higher Committee').first()
+            if admin_role:
+                admins = User.query.filter_by(role_id=admin_role.role_id, is_active=True).all()
+
+                result = enqueue_notifications([
+                    {
+                        'user_id': admin.user_id,
+                        'notification_type': 'backup_verification_failure',
+                        'message': f'فشل التحقق من النسخ الاحتياطية: {error_message}',
+                        'channel': 'email',
+                        'error': error_message
+                    }
+                    for admin in admins
+                ], lane='critical')
+                if not result['success']:
+                    print('Failed to notify some admins about backup verification failure')
+        except Exception as e:
+            print(f'Failed to send backup verification notifications: {str(e)}')
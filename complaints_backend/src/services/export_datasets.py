@@ -0,0 +1,379 @@
+"""
+Export dataset definitions
+
+Each dataset is a single SELECT of plain columns, with related names joined
+in and child counts aggregated in SQL, so exports never load ORM objects or
+trigger lazy relationship loads. Rows are streamed from the database in
+chunks (yield_per), keeping memory proportional to the chunk size.
+"""
+import os
+from sqlalchemy import select, func, or_, and_
+from sqlalchemy.orm import aliased
+from src.database.db import db
+from src.models.complaint import (
+    Complaint, ComplaintCategory, ComplaintStatus, ComplaintAttachment, ComplaintComment,
+    Payment, PaymentMethod, User, Role, Subscription, AuditLog
+)
+
+CHUNK_SIZE = int(os.environ.get('EXPORT_CHUNK_SIZE', 2000))
+
+
+def format_datetime(value):
+    return value.strftime('%Y-%m-%d %H:%M') if value else ''
+
+
+def format_date(value):
+    return value.strftime('%Y-%m-%d') if value else ''
+
+
+def format_text(value):
+    return value or ''
+
+
+def format_raw(value):
+    return value
+
+
+def format_flag(true_label, false_label):
+    def formatter(value):
+        return true_label if value else false_label
+    return formatter
+
+
+class Column:
+    """
+    An exported column
+
+    Args:
+        key: Stable English name (CSV/NDJSON keys, typed exports)
+        header: Arabic header shown in spreadsheets
+        expression: SQL expression selected for the column
+        formatter: Converts the raw value to its display value
+        kind: Logical type: 'string', 'category', 'datetime', 'integer', 'float' or 'boolean'
+    """
+
+    def __init__(self, key, header, expression, formatter=format_text, kind='string'):
+        self.key = key
+        self.header = header
+        self.expression = expression
+        self.formatter = formatter
+        self.kind = kind
+
+
+class Dataset:
+    """
+    A streamable export
+
+    Args:
+        name: Export type ('complaints', 'payments', ...)
+        columns: List of Column
+        build_query: Callable(statement, filters) adding joins and filters
+        version: (aggregate, column key) pairs that change whenever the exported
+                 rows change, e.g. [('max', 'updated_at')]; with the row count
+                 they form the data version used to fingerprint exports
+        changed_at: Indexed timestamp columns set when a row is created or
+                    modified; enables delta exports through the 'changed_after'
+                    and 'changed_until' filters
+    """
+
+    AGGREGATES = {'max': func.max, 'sum': func.sum}
+
+    def __init__(self, name, columns, build_query, version=(), changed_at=()):
+        self.name = name
+        self.columns = columns
+        self.build_query = build_query
+        self.version = version
+        self.changed_at = changed_at
+
+    @property
+    def headers(self):
+        return [column.header for column in self.columns]
+
+    @property
+    def keys(self):
+        return [column.key for column in self.columns]
+
+    @property
+    def primary_key(self):
+        return self.columns[0].key
+
+    @property
+    def supports_delta(self):
+        return bool(self.changed_at)
+
+    def statement(self, filters=None):
+        filters = filters or {}
+        statement = self.build_query(
+            select(*[column.expression.label(column.key) for column in self.columns]),
+            filters
+        )
+
+        changed_after = filters.get('changed_after')
+        changed_until = filters.get('changed_until')
+        if changed_after or changed_until:
+            # One range per column (OR-ed) so each condition can use its own index
+            ranges = []
+            for column in self.changed_at:
+                bounds = []
+                if changed_after:
+                    bounds.append(column > changed_after)
+                if changed_until:
+                    bounds.append(column <= changed_until)
+                ranges.append(and_(*bounds))
+            statement = statement.where(or_(*ranges))
+
+        return statement
+
+    def data_version(self, filters=None):
+        """
+        Row count and version aggregates of the filtered rows
+
+        Returns:
+            dict: {'rows': int, 'version': [aggregate values]}
+        """
+        rows = self.statement(filters).order_by(None).subquery()
+        result = db.session.execute(select(
+            func.count(),
+            *[self.AGGREGATES[aggregate](rows.c[key]) for aggregate, key in self.version]
+        )).one()
+        return {'rows': result[0], 'version': list(result[1:])}
+
+    def iter_chunks(self, filters=None, chunk_size=None, progress=None):
+        """
+        Yield lists of raw row tuples straight from a server-side cursor
+
+        Args:
+            filters: Dataset specific filters (same keys as ExportService)
+            chunk_size: Rows fetched per round trip (default EXPORT_CHUNK_SIZE)
+            progress: Optional callable receiving the number of rows fetched so far
+        """
+        chunk_size = chunk_size or CHUNK_SIZE
+        fetched = 0
+        result = db.session.execute(
+            self.statement(filters).execution_options(yield_per=chunk_size)
+        )
+        try:
+            for partition in result.partitions(chunk_size):
+                fetched += len(partition)
+                if progress:
+                    progress(fetched)
+                yield [tuple(row) for row in partition]
+        finally:
+            result.close()
+
+    def iter_rows(self, filters=None, chunk_size=None, progress=None, on_chunk=None):
+        """Yield display-formatted rows (on_chunk receives each raw chunk first)"""
+        formatters = [column.formatter for column in self.columns]
+        for chunk in self.iter_chunks(filters, chunk_size, progress):
+            if on_chunk:
+                on_chunk(chunk)
+            for row in chunk:
+                yield [formatter(value) for formatter, value in zip(formatters, row)]
+
+
+# ===================== Complaints =====================
+
+_trader = aliased(User)
+_assignee = aliased(User)
+_attachment_counts = select(
+    ComplaintAttachment.complaint_id, func.count().label('total')
+).group_by(ComplaintAttachment.complaint_id).subquery()
+_comment_counts = select(
+    ComplaintComment.complaint_id, func.count().label('total')
+).group_by(ComplaintComment.complaint_id).subquery()
+
+
+def complaint_conditions(filters):
+    """WHERE clauses of the complaint export filters (also used by PDF bundles)"""
+    conditions = []
+    if filters.get('start_date'):
+        conditions.append(Complaint.submitted_at >= filters['start_date'])
+    if filters.get('end_date'):
+        conditions.append(Complaint.submitted_at <= filters['end_date'])
+    if filters.get('status_id'):
+        conditions.append(Complaint.status_id == filters['status_id'])
+    if filters.get('category_id'):
+        conditions.append(Complaint.category_id == filters['category_id'])
+    if filters.get('trader_id'):
+        conditions.append(Complaint.trader_id == filters['trader_id'])
+    return conditions
+
+
+def _complaints_query(statement, filters):
+    statement = (
+        statement.select_from(Complaint)
+        .outerjoin(_trader, _trader.user_id == Complaint.trader_id)
+        .outerjoin(ComplaintCategory, ComplaintCategory.category_id == Complaint.category_id)
+        .outerjoin(ComplaintStatus, ComplaintStatus.status_id == Complaint.status_id)
+        .outerjoin(_assignee, _assignee.user_id == Complaint.assigned_to_committee_id)
+        .outerjoin(_attachment_counts, _attachment_counts.c.complaint_id == Complaint.complaint_id)
+        .outerjoin(_comment_counts, _comment_counts.c.complaint_id == Complaint.complaint_id)
+    )
+
+    return statement.where(*complaint_conditions(filters)).order_by(Complaint.submitted_at, Complaint.complaint_id)
+
+
+COMPLAINTS = Dataset('complaints', [
+    Column('complaint_id', 'رقم الشكوى', Complaint.complaint_id),
+    Column('title', 'العنوان', Complaint.title),
+    Column('description', 'الوصف', Complaint.description),
+    Column('trader_name', 'اسم التاجر', _trader.full_name),
+    Column('category_name', 'الفئة', ComplaintCategory.category_name, kind='category'),
+    Column('status_name', 'الحالة', ComplaintStatus.status_name, kind='category'),
+    Column('priority', 'الأولوية', Complaint.priority, format_raw, kind='category'),
+    Column('submitted_at', 'تاريخ التقديم', Complaint.submitted_at, format_datetime, kind='datetime'),
+    Column('last_updated_at', 'آخر تحديث', Complaint.last_updated_at, format_datetime, kind='datetime'),
+    Column('assigned_to_name', 'المسند إليه', _assignee.full_name),
+    Column('resolution_details', 'تفاصيل الحل', Complaint.resolution_details),
+    Column('closed_at', 'تاريخ الإغلاق', Complaint.closed_at, format_datetime, kind='datetime'),
+    Column('attachments_count', 'عدد المرفقات', func.coalesce(_attachment_counts.c.total, 0), format_raw, kind='integer'),
+    Column('comments_count', 'عدد التعليقات', func.coalesce(_comment_counts.c.total, 0), format_raw, kind='integer'),
+], _complaints_query, version=[
+    ('max', 'last_updated_at'), ('sum', 'attachments_count'), ('sum', 'comments_count')
+], changed_at=[Complaint.last_updated_at])
+
+
+# ===================== Payments =====================
+
+_payer = aliased(User)
+_reviewer = aliased(User)
+
+
+def _payments_query(statement, filters):
+    statement = (
+        statement.select_from(Payment)
+        .outerjoin(_payer, _payer.user_id == Payment.user_id)
+        .outerjoin(PaymentMethod, PaymentMethod.method_id == Payment.method_id)
+        .outerjoin(_reviewer, _reviewer.user_id == Payment.reviewed_by_id)
+    )
+
+    if filters.get('start_date'):
+        statement = statement.where(Payment.payment_date >= filters['start_date'])
+    if filters.get('end_date'):
+        statement = statement.where(Payment.payment_date <= filters['end_date'])
+    if filters.get('status'):
+        statement = statement.where(Payment.status == filters['status'])
+    if filters.get('user_id'):
+        statement = statement.where(Payment.user_id == filters['user_id'])
+
+    return statement.order_by(Payment.created_at, Payment.payment_id)
+
+
+PAYMENTS = Dataset('payments', [
+    Column('payment_id', 'رقم الدفع', Payment.payment_id),
+    Column('user_name', 'اسم المستخدم', _payer.full_name),
+    Column('sender_name', 'اسم المرسل', Payment.sender_name, format_raw),
+    Column('sender_phone', 'هاتف المرسل', Payment.sender_phone, format_raw),
+    Column('method_name', 'طريقة الدفع', PaymentMethod.name, kind='category'),
+    Column('amount', 'المبلغ', Payment.amount, format_raw, kind='float'),
+    Column('currency', 'العملة', Payment.currency, format_raw, kind='category'),
+    Column('transaction_reference', 'رقم المعاملة', Payment.transaction_reference),
+    Column('payment_date', 'تاريخ الدفع', Payment.payment_date, format_datetime, kind='datetime'),
+    Column('status', 'الحالة', Payment.status, format_raw, kind='category'),
+    Column('reviewed_by_name', 'المراجع', _reviewer.full_name),
+    Column('review_notes', 'ملاحظات المراجعة', Payment.review_notes),
+    Column('reviewed_at', 'تاريخ المراجعة', Payment.reviewed_at, format_datetime, kind='datetime'),
+    Column('created_at', 'تاريخ الإنشاء', Payment.created_at, format_datetime, kind='datetime'),
+], _payments_query, version=[
+    ('max', 'created_at'), ('max', 'reviewed_at')
+], changed_at=[Payment.created_at, Payment.reviewed_at])
+
+
+# ===================== Users =====================
+
+def _users_query(statement, filters):
+    statement = statement.select_from(User).outerjoin(Role, Role.role_id == User.role_id)
+
+    role_filter = filters.get('role_filter')
+    if role_filter:
+        if isinstance(role_filter, str):
+            role_filter = [role_filter]
+        statement = statement.where(Role.role_name.in_(role_filter))
+
+    return statement.order_by(User.created_at, User.user_id)
+
+
+USERS = Dataset('users', [
+    Column('user_id', 'رقم المستخدم', User.user_id),
+    Column('username', 'اسم المستخدم', User.username),
+    Column('email', 'البريد الإلكتروني', User.email),
+    Column('full_name', 'الاسم الكامل', User.full_name),
+    Column('phone_number', 'رقم الهاتف', User.phone_number),
+    Column('address', 'العنوان', User.address),
+    Column('role_name', 'الدور', Role.role_name, kind='category'),
+    Column('is_active', 'نشط', User.is_active, format_flag('نعم', 'لا'), kind='boolean'),
+    Column('two_factor_enabled', 'المصادقة الثنائية', User.two_factor_enabled, format_flag('مفعلة', 'غير مفعلة'), kind='boolean'),
+    Column('created_at', 'تاريخ الإنشاء', User.created_at, format_datetime, kind='datetime'),
+    Column('updated_at', 'آخر تحديث', User.updated_at, format_datetime, kind='datetime'),
+], _users_query, version=[('max', 'updated_at')])
+
+
+# ===================== Subscriptions =====================
+
+_subscriber = aliased(User)
+
+
+def _subscriptions_query(statement, filters):
+    statement = statement.select_from(Subscription).outerjoin(
+        _subscriber, _subscriber.user_id == Subscription.user_id
+    )
+    return statement.order_by(Subscription.created_at, Subscription.subscription_id)
+
+
+SUBSCRIPTIONS = Dataset('subscriptions', [
+    Column('subscription_id', 'رقم الاشتراك', Subscription.subscription_id),
+    Column('user_name', 'اسم المستخدم', _subscriber.full_name),
+    Column('email', 'البريد الإلكتروني', _subscriber.email),
+    Column('plan', 'الخطة', Subscription.plan, format_raw, kind='category'),
+    Column('start_date', 'تاريخ البدء', Subscription.start_date, format_date, kind='datetime'),
+    Column('end_date', 'تاريخ الانتهاء', Subscription.end_date, format_date, kind='datetime'),
+    Column('status', 'الحالة', Subscription.status, format_raw, kind='category'),
+    Column('is_renewal', 'تجديد', Subscription.is_renewal, format_flag('نعم', 'لا'), kind='boolean'),
+    Column('grace_period_enabled', 'فترة سماح', Subscription.grace_period_enabled, format_flag('مفعلة', 'غير مفعلة'), kind='boolean'),
+    Column('notified_14d', 'إشعار 14 يوم', Subscription.notified_14d, format_flag('تم', 'لم يتم'), kind='boolean'),
+    Column('notified_7d', 'إشعار 7 أيام', Subscription.notified_7d, format_flag('تم', 'لم يتم'), kind='boolean'),
+    Column('notified_3d', 'إشعار 3 أيام', Subscription.notified_3d, format_flag('تم', 'لم يتم'), kind='boolean'),
+    Column('created_at', 'تاريخ الإنشاء', Subscription.created_at, format_datetime, kind='datetime'),
+    Column('updated_at', 'آخر تحديث', Subscription.updated_at, format_datetime, kind='datetime'),
+], _subscriptions_query, version=[
+    ('max', 'updated_at')
+], changed_at=[Subscription.updated_at])
+
+
+# ===================== Audit logs =====================
+
+_performer = aliased(User)
+_affected_user = aliased(User)
+
+
+def _audit_logs_query(statement, filters):
+    statement = (
+        statement.select_from(AuditLog)
+        .outerjoin(_performer, _performer.user_id == AuditLog.performed_by_id)
+        .outerjoin(_affected_user, _affected_user.user_id == AuditLog.affected_user_id)
+    )
+
+    if filters.get('start_date'):
+        statement = statement.where(AuditLog.created_at >= filters['start_date'])
+    if filters.get('end_date'):
+        statement = statement.where(AuditLog.created_at <= filters['end_date'])
+    if filters.get('action_type'):
+        statement = statement.where(AuditLog.action_type == filters['action_type'])
+
+    return statement.order_by(AuditLog.created_at, AuditLog.log_id)
+
+
+AUDIT_LOGS = Dataset('audit_logs', [
+    Column('log_id', 'رقم السجل', AuditLog.log_id),
+    Column('action_type', 'نوع الإجراء', AuditLog.action_type, format_raw, kind='category'),
+    Column('performed_by_name', 'المنفذ', _performer.full_name),
+    Column('affected_user_name', 'المستخدم المتأثر', _affected_user.full_name),
+    Column('old_value', 'القيمة السابقة', AuditLog.old_value),
+    Column('new_value', 'القيمة الجديدة', AuditLog.new_value),
+    Column('description', 'الوصف', AuditLog.description),
+    Column('ip_address', 'عنوان IP', AuditLog.ip_address),
+    Column('created_at', 'التاريخ', AuditLog.created_at, format_datetime, kind='datetime'),
+], _audit_logs_query, version=[('max', 'created_at')])
+
+
+DATASETS = {dataset.name: dataset for dataset in (COMPLAINTS, PAYMENTS, USERS, SUBSCRIPTIONS, AUDIT_LOGS)}
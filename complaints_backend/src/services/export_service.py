@@ -1,52 +1,756 @@
 # type: ignore
 import os
-import pandas as pd
-from datetime import datetime
-from openpyxl import load_workbook
-from openpyxl.styles import Alignment, Font, PatternFill
-from src.models.complaint import Complaint, Payment, User, Subscription, Role
+import io
+import csv
+import json
+import time
+import zlib
+import uuid
+import base64
+import hashlib
+from datetime import datetime, date, timedelta
+from sqlalchemy import select, or_, and_
 from src.database.db import db
+from src.models.complaint import Export, Tombstone
+from src.core.cache import cache_get, cache_set
+from src.services.export_datasets import DATASETS, CHUNK_SIZE
+
+EXPORT_EXPIRY_HOURS = int(os.environ.get('EXPORT_EXPIRY_HOURS', 24))
+# Export format -> (file extension, MIME type)
+FORMATS = {
+    'xlsx': ('xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+    'csv': ('csv', 'text/csv'),
+    'ndjson': ('ndjson', 'application/x-ndjson'),
+    'parquet': ('parquet', 'application/vnd.apache.parquet'),
+    'arrow': ('arrows', 'application/vnd.apache.arrow.stream'),
+}
+ASYNC_FORMATS = tuple(FORMATS)
+ACTIVE_STATUSES = ('pending', 'running')
+# An active export whose job was claimed (running) or requested (pending)
+# longer ago than this has no live job left: the bulk lane kills jobs after
+# 600 s, and a worker that crashed or was redeployed never reports back
+EXPORT_LEASE_SECONDS = int(os.environ.get('EXPORT_LEASE_SECONDS', 900))
+DATE_FILTERS = ('start_date', 'end_date', 'changed_after', 'changed_until')
+# Changes newer than this are left for the next delta, so rows written by
+# transactions still in flight are not skipped by the cursor
+DELTA_LAG_SECONDS = int(os.environ.get('DELTA_EXPORT_LAG_SECONDS', 5))
+TOMBSTONE_RETENTION_DAYS = int(os.environ.get('TOMBSTONE_RETENTION_DAYS', 90))
 
 class ExportService:
     """Service for exporting data to Excel with Arabic RTL support"""
     
+    MAX_COLUMN_WIDTH = 50
+    
+    # openpyxl is imported on the first spreadsheet export, not at startup
+    _cell_styles = None
+    
+    @staticmethod
+    def _styles():
+        """(header fill, header font, cell alignment), created once"""
+        if ExportService._cell_styles is None:
+            from openpyxl.styles import Alignment, Font, PatternFill
+            ExportService._cell_styles = (
+                PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid"),
+                Font(bold=True, color="FFFFFF", size=12),
+                Alignment(horizontal='right', vertical='center', wrap_text=True)
+            )
+        return ExportService._cell_styles
+    
+    @staticmethod
+    def _exports_dir():
+        exports_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'exports')
+        os.makedirs(exports_dir, exist_ok=True)
+        return exports_dir
+    
+    @staticmethod
+    def download_name(prefix, extension='xlsx'):
+        """Timestamped file name offered to the user"""
+        return f'{prefix}_export_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{extension}'
+    
     @staticmethod
-    def _apply_rtl_formatting(file_path):
-        """Apply RTL formatting and styling to Excel file"""
-        workbook = load_workbook(file_path)
-        worksheet = workbook.active
+    def _export_path(prefix, extension='xlsx'):
+        """Timestamped path for a new export file in the exports directory"""
+        return os.path.join(ExportService._exports_dir(), ExportService.download_name(prefix, extension))
+    
+    @staticmethod
+    def artifact_path(dataset_name, export_format, fingerprint):
+        """Content-keyed path of a cached export artifact"""
+        extension = FORMATS[export_format][0]
+        return os.path.join(ExportService._exports_dir(), f'{dataset_name}_{fingerprint}.{extension}')
+    
+    @staticmethod
+    def _artifact_is_fresh(file_path):
+        return (
+            os.path.exists(file_path)
+            and time.time() - os.path.getmtime(file_path) < EXPORT_EXPIRY_HOURS * 3600
+        )
+    
+    @staticmethod
+    def _start_sheet(workbook, headers, sample_rows, title=None):
+        """
+        Create an RTL write-only sheet with its styled header row; column
+        widths are sized from the header and sample_rows, before any row is
+        written (write-only sheets cannot be resized afterwards)
+        """
+        from openpyxl.cell import WriteOnlyCell
+        from openpyxl.utils import get_column_letter
+        
+        header_fill, header_font, cell_alignment = ExportService._styles()
+        worksheet = workbook.create_sheet(title)
+        worksheet.sheet_view.rightToLeft = True
         
-        header_fill = PatternFill(start_color="4472C4", end_color="4472C4", fill_type="solid")
-        header_font = Font(bold=True, color="FFFFFF", size=12)
+        for index, header in enumerate(headers):
+            longest = max(
+                [len(str(header))] + [len(str(row[index])) for row in sample_rows if row[index] is not None]
+            )
+            worksheet.column_dimensions[get_column_letter(index + 1)].width = min(longest + 2, ExportService.MAX_COLUMN_WIDTH)
         
-        for cell in worksheet[1]:
+        header_cells = []
+        for header in headers:
+            cell = WriteOnlyCell(worksheet, value=header)
             cell.fill = header_fill
             cell.font = header_font
-            cell.alignment = Alignment(horizontal='right', vertical='center', wrap_text=True)
+            cell.alignment = cell_alignment
+            header_cells.append(cell)
+        worksheet.append(header_cells)
         
-        for row in worksheet.iter_rows(min_row=2):
-            for cell in row:
-                cell.alignment = Alignment(horizontal='right', vertical='center', wrap_text=True)
+        return worksheet
+    
+    @staticmethod
+    def _styled(worksheet, row):
+        from openpyxl.cell import WriteOnlyCell
+        
+        cell_alignment = ExportService._styles()[2]
+        cells = []
+        for value in row:
+            cell = WriteOnlyCell(worksheet, value=value)
+            cell.alignment = cell_alignment
+            cells.append(cell)
+        return cells
+    
+    @staticmethod
+    def write_excel(dataset_name, filters=None, file_path=None, chunk_size=None, progress=None, summary=None):
+        """
+        Stream a dataset into a styled RTL workbook in a single pass
         
-        worksheet.sheet_view.rightToLeft = True
+        Rows are pulled from the database in chunks and written through a
+        write-only workbook, so memory stays proportional to one chunk.
+        Column widths are sized from the header and the first chunk.
         
-        for column in worksheet.columns:
-            max_length = 0
-            column_letter = column[0].column_letter
-            for cell in column:
-                try:
-                    if len(str(cell.value)) > max_length:
-                        max_length = len(str(cell.value))
-                except:
-                    pass
-            adjusted_width = min(max_length + 2, 50)
-            worksheet.column_dimensions[column_letter].width = adjusted_width
+        Args:
+            dataset_name: Key of export_datasets.DATASETS
+            filters: Dataset filters (see export_datasets)
+            file_path: Output path (default: timestamped file in the exports directory)
+            chunk_size: Rows per database round trip
+            progress: Optional callable receiving the number of rows fetched so far
+            summary: Optional accumulator (e.g. export_summary.ComplaintSummary) fed
+                     every raw chunk; its sheets() are appended after the data sheet
+        
+        Returns:
+            str: File path to generated Excel file
+        """
+        dataset = DATASETS[dataset_name]
+        file_path = file_path or ExportService._export_path(dataset_name)
+        
+        from openpyxl import Workbook
+        
+        workbook = Workbook(write_only=True)
+        
+        rows = dataset.iter_rows(filters, chunk_size, progress, on_chunk=summary.add if summary else None)
+        first_chunk = []
+        for row in rows:
+            first_chunk.append(row)
+            if len(first_chunk) >= (chunk_size or CHUNK_SIZE):
+                break
+        
+        worksheet = ExportService._start_sheet(workbook, dataset.headers, first_chunk)
+        
+        for row in first_chunk:
+            worksheet.append(ExportService._styled(worksheet, row))
+        del first_chunk
+        
+        for row in rows:
+            worksheet.append(ExportService._styled(worksheet, row))
+        
+        if summary:
+            for title, headers, summary_rows in summary.sheets():
+                sheet = ExportService._start_sheet(workbook, headers, summary_rows, title)
+                for row in summary_rows:
+                    sheet.append(ExportService._styled(sheet, row))
         
         workbook.save(file_path)
         return file_path
     
     @staticmethod
-    def export_complaints_to_excel(filters=None):
+    def _gzip_stream(chunks):
+        """Gzip a byte stream, flushing after every chunk so data leaves immediately"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+        for chunk in chunks:
+            data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+        yield compressor.flush()
+    
+    @staticmethod
+    def stream_csv(dataset_name, filters=None, compress=False, chunk_size=None, progress=None):
+        """
+        Stream a dataset as UTF-8 CSV (with BOM so Excel detects Arabic text)
+        
+        The header is yielded before the query runs, then one encoded block
+        per database chunk, so memory does not grow with the row count.
+        
+        Args:
+            dataset_name: Key of export_datasets.DATASETS
+            filters: Dataset filters (see export_datasets)
+            compress: Gzip the stream
+            chunk_size: Rows per database round trip
+            progress: Optional callable receiving the number of rows fetched so far
+        
+        Yields:
+            bytes: CSV (or gzip) data
+        """
+        dataset = DATASETS[dataset_name]
+        
+        def generate():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            buffer.write('\ufeff')
+            writer.writerow(dataset.headers)
+            yield buffer.getvalue().encode('utf-8')
+            
+            formatters = [column.formatter for column in dataset.columns]
+            for chunk in dataset.iter_chunks(filters, chunk_size, progress):
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerows(
+                    [formatter(value) for formatter, value in zip(formatters, row)]
+                    for row in chunk
+                )
+                yield buffer.getvalue().encode('utf-8')
+        
+        return ExportService._gzip_stream(generate()) if compress else generate()
+    
+    @staticmethod
+    def _json_value(value):
+        if isinstance(value, (datetime, date)):
+            return value.isoformat()
+        return value
+    
+    @staticmethod
+    def stream_ndjson(dataset_name, filters=None, compress=False, chunk_size=None, progress=None):
+        """
+        Stream a dataset as newline-delimited JSON with English keys and raw
+        values (ISO dates, numbers, booleans), one object per line
+        
+        Args:
+            dataset_name: Key of export_datasets.DATASETS
+            filters: Dataset filters (see export_datasets)
+            compress: Gzip the stream
+            chunk_size: Rows per database round trip
+            progress: Optional callable receiving the number of rows fetched so far
+        
+        Yields:
+            bytes: NDJSON (or gzip) data
+        """
+        dataset = DATASETS[dataset_name]
+        keys = dataset.keys
+        
+        def generate():
+            for chunk in dataset.iter_chunks(filters, chunk_size, progress):
+                yield ''.join(
+                    json.dumps(
+                        {key: ExportService._json_value(value) for key, value in zip(keys, row)},
+                        ensure_ascii=False
+                    ) + '\n'
+                    for row in chunk
+                ).encode('utf-8')
+        
+        return ExportService._gzip_stream(generate()) if compress else generate()
+    
+    # ===================== Delta exports =====================
+    
+    @staticmethod
+    def encode_cursor(moment):
+        """Opaque delta cursor for a watermark timestamp"""
+        return base64.urlsafe_b64encode(moment.isoformat().encode('ascii')).decode('ascii').rstrip('=')
+    
+    @staticmethod
+    def decode_cursor(cursor):
+        """
+        Watermark timestamp of a delta cursor
+        
+        Raises:
+            ValueError: Malformed cursor
+        """
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            return datetime.fromisoformat(base64.urlsafe_b64decode(padded.encode('ascii')).decode('ascii'))
+        except (ValueError, UnicodeError):
+            raise ValueError('Invalid cursor')
+    
+    @staticmethod
+    def cursor_expired(since):
+        """Deletions older than the tombstone retention can no longer be reported"""
+        return since < datetime.utcnow() - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+    
+    @staticmethod
+    def stream_changes(dataset_name, since=None, filters=None, compress=False, chunk_size=None):
+        """
+        Stream the rows created or modified after a watermark, then the
+        deletions, as NDJSON operations:
+            {"op": "upsert", "record": {...}}
+            {"op": "delete", "id": "..."}
+            {"op": "cursor", "next": "<cursor>"}  (last line)
+        
+        The scan uses the dataset's indexed change timestamps, so its cost
+        follows the number of changes rather than the table size.
+        
+        Args:
+            dataset_name: Dataset with change tracking (complaints, payments, subscriptions)
+            since: Watermark from the previous delta (None for a full initial export)
+            filters: Dataset filters (see export_datasets)
+            compress: Gzip the stream
+            chunk_size: Rows per database round trip
+        
+        Returns:
+            tuple: (next cursor, generator of bytes)
+        """
+        dataset = DATASETS[dataset_name]
+        if not dataset.supports_delta:
+            raise ValueError(f'Delta exports are not supported for {dataset_name}')
+        
+        until = datetime.utcnow() - timedelta(seconds=DELTA_LAG_SECONDS)
+        next_cursor = ExportService.encode_cursor(until)
+        filters = dict(filters or {}, changed_after=since, changed_until=until)
+        keys = dataset.keys
+        
+        def line(payload):
+            return json.dumps(payload, ensure_ascii=False) + '\n'
+        
+        def generate():
+            for chunk in dataset.iter_chunks(filters, chunk_size):
+                yield ''.join(
+                    line({
+                        'op': 'upsert',
+                        'record': {key: ExportService._json_value(value) for key, value in zip(keys, row)}
+                    })
+                    for row in chunk
+                ).encode('utf-8')
+            
+            if since is not None:
+                deleted = db.session.execute(
+                    select(Tombstone.entity_id).where(
+                        Tombstone.entity_type == dataset_name,
+                        Tombstone.deleted_at > since,
+                        Tombstone.deleted_at <= until
+                    ).order_by(Tombstone.deleted_at).execution_options(yield_per=chunk_size or CHUNK_SIZE)
+                )
+                for partition in deleted.partitions():
+                    yield ''.join(line({'op': 'delete', 'id': row[0]}) for row in partition).encode('utf-8')
+            
+            yield line({'op': 'cursor', 'next': next_cursor}).encode('utf-8')
+        
+        return next_cursor, (ExportService._gzip_stream(generate()) if compress else generate())
+    
+    @staticmethod
+    def purge_tombstones():
+        """Delete tombstones older than TOMBSTONE_RETENTION_DAYS"""
+        deleted = Tombstone.query.filter(
+            Tombstone.deleted_at < datetime.utcnow() - timedelta(days=TOMBSTONE_RETENTION_DAYS)
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        return deleted
+    
+    # ===================== Asynchronous exports =====================
+    
+    @staticmethod
+    def normalize_filters(filters):
+        """JSON-safe, canonical form of export filters (dates as ISO strings, lists sorted)"""
+        normalized = {}
+        for key, value in sorted((filters or {}).items()):
+            if value is None or value == '':
+                continue
+            if isinstance(value, (datetime, date)):
+                value = value.isoformat()
+            elif isinstance(value, (list, tuple, set)):
+                value = sorted(value)
+            normalized[key] = value
+        return normalized
+    
+    @staticmethod
+    def restore_filters(normalized):
+        """Inverse of normalize_filters for the date filters"""
+        filters = dict(normalized or {})
+        for key in DATE_FILTERS:
+            if filters.get(key):
+                filters[key] = datetime.fromisoformat(filters[key])
+        return filters
+    
+    @staticmethod
+    def fingerprint(dataset_name, export_format, filters=None, summary=False):
+        """
+        Identity of an export: dataset, format, normalized filters and the
+        current data version (row count and last-change aggregates), so two
+        requests share a fingerprint only while they would produce the same file
+        """
+        version = DATASETS[dataset_name].data_version(filters)
+        identity = {
+            'dataset': dataset_name,
+            'format': export_format,
+            'filters': ExportService.normalize_filters(filters),
+            'data_version': version
+        }
+        if summary:
+            identity['summary'] = True
+        payload = json.dumps(identity, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest(), version['rows']
+    
+    @staticmethod
+    def submit_export(user, dataset_name, export_format, filters=None):
+        """
+        Request an asynchronous export
+        
+        Identical concurrent requests (same dataset, format, filters and data
+        version) are joined onto the job already generating that file: each
+        requester gets its own Export row sharing the fingerprint, and all of
+        them complete together.
+        
+        Args:
+            user: Requesting user
+            dataset_name: Key of export_datasets.DATASETS
+            export_format: Key of FORMATS ('xlsx', 'csv', 'ndjson', 'parquet' or 'arrow')
+            filters: Dataset filters (see export_datasets)
+        
+        Returns:
+            Export: The requester's export record (already completed when an
+                    unexpired artifact with the same fingerprint exists)
+        """
+        from src.services.job_queue import enqueue_export
+        
+        fingerprint, total_rows = ExportService.fingerprint(dataset_name, export_format, filters)
+        
+        lock = ExportService._fingerprint_lock(fingerprint)
+        try:
+            now = datetime.utcnow()
+            active = Export.query.filter(
+                Export.fingerprint == fingerprint,
+                Export.status.in_(ACTIVE_STATUSES)
+            ).order_by(Export.created_at).all()
+            # Exports whose job is gone are re-enqueued rather than joined
+            live = [export for export in active if not ExportService._lease_expired(export, now)]
+            
+            own = next((export for export in active if export.user_id == user.user_id), None)
+            if own:
+                export_id, cached = own.id, None
+            else:
+                export_id, cached = ExportService._add_export(user, dataset_name, export_format, filters,
+                                                              fingerprint, total_rows, live)
+        finally:
+            if lock:
+                lock.release()
+        
+        if not live and not cached:
+            enqueue_export(fingerprint)
+        
+        return db.session.get(Export, export_id)
+    
+    @staticmethod
+    def _add_export(user, dataset_name, export_format, filters, fingerprint, total_rows, live):
+        """
+        Record a new export request, completed at once from an unexpired
+        artifact when no job is generating the file
+        
+        Returns:
+            tuple: (export id, cached file path or None)
+        """
+        export = Export(
+            user_id=user.user_id,
+            export_type=dataset_name,
+            export_format=export_format,
+            filename=ExportService.download_name(dataset_name, FORMATS[export_format][0]),
+            status='pending',
+            fingerprint=fingerprint,
+            filters=json.dumps(ExportService.normalize_filters(filters), ensure_ascii=False),
+            total_rows=total_rows,
+            rows_written=0
+        )
+        
+        cached = None if live else ExportService._cached_artifact(fingerprint)
+        if cached:
+            now = datetime.utcnow()
+            export.status = 'completed'
+            export.file_path = cached
+            export.rows_written = total_rows
+            export.completed_at = now
+            export.expires_at = now + timedelta(hours=EXPORT_EXPIRY_HOURS)
+        db.session.add(export)
+        db.session.commit()
+        return export.id, cached
+    
+    @staticmethod
+    def _lease_expired(export, now):
+        """Whether an active export has outlived EXPORT_LEASE_SECONDS without finishing"""
+        since = export.started_at if export.status == 'running' else export.created_at
+        return since is None or since < now - timedelta(seconds=EXPORT_LEASE_SECONDS)
+    
+    @staticmethod
+    def _claimable(fingerprint, now):
+        """Exports of a fingerprint a new job may take over: pending, or running past their lease"""
+        return Export.query.filter(
+            Export.fingerprint == fingerprint,
+            or_(
+                Export.status == 'pending',
+                and_(
+                    Export.status == 'running',
+                    or_(Export.started_at.is_(None), Export.started_at < now - timedelta(seconds=EXPORT_LEASE_SECONDS))
+                )
+            )
+        )
+    
+    @staticmethod
+    def _cached_artifact(fingerprint):
+        """File of an unexpired completed export with this fingerprint, if it still exists"""
+        completed = Export.query.filter(
+            Export.fingerprint == fingerprint,
+            Export.status == 'completed',
+            Export.file_path.isnot(None),
+            Export.expires_at > datetime.utcnow()
+        ).order_by(Export.completed_at.desc()).first()
+        if completed and os.path.exists(completed.file_path):
+            return completed.file_path
+        return None
+    
+    @staticmethod
+    def _fingerprint_lock(fingerprint, attempts=50):
+        """
+        Serialize joining and completing exports of one fingerprint, so a
+        request never joins a job that has just finished. Returns the held
+        lock, or None if it could not be acquired in time.
+        """
+        from src.services.job_scheduler import DistributedLock
+        
+        lock = DistributedLock(f'export:{fingerprint}', 60)
+        for _ in range(attempts):
+            if lock.acquire():
+                return lock
+            time.sleep(0.1)
+        return None
+    
+    @staticmethod
+    def _progress_key(fingerprint):
+        return f'export_progress:{fingerprint}'
+    
+    @staticmethod
+    def live_progress(export):
+        """Export record with rows_written taken from the running job's progress counter"""
+        if export.status in ACTIVE_STATUSES and export.fingerprint:
+            written = cache_get(ExportService._progress_key(export.fingerprint))
+            if written is not None:
+                export.rows_written = written
+        return export
+    
+    @staticmethod
+    def write_export(dataset_name, export_format, filters=None, file_path=None, progress=None, chunk_size=None,
+                     summary=False):
+        """
+        Generate an export file in any asynchronous format and return its path
+        
+        The file is written under a temporary name and moved into place, so a
+        concurrent reader never sees a partially written artifact. With
+        summary=True, xlsx exports of datasets in export_summary.SUMMARIES get
+        summary sheets.
+        """
+        file_path = file_path or ExportService._export_path(dataset_name, FORMATS[export_format][0])
+        temp_path = f'{file_path}.{uuid.uuid4().hex}.tmp'
+        
+        try:
+            if export_format == 'xlsx':
+                accumulator = None
+                if summary:
+                    from src.services.export_summary import SUMMARIES
+                    accumulator = SUMMARIES[dataset_name](DATASETS[dataset_name].keys)
+                ExportService.write_excel(dataset_name, filters, temp_path, chunk_size, progress, accumulator)
+            elif export_format in ('parquet', 'arrow'):
+                from src.services import columnar_export
+                writer = columnar_export.write_parquet if export_format == 'parquet' else columnar_export.write_arrow
+                writer(dataset_name, temp_path, filters, chunk_size, progress)
+            else:
+                stream = ExportService.stream_csv if export_format == 'csv' else ExportService.stream_ndjson
+                with open(temp_path, 'wb') as output:
+                    for block in stream(dataset_name, filters, chunk_size=chunk_size, progress=progress):
+                        output.write(block)
+            os.replace(temp_path, file_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        
+        return file_path
+    
+    @staticmethod
+    def cached_export(dataset_name, export_format='xlsx', filters=None, summary=False):
+        """
+        Path of an export artifact, generated only if no fresh artifact with
+        the same content key (dataset, format, filters, data version) exists
+        """
+        fingerprint, _ = ExportService.fingerprint(dataset_name, export_format, filters, summary)
+        file_path = ExportService.artifact_path(dataset_name, export_format, fingerprint)
+        if not ExportService._artifact_is_fresh(file_path):
+            ExportService.write_export(dataset_name, export_format, filters, file_path, summary=summary)
+        return file_path
+    
+    @staticmethod
+    def run_export(fingerprint):
+        """
+        Generate the file for every pending export sharing a fingerprint
+        
+        Progress is published to the cache rather than the exports table:
+        committing on the session mid-export would close the streaming cursor.
+        
+        The job claims the pending exports, and running ones whose lease
+        expired, by stamping started_at; a duplicate job finds nothing left to
+        claim and returns.
+        
+        Returns:
+            dict: {'success': bool, 'file_path': str, 'rows': int} or {'success': False, 'error': str}
+        """
+        started_at = datetime.utcnow()
+        lock = ExportService._fingerprint_lock(fingerprint)
+        try:
+            claimable = ExportService._claimable(fingerprint, started_at)
+            template = claimable.order_by(Export.created_at).first()
+            if template is not None:
+                dataset_name = template.export_type
+                export_format = template.export_format
+                filters = ExportService.restore_filters(json.loads(template.filters or '{}'))
+                
+                claimable.update({'status': 'running', 'started_at': started_at}, synchronize_session=False)
+                db.session.commit()
+        finally:
+            if lock:
+                lock.release()
+        
+        if template is None:
+            return {'success': False, 'error': 'No pending export for this fingerprint'}
+        
+        progress_key = ExportService._progress_key(fingerprint)
+        written = 0
+        
+        def progress(rows):
+            nonlocal written
+            written = rows
+            cache_set(progress_key, rows, timeout=EXPORT_EXPIRY_HOURS * 3600)
+        
+        try:
+            file_path = ExportService.write_export(
+                dataset_name, export_format, filters,
+                ExportService.artifact_path(dataset_name, export_format, fingerprint),
+                progress
+            )
+            values = {
+                'status': 'completed',
+                'file_path': file_path,
+                'rows_written': written,
+                'completed_at': datetime.utcnow(),
+                'expires_at': datetime.utcnow() + timedelta(hours=EXPORT_EXPIRY_HOURS)
+            }
+            result = {'success': True, 'file_path': file_path, 'rows': written}
+        except Exception as e:
+            db.session.rollback()
+            values = {
+                'status': 'failed',
+                'error_message': str(e),
+                'completed_at': datetime.utcnow(),
+                'expires_at': datetime.utcnow() + timedelta(hours=EXPORT_EXPIRY_HOURS)
+            }
+            result = {'success': False, 'error': str(e)}
+        
+        # Requests joined while the file was generated complete with it; rows
+        # another job took over after this one's lease expired are left to it
+        lock = ExportService._fingerprint_lock(fingerprint)
+        try:
+            Export.query.filter(
+                Export.fingerprint == fingerprint,
+                or_(
+                    Export.status == 'pending',
+                    and_(Export.status == 'running', Export.started_at == started_at)
+                )
+            ).update(values, synchronize_session=False)
+            db.session.commit()
+        finally:
+            if lock:
+                lock.release()
+        
+        return result
+    
+    @staticmethod
+    def sweep_expired(batch_size=500):
+        """
+        Delete expired Export rows in batches, then every export file that is
+        older than EXPORT_EXPIRY_HOURS or belonged to a deleted row, unless an
+        unexpired export still references it (artifacts are shared by fingerprint)
+        
+        Rows without an expiry (failed before failures got one, or abandoned
+        while pending or running) are deleted EXPORT_EXPIRY_HOURS after they
+        were requested, unless a job is running them within its lease.
+        
+        Returns:
+            dict: {'success': bool, 'deleted_rows': int, 'deleted_files': int, 'rows_affected': int}
+        """
+        now = datetime.utcnow()
+        deleted_rows = 0
+        released = set()
+        
+        expired = or_(
+            Export.expires_at < now,
+            and_(
+                Export.expires_at.is_(None),
+                Export.created_at < now - timedelta(hours=EXPORT_EXPIRY_HOURS),
+                or_(
+                    Export.status != 'running',
+                    Export.started_at.is_(None),
+                    Export.started_at < now - timedelta(seconds=EXPORT_LEASE_SECONDS)
+                )
+            )
+        )
+        
+        while True:
+            batch = db.session.query(Export.id, Export.file_path).filter(expired).limit(batch_size).all()
+            if not batch:
+                break
+            
+            Export.query.filter(Export.id.in_([row.id for row in batch])).delete(synchronize_session=False)
+            db.session.commit()
+            deleted_rows += len(batch)
+            released.update(row.file_path for row in batch if row.file_path)
+        
+        referenced = {
+            path for (path,) in db.session.query(Export.file_path).filter(
+                Export.file_path.isnot(None)
+            ).distinct()
+        }
+        
+        deleted_files = 0
+        exports_dir = ExportService._exports_dir()
+        cutoff = time.time() - EXPORT_EXPIRY_HOURS * 3600
+        for entry in os.scandir(exports_dir):
+            if not entry.is_file() or entry.path in referenced:
+                continue
+            if entry.path in released or entry.stat().st_mtime < cutoff:
+                try:
+                    os.remove(entry.path)
+                    deleted_files += 1
+                except OSError as e:
+                    print(f'Failed to delete export file {entry.path}: {str(e)}')
+        
+        return {
+            'success': True,
+            'deleted_rows': deleted_rows,
+            'deleted_files': deleted_files,
+            'rows_affected': deleted_rows + deleted_files
+        }
+    
+    @staticmethod
+    def export_complaints_to_excel(filters=None, include_summary=False):
         """
         Export complaints to Excel with filters
         
@@ -57,57 +761,13 @@ class ExportService:
                 - status_id: int
                 - category_id: int
                 - trader_id: str
+            include_summary: Add sheets with counts by category x status, median
+                             resolution days by category and monthly volume
         
         Returns:
             str: File path to generated Excel file
         """
-        query = Complaint.query
-        
-        if filters:
-            if filters.get('start_date'):
-                query = query.filter(Complaint.submitted_at >= filters['start_date'])
-            if filters.get('end_date'):
-                query = query.filter(Complaint.submitted_at <= filters['end_date'])
-            if filters.get('status_id'):
-                query = query.filter(Complaint.status_id == filters['status_id'])
-            if filters.get('category_id'):
-                query = query.filter(Complaint.category_id == filters['category_id'])
-            if filters.get('trader_id'):
-                query = query.filter(Complaint.trader_id == filters['trader_id'])
-        
-        complaints = query.all()
-        
-        data = []
-        for complaint in complaints:
-            data.append({
-                'رقم الشكوى': complaint.complaint_id,
-                'العنوان': complaint.title,
-                'الوصف': complaint.description,
-                'اسم التاجر': complaint.trader.full_name if complaint.trader else '',
-                'الفئة': complaint.category.category_name if complaint.category else '',
-                'الحالة': complaint.status.status_name if complaint.status else '',
-                'الأولوية': complaint.priority,
-                'تاريخ التقديم': complaint.submitted_at.strftime('%Y-%m-%d %H:%M') if complaint.submitted_at else '',
-                'آخر تحديث': complaint.last_updated_at.strftime('%Y-%m-%d %H:%M') if complaint.last_updated_at else '',
-                'المسند إليه': complaint.assigned_committee_member.full_name if complaint.assigned_committee_member else '',
-                'تفاصيل الحل': complaint.resolution_details or '',
-                'تاريخ الإغلاق': complaint.closed_at.strftime('%Y-%m-%d %H:%M') if complaint.closed_at else '',
-                'عدد المرفقات': len(complaint.attachments),
-                'عدد التعليقات': len(complaint.comments)
-            })
-        
-        df = pd.DataFrame(data)
-        
-        exports_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'exports')
-        os.makedirs(exports_dir, exist_ok=True)
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'complaints_export_{timestamp}.xlsx'
-        file_path = os.path.join(exports_dir, filename)
-        
-        df.to_excel(file_path, index=False, engine='openpyxl')
-        
-        return ExportService._apply_rtl_formatting(file_path)
+        return ExportService.cached_export('complaints', 'xlsx', filters, summary=include_summary)
     
     @staticmethod
     def export_payments_to_excel(filters=None):
@@ -124,51 +784,7 @@ class ExportService:
         Returns:
             str: File path to generated Excel file
         """
-        query = Payment.query
-        
-        if filters:
-            if filters.get('start_date'):
-                query = query.filter(Payment.payment_date >= filters['start_date'])
-            if filters.get('end_date'):
-                query = query.filter(Payment.payment_date <= filters['end_date'])
-            if filters.get('status'):
-                query = query.filter(Payment.status == filters['status'])
-            if filters.get('user_id'):
-                query = query.filter(Payment.user_id == filters['user_id'])
-        
-        payments = query.all()
-        
-        data = []
-        for payment in payments:
-            data.append({
-                'رقم الدفع': payment.payment_id,
-                'اسم المستخدم': payment.user.full_name if payment.user else '',
-                'اسم المرسل': payment.sender_name,
-                'هاتف المرسل': payment.sender_phone,
-                'طريقة الدفع': payment.payment_method.name if payment.payment_method else '',
-                'المبلغ': payment.amount,
-                'العملة': payment.currency,
-                'رقم المعاملة': payment.transaction_reference or '',
-                'تاريخ الدفع': payment.payment_date.strftime('%Y-%m-%d %H:%M') if payment.payment_date else '',
-                'الحالة': payment.status,
-                'المراجع': payment.reviewed_by.full_name if payment.reviewed_by else '',
-                'ملاحظات المراجعة': payment.review_notes or '',
-                'تاريخ المراجعة': payment.reviewed_at.strftime('%Y-%m-%d %H:%M') if payment.reviewed_at else '',
-                'تاريخ الإنشاء': payment.created_at.strftime('%Y-%m-%d %H:%M') if payment.created_at else ''
-            })
-        
-        df = pd.DataFrame(data)
-        
-        exports_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'exports')
-        os.makedirs(exports_dir, exist_ok=True)
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'payments_export_{timestamp}.xlsx'
-        file_path = os.path.join(exports_dir, filename)
-        
-        df.to_excel(file_path, index=False, engine='openpyxl')
-        
-        return ExportService._apply_rtl_formatting(file_path)
+        return ExportService.cached_export('payments', 'xlsx', filters)
     
     @staticmethod
     def export_users_to_excel(role_filter=None):
@@ -181,43 +797,7 @@ class ExportService:
         Returns:
             str: File path to generated Excel file
         """
-        query = User.query
-        
-        if role_filter:
-            if isinstance(role_filter, str):
-                role_filter = [role_filter]
-            query = query.join(Role).filter(Role.role_name.in_(role_filter))
-        
-        users = query.all()
-        
-        data = []
-        for user in users:
-            data.append({
-                'رقم المستخدم': user.user_id,
-                'اسم المستخدم': user.username,
-                'البريد الإلكتروني': user.email,
-                'الاسم الكامل': user.full_name,
-                'رقم الهاتف': user.phone_number or '',
-                'العنوان': user.address or '',
-                'الدور': user.role.role_name if user.role else '',
-                'نشط': 'نعم' if user.is_active else 'لا',
-                'المصادقة الثنائية': 'مفعلة' if user.two_factor_enabled else 'غير مفعلة',
-                'تاريخ الإنشاء': user.created_at.strftime('%Y-%m-%d %H:%M') if user.created_at else '',
-                'آخر تحديث': user.updated_at.strftime('%Y-%m-%d %H:%M') if user.updated_at else ''
-            })
-        
-        df = pd.DataFrame(data)
-        
-        exports_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'exports')
-        os.makedirs(exports_dir, exist_ok=True)
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'users_export_{timestamp}.xlsx'
-        file_path = os.path.join(exports_dir, filename)
-        
-        df.to_excel(file_path, index=False, engine='openpyxl')
-        
-        return ExportService._apply_rtl_formatting(file_path)
+        return ExportService.cached_export('users', 'xlsx', {'role_filter': role_filter})
     
     @staticmethod
     def export_subscriptions_to_excel():
@@ -227,35 +807,4 @@ class ExportService:
         Returns:
             str: File path to generated Excel file
         """
-        subscriptions = Subscription.query.all()
-        
-        data = []
-        for subscription in subscriptions:
-            data.append({
-                'رقم الاشتراك': subscription.subscription_id,
-                'اسم المستخدم': subscription.user.full_name if subscription.user else '',
-                'البريد الإلكتروني': subscription.user.email if subscription.user else '',
-                'الخطة': subscription.plan,
-                'تاريخ البدء': subscription.start_date.strftime('%Y-%m-%d') if subscription.start_date else '',
-                'تاريخ الانتهاء': subscription.end_date.strftime('%Y-%m-%d') if subscription.end_date else '',
-                'الحالة': subscription.status,
-                'تجديد': 'نعم' if subscription.is_renewal else 'لا',
-                'فترة سماح': 'مفعلة' if subscription.grace_period_enabled else 'غير مفعلة',
-                'إشعار 14 يوم': 'تم' if subscription.notified_14d else 'لم يتم',
-                'إشعار 7 أيام': 'تم' if subscription.notified_7d else 'لم يتم',
-                'إشعار 3 أيام': 'تم' if subscription.notified_3d else 'لم يتم',
-                'تاريخ الإنشاء': subscription.created_at.strftime('%Y-%m-%d %H:%M') if subscription.created_at else ''
-            })
-        
-        df = pd.DataFrame(data)
-        
-        exports_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'exports')
-        os.makedirs(exports_dir, exist_ok=True)
-        
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        filename = f'subscriptions_export_{timestamp}.xlsx'
-        file_path = os.path.join(exports_dir, filename)
-        
-        df.to_excel(file_path, index=False, engine='openpyxl')
-        
-        return ExportService._apply_rtl_formatting(file_path)
+        return ExportService.cached_export('subscriptions')
@@ -1,50 +1,80 @@
 import os
-from datetime import datetime, timedelta
-from redis import Redis
+import threading
+from datetime import datetime, timedelta, timezone
 from rq import Queue
-from flask import current_app
-from src.database.db import db
+from rq.job import Job
+from contextlib import contextmanager
+from flask import current_app, has_app_context
+from src.database.db import db, DEFAULT_DATABASE_URI
+from src.core.redis_connection import get_redis, on_fork
 from src.models.complaint import User, Subscription, Settings, Notification
 
-redis_url = os.environ.get('REDIS_URL', '')
+# Priority lanes, highest first. Workers consume them in this order, so bulk
+# fan-outs (reminders, broadcasts, maintenance) never delay critical or
+# interactive jobs.
+LANES = ('critical', 'interactive', 'bulk')
+LANE_TIMEOUTS = {'critical': 300, 'interactive': 300, 'bulk': 600}
 
-if redis_url:
-    try:
-        redis_conn = Redis.from_url(redis_url)
-        redis_conn.ping()
-        use_redis = True
-    except Exception as e:
-        redis_conn = None
-        use_redis = False
-        print(f'Redis connection failed, using in-memory fallback: {str(e)}')
-else:
-    redis_conn = None
-    use_redis = False
+# Queues used before priority lanes existed; workers keep draining them
+LEGACY_QUEUES = ('notifications', 'maintenance')
 
-if use_redis:
-    notification_queue = Queue('notifications', connection=redis_conn, default_timeout=300)
-    maintenance_queue = Queue('maintenance', connection=redis_conn, default_timeout=600)
-else:
-    notification_queue = None
-    maintenance_queue = None
+# use_redis, redis_conn, lane_queues, notification_queue and maintenance_queue
+# are bound per process on first use (module attribute access or _connect()),
+# never at import, and forgotten in a forked child.
+_CONNECTION_ATTRS = ('use_redis', 'redis_conn', 'lane_queues', 'notification_queue', 'maintenance_queue')
+_connect_lock = threading.Lock()
 
 
-def send_notification_job(user_id, notification_type, message, channel='in_app', **context):
-    """
-    Background job to send notification
+def _connect():
+    """Bind the Redis connection and lane queues of this process"""
+    global use_redis, redis_conn, lane_queues, notification_queue, maintenance_queue
+    if 'use_redis' in globals():
+        return
     
-    Args:
-        user_id: User ID
-        notification_type: Type of notification
-        message: Notification message
-        channel: Notification channel ('in_app', 'email', 'sms', 'all')
-        **context: Additional context for templates
-    """
-    from src.services.notification_service import NotificationService
+    with _connect_lock:
+        if 'use_redis' in globals():
+            return
+        
+        connection = get_redis()
+        if connection is not None:
+            queues = {
+                lane: Queue(lane, connection=connection, default_timeout=LANE_TIMEOUTS[lane])
+                for lane in LANES
+            }
+        else:
+            queues = {}
+        
+        redis_conn = connection
+        lane_queues = queues
+        notification_queue = queues.get('interactive')
+        maintenance_queue = queues.get('bulk')
+        # Published last: other threads skip the lock once they see it
+        use_redis = connection is not None
+
+
+def __getattr__(name):
+    if name in _CONNECTION_ATTRS:
+        _connect()
+        return globals()[name]
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+@on_fork
+def _forget_connection():
+    global _connect_lock
+    # Another thread of the parent may have held the lock while forking
+    _connect_lock = threading.Lock()
+    for name in _CONNECTION_ATTRS:
+        globals().pop(name, None)
+
+
+def _create_job_app():
+    """Create a minimal Flask app with database and mail for background jobs"""
     from flask import Flask
+    from src.services.notification_service import mail
     
-    app = Flask(__name__)
-    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///database/app.db')
+    app = Flask(__name__, template_folder=os.path.join(os.path.dirname(os.path.dirname(__file__)), 'templates'))
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL') or DEFAULT_DATABASE_URI
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
     app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
@@ -54,12 +84,48 @@ def send_notification_job(user_id, notification_type, message, channel='in_app',
     app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD', '')
     app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER', os.environ.get('MAIL_USERNAME', ''))
     
-    from src.services.notification_service import mail
     mail.init_app(app)
+    db.init_app(app)
+    
+    return app
+
+
+@contextmanager
+def _job_app_context():
+    """
+    App context for a job body
+
+    Run inline (no Redis) the job uses the caller's app context; in a worker
+    it gets a job app whose engine is disposed when the job ends.
+    """
+    if has_app_context():
+        yield
+        return
     
+    app = _create_job_app()
     with app.app_context():
-        db.init_app(app)
-        
+        try:
+            yield
+        finally:
+            db.session.remove()
+            for engine in db.engines.values():
+                engine.dispose()
+
+
+def send_notification_job(user_id, notification_type, message, channel='in_app', **context):
+    """
+    Background job to send notification
+    
+    Args:
+        user_id: User ID
+        notification_type: Type of notification
+        message: Notification message
+        channel: Notification channel ('in_app', 'email', 'sms', 'all')
+        **context: Additional context for templates
+    """
+    from src.services.notification_service import NotificationService
+    
+    with _job_app_context():
         try:
             user = User.query.get(user_id)
             if not user:
@@ -82,83 +148,82 @@ def send_notification_job(user_id, notification_type, message, channel='in_app',
             return {'success': False, 'error': str(e)}
 
 
-def check_renewals_job():
+def flush_digest_job(user_id, channel):
     """
-    Background job to check subscriptions and send renewal reminders
-    Runs daily to check for subscriptions expiring in 14, 7, or 3 days
+    Background job to deliver a user's buffered notification digest
+    
+    Args:
+        user_id: User ID
+        channel: Notification channel ('email', 'sms', 'all')
     """
     from src.services.notification_service import NotificationService
-    from flask import Flask
     
-    app = Flask(__name__)
-    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///database/app.db')
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    
-    app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
-    app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
-    app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', 'true').lower() == 'true'
-    app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME', '')
-    app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD', '')
-    app.config['MAIL_DEFAULT_SENDER'] = os.environ.get('MAIL_DEFAULT_SENDER', os.environ.get('MAIL_USERNAME', ''))
-    
-    from src.services.notification_service import mail
-    mail.init_app(app)
-    
-    with app.app_context():
-        db.init_app(app)
-        
+    with _job_app_context():
+        try:
+            result = NotificationService.flush_digest(user_id, channel)
+            print(f'Notification digest delivered to {user_id} ({channel}): {result["delivered"]} items')
+            return result
+        except Exception as e:
+            db.session.rollback()
+            print(f'Failed to flush notification digest: {str(e)}')
+            return {'success': False, 'error': str(e)}
+
+
+def check_renewals_job():
+    """
+    Background job to check subscriptions and send renewal reminders
+    Runs daily to check for subscriptions expiring in 14, 7, or 3 days.
+    Reminders are fanned out to the bulk lane in a single round trip.
+    """
+    with _job_app_context():
         try:
             now = datetime.utcnow()
-            reminders_sent = 0
+            reminders = []
             
             active_subscriptions = Subscription.query.filter_by(status='active').all()
             
             for subscription in active_subscriptions:
                 days_remaining = (subscription.end_date - now).days
-                user = User.query.get(subscription.user_id)
-                
-                if not user:
-                    continue
+                reminder = {
+                    'user_id': subscription.user_id,
+                    'end_date': subscription.end_date.strftime('%Y-%m-%d'),
+                    'days_remaining': days_remaining
+                }
                 
                 if days_remaining == 14 and not subscription.notified_14d:
-                    NotificationService.queue_notification(
-                        user=user,
+                    reminder.update(
                         notification_type='renewal_reminder_14d',
                         message=f'اشتراكك سينتهي خلال 14 يوم. يرجى تجديد الاشتراك.',
-                        channel='email',
-                        end_date=subscription.end_date.strftime('%Y-%m-%d'),
-                        days_remaining=14
+                        channel='email'
                     )
                     subscription.notified_14d = True
-                    reminders_sent += 1
                 
                 elif days_remaining == 7 and not subscription.notified_7d:
-                    NotificationService.queue_notification(
-                        user=user,
+                    reminder.update(
                         notification_type='renewal_reminder_7d',
                         message=f'اشتراكك سينتهي خلال 7 أيام. يرجى تجديد الاشتراك.',
-                        channel='email',
-                        end_date=subscription.end_date.strftime('%Y-%m-%d'),
-                        days_remaining=7
+                        channel='email'
                     )
                     subscription.notified_7d = True
-                    reminders_sent += 1
                 
                 elif days_remaining == 3 and not subscription.notified_3d:
-                    NotificationService.queue_notification(
-                        user=user,
+                    reminder.update(
                         notification_type='renewal_reminder_3d',
                         message=f'تحذير: اشتراكك سينتهي خلال 3 أيام. يرجى تجديد الاشتراك فوراً.',
-                        channel='all',
-                        end_date=subscription.end_date.strftime('%Y-%m-%d'),
-                        days_remaining=3
+                        channel='all'
                     )
                     subscription.notified_3d = True
-                    reminders_sent += 1
+                
+                else:
+                    continue
+                
+                reminders.append(reminder)
             
             db.session.commit()
-            print(f'Renewal reminders sent: {reminders_sent}')
-            return {'success': True, 'reminders_sent': reminders_sent}
+            
+            result = enqueue_notifications(reminders, lane='bulk')
+            print(f'Renewal reminders sent: {len(reminders)}')
+            return {'success': result['success'], 'reminders_sent': len(reminders)}
             
         except Exception as e:
             db.session.rollback()
@@ -202,11 +267,67 @@ def cleanup_files_job(days_old=30):
         return {'success': False, 'error': str(e)}
 
 
-def enqueue_notification(user_id, notification_type, message, channel='in_app', **context):
+def generate_export_job(fingerprint):
+    """
+    Background job generating an asynchronous export file
+    
+    Args:
+        fingerprint: Export fingerprint shared by the joined export requests
+    """
+    from src.services.export_service import ExportService
+    
+    with _job_app_context():
+        try:
+            result = ExportService.run_export(fingerprint)
+            print(f'Export {fingerprint[:12]} finished: {result}')
+            return result
+        except Exception as e:
+            db.session.rollback()
+            print(f'Failed to generate export: {str(e)}')
+            return {'success': False, 'error': str(e)}
+
+
+def render_receipt_job(payment_id):
+    """
+    Background job storing the PDF receipt of a reviewed payment, so the
+    first download is served from the artifact
+    
+    Args:
+        payment_id: Payment ID
+    """
+    with _job_app_context():
+        return _render_receipt(payment_id)
+
+
+def _render_receipt(payment_id):
+    from src.models.complaint import Payment
+    from src.services.pdf_service import PDFService
+    
+    try:
+        payment = Payment.query.get(payment_id)
+        if not payment:
+            return {'success': False, 'error': 'Payment not found'}
+        
+        key = PDFService.payment_receipt_artifact(payment)
+        return {'success': True, 'key': key}
+    except Exception as e:
+        print(f'Failed to render receipt {payment_id}: {str(e)}')
+        return {'success': False, 'error': str(e)}
+
+
+def lane_for_notification(notification_type):
+    """Critical notification types use the critical lane, everything else the interactive one"""
+    from src.services.notification_service import NotificationService
+    return 'critical' if notification_type in NotificationService.CRITICAL_TYPES else 'interactive'
+
+
+def enqueue_notification(user_id, notification_type, message, channel='in_app', lane=None, **context):
     """Helper to enqueue notification job if Redis available, otherwise run synchronously"""
-    if use_redis and notification_queue:
+    _connect()
+    if use_redis and lane_queues:
         try:
-            job = notification_queue.enqueue(
+            queue = lane_queues[lane or lane_for_notification(notification_type)]
+            job = queue.enqueue(
                 send_notification_job,
                 user_id=user_id,
                 notification_type=notification_type,
@@ -221,8 +342,124 @@ def enqueue_notification(user_id, notification_type, message, channel='in_app',
     return send_notification_job(user_id, notification_type, message, channel, **context)
 
 
+def enqueue_many(jobs, lane='bulk'):
+    """
+    Enqueue many jobs on one lane in a single Redis round trip (pipelined)
+    
+    Args:
+        jobs: Iterable of (func, kwargs) tuples
+        lane: Priority lane ('critical', 'interactive', 'bulk')
+    
+    Returns:
+        dict: {'success': bool, 'job_ids': list} or, without Redis, the jobs are
+              run synchronously and {'success': bool, 'results': list} is returned
+    """
+    jobs = list(jobs)
+    
+    _connect()
+    if use_redis and lane_queues:
+        queue = lane_queues[lane]
+        try:
+            with redis_conn.pipeline() as pipe:
+                enqueued = queue.enqueue_many(
+                    [Queue.prepare_data(func, kwargs=kwargs) for func, kwargs in jobs],
+                    pipeline=pipe
+                )
+                pipe.execute()
+            return {'success': True, 'job_ids': [job.id for job in enqueued]}
+        except Exception as e:
+            print(f'Failed to enqueue {len(jobs)} jobs on {lane} lane: {str(e)}')
+    
+    results = [func(**kwargs) for func, kwargs in jobs]
+    return {'success': all(result.get('success') for result in results), 'results': results}
+
+
+def enqueue_notifications(notifications, lane='bulk'):
+    """
+    Helper to enqueue many notification jobs at once (broadcasts, reminder runs)
+    
+    Args:
+        notifications: Iterable of dicts with user_id, notification_type, message,
+                       optional channel and any extra template context
+        lane: Priority lane, 'bulk' by default so fan-outs never starve interactive jobs
+    """
+    jobs = []
+    for notification in notifications:
+        kwargs = dict(notification)
+        kwargs.setdefault('channel', 'in_app')
+        jobs.append((send_notification_job, kwargs))
+    
+    return enqueue_many(jobs, lane=lane)
+
+
+def get_queue_metrics(sample_size=50):
+    """
+    Depth and latency per priority lane
+    
+    Args:
+        sample_size: Number of recently finished jobs used for the average wait
+    
+    Returns:
+        dict: {'use_redis': bool, 'lanes': {lane: {'queued', 'started', 'failed',
+              'oldest_wait_seconds', 'avg_wait_seconds'}}}
+    """
+    _connect()
+    if not (use_redis and lane_queues):
+        return {'use_redis': False, 'lanes': {}}
+    
+    now = datetime.now(timezone.utc)
+    lanes = {}
+    
+    for lane, queue in lane_queues.items():
+        oldest_wait = None
+        head = queue.get_job_ids(0, 1)
+        if head:
+            job = Job.fetch_many(head, connection=redis_conn)[0]
+            if job and job.enqueued_at:
+                oldest_wait = (now - job.enqueued_at).total_seconds()
+        
+        waits = [
+            (job.started_at - job.enqueued_at).total_seconds()
+            for job in Job.fetch_many(
+                queue.finished_job_registry.get_job_ids(-sample_size, -1),
+                connection=redis_conn
+            )
+            if job and job.started_at and job.enqueued_at
+        ]
+        
+        lanes[lane] = {
+            'queued': queue.count,
+            'started': queue.started_job_registry.count,
+            'failed': queue.failed_job_registry.count,
+            'oldest_wait_seconds': round(oldest_wait, 3) if oldest_wait is not None else None,
+            'avg_wait_seconds': round(sum(waits) / len(waits), 3) if waits else None
+        }
+    
+    return {'use_redis': True, 'lanes': lanes}
+
+
+def enqueue_digest_flush(user_id, channel, delay_seconds):
+    """Helper to schedule a digest flush at the end of the digest window (requires Redis)"""
+    _connect()
+    if use_redis and notification_queue:
+        try:
+            job = notification_queue.enqueue_in(
+                timedelta(seconds=delay_seconds),
+                flush_digest_job,
+                user_id=user_id,
+                channel=channel
+            )
+            return {'success': True, 'job_id': job.id}
+        except Exception as e:
+            print(f'Failed to schedule digest flush: {str(e)}')
+            return {'success': False, 'error': str(e)}
+    
+    return {'success': False, 'error': 'Redis not available'}
+
+
 def enqueue_renewals_check():
     """Helper to enqueue renewals check job"""
+    _connect()
     if use_redis and maintenance_queue:
         try:
             job = maintenance_queue.enqueue(check_renewals_job)
@@ -233,8 +470,36 @@ def enqueue_renewals_check():
     return check_renewals_job()
 
 
+def enqueue_export(fingerprint):
+    """Helper to enqueue export generation on the bulk lane, otherwise run it in the current app"""
+    _connect()
+    if use_redis and lane_queues:
+        try:
+            job = lane_queues['bulk'].enqueue(generate_export_job, fingerprint=fingerprint)
+            return {'success': True, 'job_id': job.id}
+        except Exception as e:
+            print(f'Failed to enqueue export: {str(e)}')
+    
+    from src.services.export_service import ExportService
+    return ExportService.run_export(fingerprint)
+
+
+def enqueue_receipt_render(payment_id):
+    """Helper to enqueue receipt rendering on the bulk lane, otherwise render it in the current app"""
+    _connect()
+    if use_redis and lane_queues:
+        try:
+            job = lane_queues['bulk'].enqueue(render_receipt_job, payment_id=payment_id)
+            return {'success': True, 'job_id': job.id}
+        except Exception as e:
+            print(f'Failed to enqueue receipt render: {str(e)}')
+    
+    return _render_receipt(payment_id)
+
+
 def enqueue_cleanup(days_old=30):
     """Helper to enqueue cleanup job"""
+    _connect()
     if use_redis and maintenance_queue:
         try:
             job = maintenance_queue.enqueue(cleanup_files_job, days_old=days_old)
@@ -0,0 +1,410 @@
+"""
+In-app job scheduler
+
+Jobs are defined with cron expressions and executed under a distributed lock
+(Redis SET NX PX, or a lease row in job_locks when Redis is not available),
+so a job never runs twice concurrently, whichever instance, cron script or
+admin endpoint triggers it. Every run is recorded in job_runs with its
+duration, rows affected and outcome.
+"""
+import os
+import json
+import time
+import uuid
+import threading
+from datetime import datetime, timedelta
+from sqlalchemy.exc import IntegrityError
+from src.database.db import db
+from src.models.complaint import JobRun, JobLock
+from src.services import job_queue
+from src.services.scheduler import run_daily_tasks, send_renewal_reminders
+
+
+class CronSchedule:
+    """
+    Standard five-field cron expression: minute hour day-of-month month day-of-week
+
+    Supports '*', numbers, ranges (1-5), lists (1,15) and steps (*/10, 0-30/5).
+    Day-of-week uses 0-6 with 0 (or 7) as Sunday. As in cron, when both
+    day-of-month and day-of-week are restricted a day matching either runs.
+    """
+
+    FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f'Invalid cron expression: {expression}')
+
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = [
+            self._parse_field(field, low, high)
+            for field, (low, high) in zip(fields, self.FIELD_RANGES)
+        ]
+        self.weekdays = {day % 7 for day in weekdays}
+        self.days_restricted = fields[2] != '*'
+        self.weekdays_restricted = fields[4] != '*'
+
+    @staticmethod
+    def _parse_field(field, low, high):
+        values = set()
+        for part in field.split(','):
+            step = 1
+            if '/' in part:
+                part, step = part.split('/')
+                step = int(step)
+
+            if part == '*':
+                start, end = low, high
+            elif '-' in part:
+                start, end = (int(value) for value in part.split('-'))
+            else:
+                start = end = int(part)
+
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f'Invalid cron field: {field}')
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, day):
+        if day.month not in self.months:
+            return False
+        day_match = day.day in self.days
+        weekday_match = (day.weekday() + 1) % 7 in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day_match or weekday_match
+        return day_match and weekday_match
+
+    def matches(self, moment):
+        return (
+            moment.minute in self.minutes
+            and moment.hour in self.hours
+            and self._day_matches(moment)
+        )
+
+    def _search(self, moment, forward):
+        moment = moment.replace(second=0, microsecond=0)
+        times = sorted(
+            (hour, minute) for hour in self.hours for minute in self.minutes
+        )
+        if not forward:
+            times.reverse()
+
+        day = moment.replace(hour=0, minute=0)
+        step = timedelta(days=1 if forward else -1)
+        for _ in range(366 * 5):
+            if self._day_matches(day):
+                for hour, minute in times:
+                    candidate = day.replace(hour=hour, minute=minute)
+                    if (candidate > moment) if forward else (candidate <= moment):
+                        return candidate
+            day += step
+        return None
+
+    def next_after(self, moment):
+        """First slot strictly after moment"""
+        return self._search(moment, forward=True)
+
+    def latest_before(self, moment):
+        """Most recent slot at or before moment"""
+        return self._search(moment, forward=False)
+
+
+class DistributedLock:
+    """
+    Exclusive lock shared by all instances
+
+    Uses Redis SET NX PX with an owner token when Redis is configured, and a
+    lease row in job_locks otherwise. Locks expire after ttl_seconds so a
+    crashed holder never blocks a job forever.
+    """
+
+    _RELEASE_SCRIPT = (
+        "if redis.call('get', KEYS[1]) == ARGV[1] then "
+        "return redis.call('del', KEYS[1]) else return 0 end"
+    )
+
+    def __init__(self, name, ttl_seconds):
+        self.name = name
+        self.ttl_seconds = ttl_seconds
+        self.token = str(uuid.uuid4())
+
+    def acquire(self):
+        if job_queue.use_redis:
+            return bool(job_queue.redis_conn.set(
+                f'job_lock:{self.name}', self.token, nx=True, px=self.ttl_seconds * 1000
+            ))
+
+        now = datetime.utcnow()
+        expires_at = now + timedelta(seconds=self.ttl_seconds)
+        try:
+            db.session.add(JobLock(name=self.name, owner=self.token, acquired_at=now, expires_at=expires_at))
+            db.session.commit()
+            return True
+        except IntegrityError:
+            db.session.rollback()
+
+        # Take over a lease whose holder died without releasing it
+        taken = JobLock.query.filter(
+            JobLock.name == self.name,
+            JobLock.expires_at < now
+        ).update({'owner': self.token, 'acquired_at': now, 'expires_at': expires_at})
+        db.session.commit()
+        return taken == 1
+
+    def release(self):
+        if job_queue.use_redis:
+            job_queue.redis_conn.eval(self._RELEASE_SCRIPT, 1, f'job_lock:{self.name}', self.token)
+            return
+
+        db.session.rollback()
+        JobLock.query.filter_by(name=self.name, owner=self.token).delete()
+        db.session.commit()
+
+
+class ScheduledJob:
+    """
+    A named job, optionally scheduled
+
+    Args:
+        name: Unique job name (used in run history and the admin API)
+        func: Callable returning {'success': bool, 'rows_affected': int, ...}
+        schedule: Cron expression, or None for jobs that only run on demand
+        lock_name: Lock shared with jobs that must not overlap (defaults to name)
+        lock_ttl: Seconds after which an unreleased lock expires
+        description: Human readable description
+    """
+
+    def __init__(self, name, func, schedule=None, lock_name=None, lock_ttl=3600, description=''):
+        self.name = name
+        self.func = func
+        self.schedule = CronSchedule(schedule) if schedule else None
+        self.lock_name = lock_name or name
+        self.lock_ttl = lock_ttl
+        self.description = description
+
+    def to_dict(self, now=None):
+        now = now or datetime.utcnow()
+        next_run = self.schedule.next_after(now) if self.schedule else None
+        return {
+            'name': self.name,
+            'description': self.description,
+            'schedule': self.schedule.expression if self.schedule else None,
+            'next_run_at': next_run.isoformat() if next_run else None,
+            'lock_name': self.lock_name
+        }
+
+
+def _daily_tasks_job():
+    results = run_daily_tasks()
+    return {
+        'success': all(result.get('success') for result in results.values()),
+        'rows_affected': (
+            results['expiry_check'].get('expired_count', 0)
+            + results['renewal_reminders'].get('reminders_sent', 0)
+            + results['unread_counts'].get('repaired_count', 0)
+        ),
+        **results
+    }
+
+
+def _renewal_reminders_job():
+    result = send_renewal_reminders()
+    result['rows_affected'] = result.get('reminders_sent', 0)
+    return result
+
+
+def _database_backup_job():
+    from src.services.backup_service import BackupService
+
+    backup_service = BackupService()
+    backup = backup_service.create_backup()
+    if not backup['success']:
+        return backup
+
+    cleanup = backup_service.cleanup_old_backups()
+    return {
+        'success': True,
+        'rows_affected': 1 + cleanup.get('deleted_count', 0),
+        'backup': backup,
+        'cleanup': cleanup
+    }
+
+
+def _backup_verification_job():
+    from src.services.backup_verification_service import BackupVerificationService
+
+    service = BackupVerificationService()
+    verification = service.verify_backups()
+    restore = service.test_restore()
+    errors = [result['error'] for result in (verification, restore) if result.get('error')]
+    return {
+        'success': verification['success'] and restore['success'],
+        'rows_affected': verification.get('verified', 0),
+        'verification': verification,
+        'restore': restore,
+        'error': '; '.join(errors) or None
+    }
+
+
+def _export_cleanup_job():
+    from src.services.export_service import ExportService
+    result = ExportService.sweep_expired()
+    result['tombstones_deleted'] = ExportService.purge_tombstones()
+    result['rows_affected'] += result['tombstones_deleted']
+    return result
+
+
+def _monthly_report_job():
+    from src.services.pdf_service import PDFService
+    previous_month = datetime.utcnow().replace(day=1) - timedelta(days=1)
+    key = PDFService.close_month(previous_month.month, previous_month.year)
+    return {'success': True, 'rows_affected': 1, 'key': key}
+
+
+JOBS = {}
+
+
+def register_job(job):
+    """Add a job to the scheduler registry"""
+    JOBS[job.name] = job
+    return job
+
+
+# Daily tasks and manual renewal reminders share a lock so reminders are never sent twice
+register_job(ScheduledJob(
+    'daily_tasks', _daily_tasks_job,
+    schedule=os.environ.get('SCHEDULE_DAILY_TASKS', '0 2 * * *'),
+    lock_name='subscriptions',
+    description='Expire subscriptions, send renewal reminders, reconcile unread counters'
+))
+register_job(ScheduledJob(
+    'renewal_reminders', _renewal_reminders_job,
+    lock_name='subscriptions',
+    description='Send D-14/D-7/D-3 renewal reminders'
+))
+register_job(ScheduledJob(
+    'database_backup', _database_backup_job,
+    schedule=os.environ.get('SCHEDULE_DATABASE_BACKUP', '0 3 * * *'),
+    lock_ttl=4 * 3600,
+    description='Create a database backup and apply retention'
+))
+# Shares the backup lock: retention must not delete chunks a restore drill is reading
+register_job(ScheduledJob(
+    'backup_verification', _backup_verification_job,
+    schedule=os.environ.get('SCHEDULE_BACKUP_VERIFICATION', '0 5 * * 0'),
+    lock_name='database_backup',
+    lock_ttl=4 * 3600,
+    description='Re-hash all backups and test-restore the latest one into a scratch database'
+))
+register_job(ScheduledJob(
+    'export_cleanup', _export_cleanup_job,
+    schedule=os.environ.get('SCHEDULE_EXPORT_CLEANUP', '30 * * * *'),
+    description='Delete expired exports, their files and old delta-export tombstones'
+))
+register_job(ScheduledJob(
+    'monthly_report', _monthly_report_job,
+    schedule=os.environ.get('SCHEDULE_MONTHLY_REPORT', '15 0 1 * *'),
+    lock_ttl=2 * 3600,
+    description="Compute and store the previous month's report dataset, chart and PDF"
+))
+
+
+def run_job(name, triggered_by='manual', scheduled_for=None):
+    """
+    Run a registered job under its distributed lock and record the run
+
+    Args:
+        name: Registered job name
+        triggered_by: 'schedule', 'cron' or 'manual:<username>'
+        scheduled_for: Cron slot being executed; a slot that already has a run is skipped
+
+    Returns:
+        dict: {'success': bool, 'run': dict, 'result': dict} or
+              {'success': False, 'skipped': True, 'error': str} when not executed
+    """
+    job = JOBS.get(name)
+    if job is None:
+        return {'success': False, 'skipped': True, 'error': f'Unknown job: {name}'}
+
+    lock = DistributedLock(job.lock_name, job.lock_ttl)
+    if not lock.acquire():
+        return {'success': False, 'skipped': True, 'error': f'Job {job.lock_name} is already running'}
+
+    try:
+        if scheduled_for and JobRun.query.filter_by(job_name=name, scheduled_for=scheduled_for).first():
+            return {'success': False, 'skipped': True, 'error': 'Job already ran for this slot'}
+
+        run = JobRun(job_name=name, triggered_by=triggered_by, scheduled_for=scheduled_for, status='running')
+        db.session.add(run)
+        db.session.commit()
+        run_id = run.id
+
+        started = time.monotonic()
+        try:
+            result = job.func()
+        except Exception as e:
+            db.session.rollback()
+            result = {'success': False, 'error': str(e)}
+
+        run = db.session.get(JobRun, run_id)
+        run.finished_at = datetime.utcnow()
+        run.duration_ms = int((time.monotonic() - started) * 1000)
+        run.status = 'success' if result.get('success') else 'failed'
+        run.rows_affected = result.get('rows_affected')
+        run.error_message = result.get('error')
+        run.result = json.dumps(result, default=str, ensure_ascii=False)
+        db.session.commit()
+
+        return {'success': run.status == 'success', 'run': run.to_dict(), 'result': result}
+
+    finally:
+        lock.release()
+
+
+def run_due_jobs(now=None):
+    """
+    Run every scheduled job whose cron slot matches the current minute
+
+    Returns:
+        dict: Job name -> run_job() result for the jobs that were due
+    """
+    now = (now or datetime.utcnow()).replace(second=0, microsecond=0)
+    return {
+        job.name: run_job(job.name, triggered_by='schedule', scheduled_for=now)
+        for job in JOBS.values()
+        if job.schedule and job.schedule.matches(now)
+    }
+
+
+def run_latest_slot(name, triggered_by='cron'):
+    """
+    Run a job for its most recent cron slot (used by the standalone cron scripts,
+    so they never repeat a slot the in-app scheduler already executed)
+    """
+    job = JOBS[name]
+    scheduled_for = job.schedule.latest_before(datetime.utcnow()) if job.schedule else None
+    return run_job(name, triggered_by=triggered_by, scheduled_for=scheduled_for)
+
+
+def start_scheduler(app):
+    """
+    Start the in-app scheduler in a daemon thread
+
+    Every process may start it: the distributed lock and the per-slot run
+    record make sure each slot executes once across all instances.
+    """
+    def loop():
+        while True:
+            now = datetime.utcnow()
+            time.sleep(60 - now.second - now.microsecond / 1_000_000)
+            try:
+                with app.app_context():
+                    run_due_jobs()
+                    db.session.remove()
+            except Exception as e:
+                print(f'Scheduler tick failed: {str(e)}')
+
+    thread = threading.Thread(target=loop, name='job-scheduler', daemon=True)
+    thread.start()
+    return thread
@@ -1,24 +1,42 @@
 import os
+import json
 from datetime import datetime
 from flask import current_app
+from markupsafe import escape
 from flask_mail import Mail, Message
-from twilio.rest import Client
-from twilio.base.exceptions import TwilioRestException
-import arabic_reshaper
-from bidi.algorithm import get_display
 from src.database.db import db
-from src.models.complaint import Notification
+from src.models.complaint import Notification, User
+from src.utils import arabic_text
+from src.utils.lazy_import import lazy_module
+from src.services import notification_stream  # noqa: F401  (publishes notifications to live streams on commit)
+
+twilio_rest = lazy_module('twilio.rest')
+twilio_exceptions = lazy_module('twilio.base.exceptions')
 
 mail = Mail()
 
 class NotificationService:
     
+    # Non-critical email/SMS notifications are buffered per user and channel for
+    # this many seconds and delivered as a single digest (0 disables digests)
+    DIGEST_WINDOW_SECONDS = int(os.environ.get('NOTIFICATION_DIGEST_WINDOW_SECONDS', 300))
+    
+    # Notification types that are always delivered immediately
+    CRITICAL_TYPES = {
+        'renewal_reminder_3d',
+        'account_locked',
+        'payment_approved',
+        'payment_rejected',
+        'welcome',
+        'backup_failure',
+        'backup_verification_failure'
+    }
+    
     @staticmethod
     def _reshape_arabic(text):
         """Reshape Arabic text for proper RTL display"""
         try:
-            reshaped_text = arabic_reshaper.reshape(text)
-            return get_display(reshaped_text)
+            return arabic_text.shape(text)
         except Exception as e:
             current_app.logger.warning(f'Arabic reshaping failed: {str(e)}')
             return text
@@ -106,7 +124,7 @@ class NotificationService:
             if not user.phone_number:
                 return {'success': False, 'error': 'User has no phone number'}
             
-            client = Client(account_sid, auth_token)
+            client = twilio_rest.Client(account_sid, auth_token)
             
             reshaped_message = NotificationService._reshape_arabic(message)
             
@@ -119,7 +137,7 @@ class NotificationService:
             current_app.logger.info(f'SMS sent to {user.phone_number} - SID: {twilio_message.sid}')
             return {'success': True, 'error': None}
             
-        except TwilioRestException as e:
+        except twilio_exceptions.TwilioRestException as e:
             error_msg = f'Twilio error: {str(e)}'
             current_app.logger.error(error_msg)
             return {'success': False, 'error': error_msg}
@@ -157,28 +175,23 @@ class NotificationService:
             db.session.add(notification)
             db.session.flush()
             
+            if NotificationService._should_digest(notification_type, channel):
+                notification.status = 'digest_pending'
+                db.session.commit()
+                if NotificationService._buffer_for_digest(user, notification, context):
+                    return notification
+            
             if channel in ['email', 'all']:
                 result = NotificationService._send_email_for_type(
                     user, notification_type, **context
                 )
-                if result['success']:
-                    notification.status = 'sent'
-                    notification.sent_at = datetime.utcnow()
-                else:
-                    notification.status = 'failed'
-                    notification.error_message = result['error']
+                NotificationService._record_result(notification, result)
             
             if channel in ['sms', 'all']:
                 sms_message = NotificationService._get_sms_template(notification_type, **context)
                 if sms_message:
                     result = NotificationService.send_sms(user, sms_message)
-                    if result['success']:
-                        notification.status = 'sent'
-                        notification.sent_at = datetime.utcnow()
-                    else:
-                        if notification.status != 'sent':
-                            notification.status = 'failed'
-                        notification.error_message = result['error']
+                    NotificationService._record_result(notification, result)
             
             if channel == 'in_app':
                 notification.status = 'sent'
@@ -192,6 +205,187 @@ class NotificationService:
             current_app.logger.error(f'Failed to queue notification: {str(e)}')
             raise
     
+    @staticmethod
+    def mark_read(user_id, notification_id=None):
+        """
+        Mark a user's notification (or all of them) as read and keep the
+        user's unread counter in step. Caller commits.
+        
+        Only rows that were still unread are counted, so concurrent requests
+        marking the same notification decrement the counter once.
+        
+        Args:
+            user_id: User ID
+            notification_id: Optional notification ID (all notifications if omitted)
+            
+        Returns:
+            int: Number of notifications that changed to read
+        """
+        query = Notification.query.filter_by(user_id=user_id, is_read=False)
+        if notification_id:
+            query = query.filter_by(notification_id=notification_id)
+        
+        marked = query.update({'is_read': True}, synchronize_session=False)
+        
+        if marked:
+            User.query.filter_by(user_id=user_id).update({
+                User.unread_notifications_count: User.unread_notifications_count - marked,
+                User.updated_at: User.updated_at
+            }, synchronize_session=False)
+        
+        return marked
+    
+    @staticmethod
+    def _record_result(notification, result):
+        """Update notification delivery status from a send_email/send_sms result"""
+        if result['success']:
+            notification.status = 'sent'
+            notification.sent_at = datetime.utcnow()
+        else:
+            if notification.status != 'sent':
+                notification.status = 'failed'
+            notification.error_message = result['error']
+    
+    @staticmethod
+    def _digest_key(user_id, channel):
+        """Generate Redis key for a user's pending digest on a channel"""
+        return f'notification_digest:{user_id}:{channel}'
+    
+    @staticmethod
+    def _should_digest(notification_type, channel):
+        """
+        Check whether a notification should be buffered for a digest
+        
+        Digests need Redis: the buffer must be shared between web workers and
+        the delayed flush runs on the RQ worker. Without Redis every
+        notification is delivered immediately.
+        """
+        from src.services.job_queue import use_redis
+        
+        return (
+            NotificationService.DIGEST_WINDOW_SECONDS > 0
+            and channel in ['email', 'sms', 'all']
+            and notification_type not in NotificationService.CRITICAL_TYPES
+            and use_redis
+        )
+    
+    @staticmethod
+    def _buffer_for_digest(user, notification, context):
+        """
+        Append a notification to the user's digest buffer
+        
+        The first entry of a buffer schedules the flush job for the end of the
+        digest window; later entries just join the list.
+        
+        Returns:
+            bool: True if buffered, False if it must be delivered immediately
+        """
+        from src.services.job_queue import redis_conn, enqueue_digest_flush
+        
+        key = NotificationService._digest_key(user.user_id, notification.channel)
+        entry = json.dumps({
+            'notification_id': notification.notification_id,
+            'type': notification.type,
+            'message': notification.message,
+            'context': context
+        }, default=str)
+        
+        try:
+            if redis_conn.rpush(key, entry) == 1:
+                result = enqueue_digest_flush(
+                    user.user_id,
+                    notification.channel,
+                    NotificationService.DIGEST_WINDOW_SECONDS
+                )
+                if not result['success']:
+                    redis_conn.lrem(key, 1, entry)
+                    return False
+            return True
+        except Exception as e:
+            current_app.logger.warning(f'Failed to buffer notification for digest: {str(e)}')
+            return False
+    
+    @staticmethod
+    def flush_digest(user_id, channel):
+        """
+        Deliver all buffered notifications of a user on a channel
+        
+        A buffer holding a single notification is sent with its regular
+        template; larger buffers are rendered into one digest email / SMS.
+        
+        Args:
+            user_id: User ID
+            channel: 'email', 'sms' or 'all'
+            
+        Returns:
+            dict: {'success': bool, 'delivered': int}
+        """
+        from src.services.job_queue import redis_conn
+        
+        key = NotificationService._digest_key(user_id, channel)
+        pipe = redis_conn.pipeline()
+        pipe.lrange(key, 0, -1)
+        pipe.delete(key)
+        raw_entries, _ = pipe.execute()
+        
+        entries = [json.loads(raw) for raw in raw_entries]
+        if not entries:
+            return {'success': True, 'delivered': 0}
+        
+        notifications = Notification.query.filter(
+            Notification.notification_id.in_([e['notification_id'] for e in entries])
+        ).all()
+        
+        user = User.query.get(user_id)
+        if not user:
+            for notification in notifications:
+                notification.status = 'failed'
+                notification.error_message = 'User not found'
+            db.session.commit()
+            return {'success': False, 'delivered': 0}
+        
+        results = []
+        
+        if channel in ['email', 'all']:
+            if len(entries) == 1:
+                results.append(NotificationService._send_email_for_type(
+                    user, entries[0]['type'], **entries[0]['context']
+                ))
+            else:
+                items = ''.join(f'<li>{escape(e["message"])}</li>' for e in entries)
+                results.append(NotificationService.send_email(
+                    user,
+                    f'لديك {len(entries)} إشعارات جديدة',
+                    'notification_digest',
+                    user_name=user.full_name,
+                    count=len(entries),
+                    items=items
+                ))
+        
+        if channel in ['sms', 'all']:
+            sms_messages = [
+                NotificationService._get_sms_template(e['type'], **e['context'])
+                for e in entries
+            ]
+            sms_messages = [m for m in sms_messages if m]
+            if len(sms_messages) == 1:
+                results.append(NotificationService.send_sms(user, sms_messages[0]))
+            elif sms_messages:
+                results.append(NotificationService.send_sms(
+                    user,
+                    f'لديك {len(sms_messages)} إشعارات جديدة: ' + ' | '.join(sms_messages)
+                ))
+        
+        for notification in notifications:
+            for result in results:
+                NotificationService._record_result(notification, result)
+            if not results:
+                notification.status = 'sent'
+                notification.sent_at = datetime.utcnow()
+        
+        db.session.commit()
+        return {'success': True, 'delivered': len(entries)}
+    
     @staticmethod
     def _send_email_for_type(user, notification_type, **context):
         """Send email based on notification type"""
@@ -0,0 +1,216 @@
+"""
+Real-time notification streaming (Server-Sent Events)
+
+Notifications are published once their transaction commits:
+- With Redis: on a per-user pub/sub channel, shared by every worker process
+- Without Redis: through an in-process broker, with a periodic database
+  catch-up so notifications created by other processes are still delivered
+"""
+import os
+import json
+import time
+import queue
+import threading
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from src.database.db import db
+from src.models.complaint import Notification
+from src.services import job_queue
+
+HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+MAX_STREAM_SECONDS = int(os.environ.get('SSE_MAX_STREAM_SECONDS', 1800))
+RETRY_MILLISECONDS = int(os.environ.get('SSE_RETRY_MILLISECONDS', 5000))
+REPLAY_LIMIT = int(os.environ.get('SSE_REPLAY_LIMIT', 100))
+
+_PENDING_KEY = 'pending_notification_events'
+
+
+def channel_name(user_id):
+    """Redis pub/sub channel for a user's notifications"""
+    return f'notifications:{user_id}'
+
+
+class InProcessBroker:
+    """Fan-out of notification events to subscribers living in this process"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscribers = {}
+
+    def subscribe(self, user_id):
+        subscriber = queue.Queue(maxsize=REPLAY_LIMIT)
+        with self._lock:
+            self._subscribers.setdefault(user_id, set()).add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, user_id, subscriber):
+        with self._lock:
+            subscribers = self._subscribers.get(user_id)
+            if subscribers:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[user_id]
+
+    def publish(self, user_id, payload):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscriber in subscribers:
+            try:
+                subscriber.put_nowait(payload)
+            except queue.Full:
+                # Slow client: drop the event, it is recovered by the database catch-up
+                pass
+
+
+broker = InProcessBroker()
+
+
+def publish(user_id, payload):
+    """
+    Publish a notification event to a user's live streams
+
+    Args:
+        user_id: Recipient user ID
+        payload: Notification dictionary (Notification.to_dict())
+    """
+    if job_queue.use_redis:
+        try:
+            job_queue.redis_conn.publish(channel_name(user_id), json.dumps(payload))
+            return
+        except Exception as e:
+            print(f'Notification publish failed, using in-process broker: {str(e)}')
+    broker.publish(user_id, payload)
+
+
+@event.listens_for(Notification, 'after_insert')
+def collect_notification_event(mapper, connection, target):
+    """Hold inserted notifications on the session until the transaction commits"""
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault(_PENDING_KEY, []).append(target.to_dict())
+
+
+@event.listens_for(Session, 'after_commit')
+def publish_committed_notifications(session):
+    for payload in session.info.pop(_PENDING_KEY, []):
+        publish(payload['user_id'], payload)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_rolled_back_notifications(session):
+    session.info.pop(_PENDING_KEY, None)
+
+
+def _resume_point(user_id, last_event_id):
+    """Creation time of the client's last received notification, if it is theirs"""
+    reference = db.session.get(Notification, last_event_id) if last_event_id else None
+    if reference is None or reference.user_id != user_id:
+        return None
+    return reference.created_at
+
+
+def _notifications_since(user_id, since):
+    """Notifications created at or after `since` (duplicates are filtered by the caller)"""
+    notifications = Notification.query.filter(
+        Notification.user_id == user_id,
+        Notification.created_at >= since
+    ).order_by(Notification.created_at.asc()).limit(REPLAY_LIMIT).all()
+    return [notification.to_dict() for notification in notifications]
+
+
+def format_event(payload):
+    """Serialize a notification as an SSE frame whose id is the notification ID"""
+    data = json.dumps(payload, ensure_ascii=False)
+    return f"id: {payload['notification_id']}\nevent: notification\ndata: {data}\n\n"
+
+
+class _RedisSubscription:
+    def __init__(self, user_id):
+        self.pubsub = job_queue.redis_conn.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(channel_name(user_id))
+
+    def get(self, timeout):
+        message = self.pubsub.get_message(timeout=timeout)
+        if message is None:
+            return None
+        return json.loads(message['data'])
+
+    def close(self):
+        self.pubsub.close()
+
+
+class _LocalSubscription:
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.queue = broker.subscribe(user_id)
+
+    def get(self, timeout):
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        broker.unsubscribe(self.user_id, self.queue)
+
+
+def stream_notifications(user_id, last_event_id=None):
+    """
+    Generator of SSE frames for a user's notification stream
+
+    Subscribes before replaying missed notifications so nothing published in
+    between is lost; duplicates are filtered by notification ID. The stream
+    ends after MAX_STREAM_SECONDS and the client reconnects with Last-Event-ID.
+
+    Args:
+        user_id: Subscribed user ID
+        last_event_id: Last notification ID received by the client, if resuming
+
+    Yields:
+        str: SSE frames (events, heartbeats and the retry hint)
+    """
+    subscription = _RedisSubscription(user_id) if job_queue.use_redis else _LocalSubscription(user_id)
+    delivered = {last_event_id} if last_event_id else set()
+    since = datetime.utcnow()
+    deadline = time.monotonic() + MAX_STREAM_SECONDS
+
+    def emit(payload):
+        nonlocal since
+        if payload['notification_id'] in delivered:
+            return None
+        delivered.add(payload['notification_id'])
+        if payload['created_at']:
+            since = max(since, datetime.fromisoformat(payload['created_at']))
+        return format_event(payload)
+
+    try:
+        yield f'retry: {RETRY_MILLISECONDS}\n\n'
+
+        resume_from = _resume_point(user_id, last_event_id)
+        if resume_from is not None:
+            for payload in _notifications_since(user_id, resume_from):
+                frame = emit(payload)
+                if frame:
+                    yield frame
+        db.session.remove()
+
+        while time.monotonic() < deadline:
+            payload = subscription.get(timeout=HEARTBEAT_SECONDS)
+            if payload is not None:
+                frame = emit(payload)
+                if frame:
+                    yield frame
+                continue
+
+            if not job_queue.use_redis:
+                # Without Redis other processes cannot reach this broker
+                for missed in _notifications_since(user_id, since):
+                    frame = emit(missed)
+                    if frame:
+                        yield frame
+                db.session.remove()
+
+            yield ': heartbeat\n\n'
+    finally:
+        subscription.close()
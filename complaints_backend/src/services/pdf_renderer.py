@@ -0,0 +1,246 @@
+"""
+PDF rendering pool
+
+WeasyPrint rendering is CPU bound and holds the GIL for hundreds of
+milliseconds per document, so HTML is rendered to PDF outside the request
+thread:
+
+- 'pool'   (default) a process pool of pre-warmed WeasyPrint workers; fonts
+           and fontconfig caches are loaded once per worker, not per render
+- 'queue'  an RQ job on the interactive lane, rendered by the worker fleet
+- 'inline' in the calling thread (previous behaviour)
+
+Pending renders are bounded: when PDF_RENDER_MAX_PENDING renders are already
+queued, new ones wait up to PDF_RENDER_QUEUE_TIMEOUT seconds and then fail
+with RenderQueueFull instead of piling up. A render taking longer than
+PDF_RENDER_TIMEOUT seconds is aborted inside its worker and fails with
+RenderTimeout; the worker and the other renders carry on. Only a worker stuck
+in native code past the grace period gets its pool replaced, after the
+pool's other renders finish.
+
+Every app process (gunicorn worker, RQ worker) owns a pool, so by default the
+host's cores are split across the WEB_CONCURRENCY gunicorn workers.
+
+Only this module is imported by the pool workers (spawn start method), so
+they never load Flask, the models or the database.
+"""
+import os
+import time
+import signal
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, wait, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+
+RENDER_MODE = os.environ.get('PDF_RENDER_MODE', 'pool')
+WORKERS = int(os.environ.get('PDF_RENDER_WORKERS', 0)) or max(
+    1, (os.cpu_count() or 1) // int(os.environ.get('WEB_CONCURRENCY', 1))
+)
+MAX_PENDING = int(os.environ.get('PDF_RENDER_MAX_PENDING', 0)) or WORKERS * 4
+QUEUE_TIMEOUT = float(os.environ.get('PDF_RENDER_QUEUE_TIMEOUT', 10))
+RENDER_TIMEOUT = float(os.environ.get('PDF_RENDER_TIMEOUT', 60))
+# Extra seconds the caller waits for the worker to abort a render itself
+RENDER_GRACE = 5
+MAX_TASKS_PER_CHILD = int(os.environ.get('PDF_RENDER_MAX_TASKS_PER_CHILD', 200))
+
+_WARMUP_HTML = (
+    '<html dir="rtl"><body style="font-family: Arial, Tahoma, sans-serif">'
+    '<p>تهيئة الخطوط 0123456789</p></body></html>'
+)
+
+
+class RenderError(Exception):
+    """A PDF could not be rendered"""
+
+
+class RenderQueueFull(RenderError):
+    """Too many renders are already pending"""
+
+
+class RenderTimeout(RenderError):
+    """A render exceeded PDF_RENDER_TIMEOUT"""
+
+
+# ===================== Worker side =====================
+
+def warm_worker():
+    """Pool initializer: import WeasyPrint and render once so fonts are cached"""
+    from weasyprint import HTML
+    HTML(string=_WARMUP_HTML).write_pdf()
+
+
+def render_html(html, base_url=None):
+    """Render an HTML document to PDF bytes"""
+    from weasyprint import HTML
+    return HTML(string=html, base_url=base_url).write_pdf()
+
+
+def render_with_timeout(html, base_url=None, timeout=RENDER_TIMEOUT):
+    """
+    Pool task: render_html aborted by SIGALRM after timeout seconds, so a
+    runaway render frees its worker without touching the other workers
+    """
+    if not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+        return render_html(html, base_url)
+
+    def expire(signum, frame):
+        raise RenderTimeout(f'PDF render exceeded {timeout}s')
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return render_html(html, base_url)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+# ===================== Caller side =====================
+
+class RenderPool:
+    """
+    Bounded, lazily started process pool
+
+    The executor is created on first use and again after a fork, so every
+    application process (gunicorn worker, RQ worker) owns its own pool.
+    """
+
+    def __init__(self, workers=WORKERS, max_pending=MAX_PENDING):
+        self.workers = workers
+        self.max_pending = max_pending
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        self._pending = set()
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=warm_worker,
+                    max_tasks_per_child=MAX_TASKS_PER_CHILD
+                )
+                self._pid = os.getpid()
+            return self._executor
+
+    def _reset(self, executor, stuck):
+        """Send new renders to a fresh pool and retire one whose worker is stuck or died"""
+        with self._lock:
+            if self._executor is not executor:
+                return
+            self._executor = None
+            others = [f for f in self._pending if f.executor is executor and f is not stuck]
+        threading.Thread(target=self._retire, args=(executor, others), daemon=True).start()
+
+    @staticmethod
+    def _retire(executor, futures):
+        # Renders already on the old pool finish first (each is bounded by
+        # its own alarm); then the executor, which cannot cancel a running
+        # task, has its processes killed so the stuck render stops using a core
+        wait(futures, timeout=RENDER_TIMEOUT + RENDER_GRACE)
+        for process in list((getattr(executor, '_processes', None) or {}).values()):
+            process.kill()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _done(self, future):
+        with self._lock:
+            self._pending.discard(future)
+        self._slots.release()
+
+    def submit(self, html, base_url=None, queue_timeout=QUEUE_TIMEOUT):
+        """
+        Queue a render and return its Future; the pending slot is released
+        when the render completes
+
+        Raises:
+            RenderQueueFull: No slot freed up within queue_timeout seconds
+        """
+        if not self._slots.acquire(timeout=queue_timeout):
+            raise RenderQueueFull(f'{self.max_pending} PDF renders already pending')
+
+        try:
+            executor = self._get_executor()
+            future = executor.submit(render_with_timeout, html, base_url, RENDER_TIMEOUT)
+        except Exception:
+            self._slots.release()
+            raise
+        future.executor = executor
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+        return future
+
+    def result(self, future, timeout=RENDER_TIMEOUT + RENDER_GRACE):
+        """
+        Wait for a submitted render
+
+        The worker aborts a render after RENDER_TIMEOUT; one that is still
+        running when timeout expires is stuck where the alarm cannot reach.
+
+        Raises:
+            RenderTimeout: The render did not finish in time
+            RenderError: The worker died
+        """
+        executor = future.executor
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.cancel()
+            self._reset(executor, future)
+            raise RenderTimeout(f'PDF render exceeded {timeout}s')
+        except BrokenProcessPool as e:
+            self._reset(executor, future)
+            raise RenderError(f'PDF render worker died: {str(e)}')
+
+    def render(self, html, base_url=None):
+        return self.result(self.submit(html, base_url))
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+pool = RenderPool()
+
+
+def _render_on_queue(html, base_url):
+    from src.services import job_queue
+
+    if not (job_queue.use_redis and job_queue.lane_queues):
+        return pool.render(html, base_url)
+
+    queue = job_queue.lane_queues['interactive']
+    if queue.count >= MAX_PENDING:
+        raise RenderQueueFull(f'{queue.count} jobs already queued')
+
+    job = queue.enqueue(render_html, html, base_url, job_timeout=int(RENDER_TIMEOUT), result_ttl=60)
+    deadline = time.monotonic() + QUEUE_TIMEOUT + RENDER_TIMEOUT
+    while time.monotonic() < deadline:
+        status = job.get_status(refresh=True)
+        if status == 'finished':
+            return job.return_value()
+        if status in ('failed', 'stopped', 'canceled'):
+            raise RenderError(f'PDF render job {job.id} {status}')
+        time.sleep(0.05)
+
+    job.cancel()
+    raise RenderTimeout(f'PDF render job {job.id} did not finish in time')
+
+
+def render(html, base_url=None):
+    """
+    Render HTML to PDF bytes using the configured PDF_RENDER_MODE
+
+    Raises:
+        RenderQueueFull, RenderTimeout, RenderError
+    """
+    if RENDER_MODE == 'inline':
+        return render_html(html, base_url)
+    if RENDER_MODE == 'queue':
+        return _render_on_queue(html, base_url)
+    return pool.render(html, base_url)
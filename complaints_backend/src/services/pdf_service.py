@@ -1,29 +1,38 @@
 import os
 import io
+import json
+import base64
+import hashlib
+import zipfile
+from concurrent.futures import wait, FIRST_COMPLETED
 from datetime import datetime, timedelta
 from flask import render_template
-from weasyprint import HTML
-import arabic_reshaper
-from bidi.algorithm import get_display
-import matplotlib
-matplotlib.use('Agg')
-import matplotlib.pyplot as plt
-from src.models.complaint import Complaint, Payment, ComplaintComment, ComplaintAttachment, Subscription, User
+from sqlalchemy import func, extract, cast, case, select, Integer
+from src.models.complaint import (
+    Complaint, Payment, ComplaintComment, ComplaintAttachment, ComplaintCategory, ComplaintStatus,
+    Subscription, User, Settings
+)
 from src.database.db import db
+from src.services import pdf_renderer
+from src.utils import arabic_text
+from src.core.storage import get_storage_backend
+from src.services.export_datasets import complaint_conditions
+
+ARTIFACT_FOLDER = os.environ.get('PDF_ARTIFACT_FOLDER', 'pdf_artifacts')
+BUNDLE_MAX_REPORTS = int(os.environ.get('PDF_BUNDLE_MAX_REPORTS', 1000))
+MONTHLY_REPORT_CHARTS = os.environ.get('MONTHLY_REPORT_CHARTS', 'true').lower() == 'true'
 
 class PDFService:
     """Service for generating PDF reports with Arabic RTL support"""
     
+    _storage = None
+    
     @staticmethod
     def _reshape_arabic_text(text):
         """Reshape Arabic text for proper RTL display"""
-        if not text:
-            return text
         try:
-            reshaped_text = arabic_reshaper.reshape(text)
-            bidi_text = get_display(reshaped_text)
-            return bidi_text
-        except:
+            return arabic_text.shape(text)
+        except Exception:
             return text
     
     @staticmethod
@@ -49,6 +58,11 @@ class PDFService:
         Returns:
             bytes: PDF file content
         """
+        return pdf_renderer.render(PDFService.complaint_report_html(complaint_id))
+    
+    @staticmethod
+    def complaint_report_html(complaint_id):
+        """HTML of a complaint report, ready for the renderer"""
         complaint = Complaint.query.get(complaint_id)
         if not complaint:
             raise ValueError(f'Complaint {complaint_id} not found')
@@ -99,147 +113,128 @@ class PDFService:
         
         context = PDFService._prepare_template_context(context)
         
-        html_content = render_template('pdfs/complaint_report.html', **context)
-        
-        pdf_file = HTML(string=html_content).write_pdf()
-        
-        return pdf_file
+        return render_template('pdfs/complaint_report.html', **context)
+    
+    MONTH_NAMES = {
+        1: 'يناير', 2: 'فبراير', 3: 'مارس', 4: 'أبريل',
+        5: 'مايو', 6: 'يونيو', 7: 'يوليو', 8: 'أغسطس',
+        9: 'سبتمبر', 10: 'أكتوبر', 11: 'نوفمبر', 12: 'ديسمبر'
+    }
     
     @staticmethod
-    def generate_monthly_report(month, year):
+    def _month_bounds(month, year):
+        start_date = datetime(year, month, 1)
+        if month == 12:
+            end_date = datetime(year + 1, 1, 1)
+        else:
+            end_date = datetime(year, month + 1, 1)
+        return start_date, end_date
+    
+    @staticmethod
+    def _whole_days(start, end):
+        """SQL expression for the whole days between two timestamps, like timedelta.days"""
+        if db.engine.dialect.name == 'postgresql':
+            return extract('day', end - start)
+        return cast(func.julianday(end) - func.julianday(start), Integer)
+    
+    @staticmethod
+    def monthly_report_dataset(month, year):
         """
-        Generate monthly statistics PDF report
+        Compute the statistics of a monthly report with five aggregate queries
+        (complaints by status and category, complaints closed in the month,
+        payments, subscriptions and users, currency)
         
         Args:
             month: int - Month (1-12)
             year: int - Year
         
         Returns:
-            bytes: PDF file content
+            dict: JSON-serializable dataset (month, year, month_name, stats)
         """
-        from sqlalchemy import func, extract
+        start_date, end_date = PDFService._month_bounds(month, year)
         
-        start_date = datetime(year, month, 1)
-        if month == 12:
-            end_date = datetime(year + 1, 1, 1)
-        else:
-            end_date = datetime(year, month + 1, 1)
-        
-        total_complaints = Complaint.query.filter(
-            Complaint.submitted_at >= start_date,
-            Complaint.submitted_at < end_date
-        ).count()
-        
-        complaints_by_status = db.session.query(
-            Complaint.status_id,
+        complaint_groups = db.session.query(
+            ComplaintStatus.status_name,
+            ComplaintCategory.category_name,
             func.count(Complaint.complaint_id)
+        ).outerjoin(
+            ComplaintStatus, Complaint.status_id == ComplaintStatus.status_id
+        ).outerjoin(
+            ComplaintCategory, Complaint.category_id == ComplaintCategory.category_id
         ).filter(
             Complaint.submitted_at >= start_date,
             Complaint.submitted_at < end_date
-        ).group_by(Complaint.status_id).all()
+        ).group_by(ComplaintStatus.status_name, ComplaintCategory.category_name).all()
         
+        total_complaints = 0
         status_counts = {}
-        for status_id, count in complaints_by_status:
-            status = db.session.query(db.Model.metadata.tables['complaint_statuses']).filter_by(status_id=status_id).first()
-            if status:
-                status_counts[status.status_name] = count
+        category_counts = {}
+        for status_name, category_name, count in complaint_groups:
+            total_complaints += count
+            if status_name:
+                status_counts[status_name] = status_counts.get(status_name, 0) + count
+            if category_name:
+                category_counts[category_name] = category_counts.get(category_name, 0) + count
         
-        open_complaints = status_counts.get('مفتوحة', 0)
         closed_complaints = status_counts.get('مغلقة', 0)
-        in_review_complaints = status_counts.get('قيد المراجعة', 0)
-        
         resolution_rate = (closed_complaints / total_complaints * 100) if total_complaints > 0 else 0
         
-        closed_complaints_list = Complaint.query.filter(
+        category_stats = [
+            {
+                'name': name,
+                'count': count,
+                'percentage': round(count / total_complaints * 100, 2)
+            }
+            for name, count in sorted(category_counts.items(), key=lambda item: -item[1])
+        ]
+        
+        avg_processing_days = db.session.query(
+            func.avg(PDFService._whole_days(Complaint.submitted_at, Complaint.closed_at))
+        ).filter(
             Complaint.closed_at >= start_date,
             Complaint.closed_at < end_date
-        ).all()
+        ).scalar() or 0
         
-        total_processing_days = sum(
-            [(c.closed_at - c.submitted_at).days for c in closed_complaints_list if c.closed_at and c.submitted_at]
-        )
-        avg_processing_days = (total_processing_days / len(closed_complaints_list)) if closed_complaints_list else 0
+        def status_is(status, value=1):
+            return func.coalesce(func.sum(case((Payment.status == status, value), else_=0)), 0)
         
-        complaints_by_category = db.session.query(
-            Complaint.category_id,
-            func.count(Complaint.complaint_id)
+        total_payments, approved_payments, rejected_payments, pending_payments, total_revenue = db.session.query(
+            func.count(Payment.payment_id),
+            status_is('approved'),
+            status_is('rejected'),
+            status_is('pending'),
+            status_is('approved', Payment.amount)
         ).filter(
-            Complaint.submitted_at >= start_date,
-            Complaint.submitted_at < end_date
-        ).group_by(Complaint.category_id).all()
-        
-        category_stats = []
-        for category_id, count in complaints_by_category:
-            from src.models.complaint import ComplaintCategory
-            category = ComplaintCategory.query.get(category_id)
-            if category:
-                percentage = (count / total_complaints * 100) if total_complaints > 0 else 0
-                category_stats.append({
-                    'name': category.category_name,
-                    'count': count,
-                    'percentage': round(percentage, 2)
-                })
-        
-        active_users = User.query.filter_by(is_active=True).count()
-        
-        active_subscriptions = Subscription.query.filter_by(status='active').count()
-        expired_subscriptions = Subscription.query.filter_by(status='expired').count()
-        
-        total_subscriptions = active_subscriptions + expired_subscriptions
-        renewal_rate = (active_subscriptions / total_subscriptions * 100) if total_subscriptions > 0 else 0
-        
-        total_payments = Payment.query.filter(
             Payment.created_at >= start_date,
             Payment.created_at < end_date
-        ).count()
-        
-        approved_payments = Payment.query.filter(
-            Payment.created_at >= start_date,
-            Payment.created_at < end_date,
-            Payment.status == 'approved'
-        ).count()
-        
-        rejected_payments = Payment.query.filter(
-            Payment.created_at >= start_date,
-            Payment.created_at < end_date,
-            Payment.status == 'rejected'
-        ).count()
+        ).one()
         
-        pending_payments = Payment.query.filter(
-            Payment.created_at >= start_date,
-            Payment.created_at < end_date,
-            Payment.status == 'pending'
-        ).count()
+        approval_rate = (approved_payments / total_payments * 100) if total_payments > 0 else 0
         
-        total_revenue = db.session.query(func.sum(Payment.amount)).filter(
-            Payment.created_at >= start_date,
-            Payment.created_at < end_date,
-            Payment.status == 'approved'
-        ).scalar() or 0
+        active_users, active_subscriptions, expired_subscriptions = db.session.query(
+            select(func.count(User.user_id)).where(User.is_active.is_(True)).scalar_subquery(),
+            func.coalesce(func.sum(case((Subscription.status == 'active', 1), else_=0)), 0),
+            func.coalesce(func.sum(case((Subscription.status == 'expired', 1), else_=0)), 0)
+        ).select_from(Subscription).one()
         
-        approval_rate = (approved_payments / total_payments * 100) if total_payments > 0 else 0
+        total_subscriptions = active_subscriptions + expired_subscriptions
+        renewal_rate = (active_subscriptions / total_subscriptions * 100) if total_subscriptions > 0 else 0
         
-        from src.models.complaint import Settings
         currency_setting = Settings.query.filter_by(key='currency').first()
         currency = currency_setting.value if currency_setting else 'YER'
         
-        month_names = {
-            1: 'يناير', 2: 'فبراير', 3: 'مارس', 4: 'أبريل',
-            5: 'مايو', 6: 'يونيو', 7: 'يوليو', 8: 'أغسطس',
-            9: 'سبتمبر', 10: 'أكتوبر', 11: 'نوفمبر', 12: 'ديسمبر'
-        }
-        
-        context = {
+        return {
             'month': month,
             'year': year,
-            'month_name': month_names.get(month, str(month)),
+            'month_name': PDFService.MONTH_NAMES.get(month, str(month)),
+            'generated_at': datetime.utcnow().isoformat(),
             'stats': {
                 'total_complaints': total_complaints,
-                'open_complaints': open_complaints,
+                'open_complaints': status_counts.get('مفتوحة', 0),
                 'closed_complaints': closed_complaints,
-                'in_review_complaints': in_review_complaints,
+                'in_review_complaints': status_counts.get('قيد المراجعة', 0),
                 'resolution_rate': round(resolution_rate, 2),
-                'avg_processing_days': round(avg_processing_days, 2),
+                'avg_processing_days': round(float(avg_processing_days), 2),
                 'by_category': category_stats,
                 'active_users': active_users,
                 'active_subscriptions': active_subscriptions,
@@ -249,7 +244,7 @@ class PDFService:
                 'approved_payments': approved_payments,
                 'rejected_payments': rejected_payments,
                 'pending_payments': pending_payments,
-                'total_revenue': round(total_revenue, 2),
+                'total_revenue': round(float(total_revenue), 2),
                 'currency': currency,
                 'approval_rate': round(approval_rate, 2),
                 'key_events': [],
@@ -259,17 +254,61 @@ class PDFService:
                     'متابعة الاشتراكات المنتهية وتشجيع التجديد',
                     'تحسين عملية مراجعة المدفوعات لتقليل وقت الانتظار'
                 ]
-            },
-            'chart_path': None
+            }
         }
+    
+    @staticmethod
+    def monthly_report_chart(dataset):
+        """
+        Render the month's complaints by category as an SVG bar chart
         
-        context = PDFService._prepare_template_context(context)
+        Returns:
+            bytes: SVG document, or None when the month has no categorized complaints
+        """
+        categories = dataset['stats']['by_category']
+        if not categories:
+            return None
+        
+        # A bare Figure renders without pyplot's global state or a GUI backend
+        from matplotlib.figure import Figure
+        
+        figure = Figure(figsize=(7, 0.5 * len(categories) + 1.5))
+        axis = figure.subplots()
+        axis.barh(
+            arabic_text.shape_many([category['name'] for category in categories]),
+            [category['count'] for category in categories],
+            color='#4472C4'
+        )
+        axis.invert_yaxis()
+        axis.set_xlabel(PDFService._reshape_arabic_text('عدد الشكاوى'))
+        figure.tight_layout()
+        
+        buffer = io.BytesIO()
+        figure.savefig(buffer, format='svg')
+        return buffer.getvalue()
+    
+    @staticmethod
+    def render_monthly_report(dataset, chart_path=None):
+        """Render a monthly report dataset to PDF bytes"""
+        context = PDFService._prepare_template_context({**dataset, 'chart_path': chart_path})
         
         html_content = render_template('pdfs/monthly_report.html', **context)
         
-        pdf_file = HTML(string=html_content).write_pdf()
+        return pdf_renderer.render(html_content)
+    
+    @staticmethod
+    def generate_monthly_report(month, year):
+        """
+        Generate monthly statistics PDF report from live data
+        
+        Args:
+            month: int - Month (1-12)
+            year: int - Year
         
-        return pdf_file
+        Returns:
+            bytes: PDF file content
+        """
+        return PDFService.render_monthly_report(PDFService.monthly_report_dataset(month, year))
     
     @staticmethod
     def generate_payment_receipt(payment_id):
@@ -320,6 +359,249 @@ class PDFService:
         
         html_content = render_template('pdfs/payment_receipt.html', **context)
         
-        pdf_file = HTML(string=html_content).write_pdf()
+        return pdf_renderer.render(html_content)
+    
+    # ===================== Versioned artifacts =====================
+    
+    @staticmethod
+    def storage():
+        """Storage backend holding rendered PDF artifacts (created once per process)"""
+        if PDFService._storage is None:
+            PDFService._storage = get_storage_backend()
+        return PDFService._storage
+    
+    @staticmethod
+    def artifact_key(kind, entity_id, version):
+        """Storage key of one rendered version of an entity's PDF"""
+        return f'{ARTIFACT_FOLDER}/{kind}/{entity_id}/{version}.pdf'
+    
+    @staticmethod
+    def artifact_etag(key):
+        return hashlib.sha256(key.encode()).hexdigest()[:32]
+    
+    @staticmethod
+    def _store_artifact(key, pdf):
+        """Store a rendered version and remove the entity's older versions"""
+        storage = PDFService.storage()
+        storage.put(pdf, key)
+        
+        for stale_key in storage.list(key.rsplit('/', 1)[0] + '/'):
+            if stale_key != key:
+                storage.delete(stale_key)
+    
+    @staticmethod
+    def _artifact(key, render):
+        """Return the key of a stored artifact, rendering and storing it when this version does not exist yet"""
+        if not PDFService.storage().exists(key):
+            PDFService._store_artifact(key, render())
+        return key
+    
+    @staticmethod
+    def complaint_report_key(complaint):
+        """
+        Artifact key of a complaint report, versioned by last_updated_at
+        
+        Open complaints show their processing days so far, so their version also
+        includes the current date and is re-rendered at most once a day.
+        
+        Args:
+            complaint: Complaint or row with complaint_id, last_updated_at, submitted_at and closed_at
+        """
+        version = (complaint.last_updated_at or complaint.submitted_at).strftime('%Y%m%dT%H%M%S%f')
+        if not complaint.closed_at:
+            version = f'{version}-{datetime.utcnow():%Y%m%d}'
+        return PDFService.artifact_key('complaint', complaint.complaint_id, version)
+    
+    @staticmethod
+    def complaint_report_artifact(complaint):
+        """
+        Stored PDF report of a complaint
+        
+        Returns:
+            str: Storage key
+        """
+        return PDFService._artifact(
+            PDFService.complaint_report_key(complaint),
+            lambda: PDFService.generate_complaint_report(complaint.complaint_id)
+        )
+    
+    @staticmethod
+    def payment_receipt_artifact(payment):
+        """
+        Stored PDF receipt of a payment, versioned by reviewed_at (pending
+        payments share a single 'pending' version until they are reviewed)
+        
+        Returns:
+            str: Storage key
+        """
+        version = payment.reviewed_at.strftime('%Y%m%dT%H%M%S%f') if payment.reviewed_at else 'pending'
+        
+        return PDFService._artifact(
+            PDFService.artifact_key('receipt', payment.payment_id, version),
+            lambda: PDFService.generate_payment_receipt(payment.payment_id)
+        )
+    
+    @staticmethod
+    def monthly_report_key(month, year, name):
+        """Storage key of a closed month's report file (report.json, chart.svg, report.pdf)"""
+        return f'{ARTIFACT_FOLDER}/monthly/{year}/{month:02d}/{name}'
+    
+    @staticmethod
+    def is_month_closed(month, year, now=None):
+        return PDFService._month_bounds(month, year)[1] <= (now or datetime.utcnow())
+    
+    @staticmethod
+    def close_month(month, year):
+        """
+        Compute a closed month's report once and store its dataset (report.json),
+        chart (chart.svg, when MONTHLY_REPORT_CHARTS is enabled) and PDF
+        (report.pdf, written last so its presence means the month is complete)
+        
+        Returns:
+            str: Storage key of the PDF
+        """
+        storage = PDFService.storage()
+        dataset = PDFService.monthly_report_dataset(month, year)
+        storage.put(
+            json.dumps(dataset, ensure_ascii=False).encode('utf-8'),
+            PDFService.monthly_report_key(month, year, 'report.json')
+        )
+        
+        chart_path = None
+        if MONTHLY_REPORT_CHARTS:
+            chart = PDFService.monthly_report_chart(dataset)
+            if chart:
+                storage.put(chart, PDFService.monthly_report_key(month, year, 'chart.svg'))
+                chart_path = 'data:image/svg+xml;base64,' + base64.b64encode(chart).decode('ascii')
+        
+        pdf_key = PDFService.monthly_report_key(month, year, 'report.pdf')
+        storage.put(PDFService.render_monthly_report(dataset, chart_path), pdf_key)
+        
+        return pdf_key
+    
+    @staticmethod
+    def monthly_report_artifact(month, year):
+        """
+        Stored PDF of a closed month, closing the month first when the
+        month-close job has not run for it yet
         
-        return pdf_file
+        Returns:
+            str: Storage key
+        """
+        key = PDFService.monthly_report_key(month, year, 'report.pdf')
+        if PDFService.storage().exists(key):
+            return key
+        return PDFService.close_month(month, year)
+    
+    # ===================== Complaint report bundles =====================
+    
+    @staticmethod
+    def bundle_complaints(filters):
+        """Complaints matching export filters, as rows with the columns of complaint_report_key"""
+        return db.session.execute(
+            select(Complaint.complaint_id, Complaint.last_updated_at, Complaint.submitted_at, Complaint.closed_at)
+            .where(*complaint_conditions(filters))
+            .order_by(Complaint.submitted_at, Complaint.complaint_id)
+        ).all()
+    
+    @staticmethod
+    def iter_complaint_reports(complaints, window=None):
+        """
+        Yield (complaint_id, pdf, error) for each complaint as its report becomes
+        available: stored artifacts are read back, the others are rendered on
+        the render pool with at most `window` (default: pool size) in flight, so
+        memory is bounded by the pool size rather than the number of reports.
+        Rendered reports are stored as artifacts for later downloads.
+        
+        Args:
+            complaints: Rows from bundle_complaints
+            window: Maximum concurrent renders
+        """
+        storage = PDFService.storage()
+        pool = pdf_renderer.pool
+        window = window or pool.workers
+        in_flight = {}
+        
+        def collect(futures):
+            for future in futures:
+                complaint_id, key = in_flight.pop(future)
+                try:
+                    pdf = pool.result(future)
+                except pdf_renderer.RenderError as e:
+                    yield complaint_id, None, str(e)
+                    continue
+                PDFService._store_artifact(key, pdf)
+                yield complaint_id, pdf, None
+        
+        for complaint in complaints:
+            key = PDFService.complaint_report_key(complaint)
+            if storage.exists(key):
+                body = storage.open(key)
+                try:
+                    yield complaint.complaint_id, body.read(), None
+                finally:
+                    body.close()
+                continue
+            
+            html = PDFService.complaint_report_html(complaint.complaint_id)
+            try:
+                if pdf_renderer.RENDER_MODE != 'pool':
+                    pdf = pdf_renderer.render(html)
+                    PDFService._store_artifact(key, pdf)
+                    yield complaint.complaint_id, pdf, None
+                    continue
+                in_flight[pool.submit(html)] = (complaint.complaint_id, key)
+            except pdf_renderer.RenderError as e:
+                yield complaint.complaint_id, None, str(e)
+                continue
+            
+            if len(in_flight) >= window:
+                done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                yield from collect(done)
+        
+        yield from collect(list(in_flight))
+    
+    @staticmethod
+    def stream_complaint_bundle(complaints):
+        """
+        Stream a zip of complaint reports, one stored (uncompressed) entry per
+        report written as soon as it is available; reports that failed to render
+        are listed in errors.txt
+        
+        Yields:
+            bytes: Zip file chunks
+        """
+        sink = _ZipSink()
+        errors = []
+        
+        with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_STORED) as bundle:
+            for complaint_id, pdf, error in PDFService.iter_complaint_reports(complaints):
+                if error:
+                    errors.append(f'{complaint_id}: {error}')
+                    continue
+                bundle.writestr(f'complaint_report_{complaint_id}.pdf', pdf)
+                yield sink.drain()
+            
+            if errors:
+                bundle.writestr('errors.txt', '\n'.join(errors), compress_type=zipfile.ZIP_DEFLATED)
+        
+        yield sink.drain()
+
+
+class _ZipSink:
+    """Write-only stream for zipfile; written bytes are handed out with drain()"""
+    
+    def __init__(self):
+        self.chunks = []
+    
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks = []
+        return data
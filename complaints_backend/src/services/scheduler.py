@@ -1,6 +1,7 @@
 from datetime import datetime, timedelta
+from sqlalchemy import func
 from src.database.db import db
-from src.models.complaint import Subscription, Notification, Settings
+from src.models.complaint import Subscription, Notification, Settings, User
 
 def check_and_expire_subscriptions():
     """
@@ -88,10 +89,37 @@ def send_renewal_reminders():
         db.session.rollback()
         return {'error': str(e), 'success': False}
 
+def reconcile_unread_notification_counts():
+    """
+    وظيفة مجدولة لإصلاح أي انحراف في عدادات الإشعارات غير المقروءة
+    يعيد حساب العداد من جدول الإشعارات للمستخدمين المختلفين فقط
+    يجب تشغيلها يومياً
+    """
+    try:
+        actual_count = db.select(func.count(Notification.notification_id)).where(
+            Notification.user_id == User.user_id,
+            Notification.is_read == False
+        ).scalar_subquery()
+        
+        result = db.session.execute(
+            db.update(User)
+            .where(User.unread_notifications_count.is_(None) | (User.unread_notifications_count != actual_count))
+            .values(unread_notifications_count=actual_count, updated_at=User.updated_at)
+            .execution_options(synchronize_session=False)
+        )
+        
+        db.session.commit()
+        return {'repaired_count': result.rowcount, 'success': True}
+        
+    except Exception as e:
+        db.session.rollback()
+        return {'error': str(e), 'success': False}
+
 def run_daily_tasks():
     """تشغيل جميع المهام اليومية"""
     results = {
         'expiry_check': check_and_expire_subscriptions(),
-        'renewal_reminders': send_renewal_reminders()
+        'renewal_reminders': send_renewal_reminders(),
+        'unread_counts': reconcile_unread_notification_counts()
     }
     return results
@@ -1,29 +1,24 @@
-import os
 import json
 import uuid
 from datetime import datetime, timedelta
 from typing import Optional, Dict, List
-import redis
 from flask import request
+from src.core.redis_connection import get_redis
 
 class SessionService:
     """Service for managing user sessions with Redis"""
     
     def __init__(self):
-        redis_url = os.environ.get('REDIS_URL', '')
-        if redis_url:
-            try:
-                self.redis_client = redis.from_url(redis_url, decode_responses=True)
-                self.redis_available = True
-            except Exception as e:
-                print(f"Redis connection failed: {e}. Using in-memory fallback.")
-                self.redis_client = None
-                self.redis_available = False
-                self.memory_store = {}
-        else:
-            self.redis_client = None
-            self.redis_available = False
-            self.memory_store = {}
+        self.memory_store = {}
+    
+    @property
+    def redis_client(self):
+        """Redis client of the current process, connected on first use"""
+        return get_redis(decode_responses=True)
+    
+    @property
+    def redis_available(self) -> bool:
+        return self.redis_client is not None
     
     def _get_session_key(self, refresh_token: str) -> str:
         """Generate Redis key for a session"""
@@ -0,0 +1,485 @@
+"""
+Continuous replication of the SQLite database to object storage
+
+The replicator tails the database's write-ahead log and ships the frames
+committed since its last pass, zlib-compressed, to a StorageBackend every
+SQLITE_REPLICATION_INTERVAL seconds, next to periodic full snapshots:
+
+    <prefix>/generations/<generation>/snapshots/<seq>-<unix ms>.db.z
+    <prefix>/generations/<generation>/wal/<seq>-<unix ms>.wal.z
+
+Only frames SQLite's own recovery would accept are shipped: up to the last
+commit frame before the first whose salt or cumulative checksum fails.
+
+A generation is one unbroken stream: snapshots plus every WAL segment shipped
+after the first of them. A snapshot's seq is the first segment not already
+contained in it. A new generation starts whenever continuity cannot be
+proven: at replicator start, or when the WAL was reset after a failed sync.
+
+The application's writers never wait on the replicator except during its own
+checkpoints. The replicator always holds a read transaction, so no other
+connection's checkpoint can reset the WAL past frames it has not shipped;
+once the WAL grows past SQLITE_REPLICATION_CHECKPOINT_PAGES it ships the
+tail and checkpoints under the write lock itself.
+"""
+import os
+import re
+import time
+import uuid
+import zlib
+import struct
+import sqlite3
+import tempfile
+from datetime import datetime, timezone
+
+WAL_HEADER_SIZE = 32
+# Magic numbers of a WAL whose checksums use little / big-endian words
+WAL_MAGIC = (0x377f0682, 0x377f0683)
+FRAME_HEADER_SIZE = 24
+READ_SIZE = 4 * 1024 * 1024
+WRITE_LOCK_TIMEOUT_MS = 100
+
+_OBJECT_KEY = re.compile(r'/generations/([^/]+)/(snapshots|wal)/(\d+)-(\d+)\.(?:db|wal)\.z$')
+
+
+def wal_checksum(data, checksum, big_endian):
+    """SQLite's cumulative WAL checksum over `data` (a multiple of 8 bytes), continuing from `checksum`"""
+    s0, s1 = checksum
+    words = struct.unpack(f'{">" if big_endian else "<"}{len(data) // 4}I', data)
+    for i in range(0, len(words), 2):
+        s0 = (s0 + words[i] + s1) & 0xFFFFFFFF
+        s1 = (s1 + words[i + 1] + s0) & 0xFFFFFFFF
+    return s0, s1
+
+
+def committed_length(data, page_size, salt, checksum, big_endian):
+    """
+    Length of the prefix of `data`, whole WAL frames, that ends with the last
+    commit frame belonging to the WAL identified by `salt`, and the running
+    checksum after that frame
+
+    Like SQLite's own WAL recovery, stops at the first frame whose salt or
+    cumulative checksum (continuing from `checksum`) does not match. Frames
+    after the returned length are an open transaction, torn by a crash, or
+    left over from before the WAL was last reset.
+    """
+    frame_size = FRAME_HEADER_SIZE + page_size
+    length = 0
+    committed = checksum
+    for offset in range(0, len(data) - frame_size + 1, frame_size):
+        if data[offset + 8:offset + 16] != salt:
+            break
+        checksum = wal_checksum(
+            data[offset:offset + 8] + data[offset + FRAME_HEADER_SIZE:offset + frame_size], checksum, big_endian
+        )
+        if struct.unpack('>II', data[offset + 16:offset + 24]) != checksum:
+            break
+        # Database size in pages after the commit, zero for other frames
+        if data[offset + 4:offset + 8] != b'\0\0\0\0':
+            length = offset + frame_size
+            committed = checksum
+    return length, committed
+
+
+def apply_frames(db_file, data, page_size):
+    """Write the transactions of the WAL frames in `data` into a database file"""
+    frame_size = FRAME_HEADER_SIZE + page_size
+    pages = {}
+    for offset in range(0, len(data) - frame_size + 1, frame_size):
+        page_number, db_size = struct.unpack('>II', data[offset:offset + 8])
+        pages[page_number] = data[offset + FRAME_HEADER_SIZE:offset + frame_size]
+        if db_size:
+            for page_number, page in sorted(pages.items()):
+                db_file.seek((page_number - 1) * page_size)
+                db_file.write(page)
+            db_file.truncate(db_size * page_size)
+            pages.clear()
+
+
+def list_generations(storage, prefix):
+    """
+    Objects of every generation in the replica
+
+    Returns:
+        dict: {generation: {'snapshots': [(seq, unix ms, key)], 'wal': [...]}},
+              oldest generation first, objects in order
+    """
+    generations = {}
+    for key in storage.list(f'{prefix}/generations/'):
+        match = _OBJECT_KEY.search(key)
+        if match:
+            generation, kind, seq, at = match.groups()
+            objects = generations.setdefault(generation, {'snapshots': [], 'wal': []})
+            objects[kind].append((int(seq), int(at), key))
+
+    for objects in generations.values():
+        objects['snapshots'].sort()
+        objects['wal'].sort()
+    # Generation names only resolve seconds: order them by their first object
+    return dict(sorted(
+        generations.items(),
+        key=lambda item: min(at for _, at, _ in item[1]['snapshots'] + item[1]['wal'])
+    ))
+
+
+def _to_millis(timestamp):
+    return int(timestamp.replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+
+def _from_millis(millis):
+    return datetime.fromtimestamp(millis / 1000, timezone.utc).replace(tzinfo=None)
+
+
+def restore(storage, target_path, timestamp=None, prefix='replication'):
+    """
+    Rebuild the database at `target_path` from the replica as of `timestamp`
+    (naive UTC datetime, default: the latest segment shipped)
+
+    Starts from the newest snapshot taken at or before `timestamp` and
+    replays its generation's WAL segments shipped up to it, so the result is
+    at most one replication interval behind `timestamp`.
+
+    Returns:
+        dict: generation, snapshot key, segments applied, restored_to
+    Raises:
+        ValueError: no snapshot that old, or a segment missing from the stream
+    """
+    until = _to_millis(timestamp) if timestamp else float('inf')
+
+    snapshot = None
+    for generation, objects in reversed(list_generations(storage, prefix).items()):
+        candidates = [item for item in objects['snapshots'] if item[1] <= until]
+        if candidates:
+            snapshot = candidates[-1]
+            break
+    if snapshot is None:
+        raise ValueError(f'No snapshot in {prefix} taken before {timestamp or "now"}')
+
+    snapshot_seq, restored_to, snapshot_key = snapshot
+    segments = [item for item in objects['wal'] if item[0] >= snapshot_seq and item[1] <= until]
+
+    tmp_path = f'{target_path}.partial'
+    try:
+        with open(tmp_path, 'wb') as out:
+            source = storage.open(snapshot_key)
+            decompressor = zlib.decompressobj()
+            try:
+                while True:
+                    block = source.read(READ_SIZE)
+                    if not block:
+                        break
+                    out.write(decompressor.decompress(block))
+            finally:
+                source.close()
+            out.write(decompressor.flush())
+
+        with open(tmp_path, 'r+b') as db_file:
+            for expected, (seq, at, key) in enumerate(segments, snapshot_seq):
+                if seq != expected:
+                    raise ValueError(f'WAL segment {expected} of generation {generation} is missing')
+                source = storage.open(key)
+                try:
+                    data = zlib.decompress(source.read())
+                finally:
+                    source.close()
+                apply_frames(db_file, data[4:], struct.unpack('>I', data[:4])[0])
+                restored_to = at
+
+        # A WAL left next to the target would be replayed over the restored file
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(target_path + suffix):
+                os.remove(target_path + suffix)
+        os.replace(tmp_path, target_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+    return {
+        'generation': generation,
+        'snapshot': snapshot_key,
+        'segments': len(segments),
+        'restored_to': _from_millis(restored_to)
+    }
+
+
+class SQLiteReplicator:
+    """Ships the WAL of one SQLite database to a StorageBackend"""
+
+    def __init__(self, db_path, storage):
+        self.db_path = db_path
+        self.wal_path = f'{db_path}-wal'
+        self.storage = storage
+        self.prefix = os.environ.get('SQLITE_REPLICATION_PREFIX', 'replication')
+        # Seconds between WAL shipments: the most writes a lost disk can cost
+        self.interval = float(os.environ.get('SQLITE_REPLICATION_INTERVAL', 1))
+        self.snapshot_interval = int(os.environ.get('SQLITE_REPLICATION_SNAPSHOT_INTERVAL', 86400))
+        self.retention_hours = int(os.environ.get('SQLITE_REPLICATION_RETENTION_HOURS', 72))
+        # WAL frames after which the replicator checkpoints (SQLite's own default)
+        self.checkpoint_pages = int(os.environ.get('SQLITE_REPLICATION_CHECKPOINT_PAGES', 1000))
+        self.busy_timeout = float(os.environ.get('SQLITE_REPLICATION_BUSY_TIMEOUT', 5))
+
+        self.generation = None
+        self.seq = 0
+        self.salt = None
+        self.page_size = 0
+        self.offset = WAL_HEADER_SIZE
+        # Running WAL checksum after the frame that ends at self.offset
+        self.checksum = None
+        self.last_snapshot = 0.0
+        # Whether the last sync shipped every frame it read. Read locks are
+        # taken before reading, so a WAL reset after such a sync can only
+        # have discarded frames that were already shipped.
+        self._caught_up = False
+        self._checkpointed = False
+        self._readers = []
+        self._active = 0
+        self._writer = None
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+
+    def _generation_key(self, kind, extension, seq, at):
+        return f'{self.prefix}/generations/{self.generation}/{kind}/{seq:010d}-{int(at * 1000):013d}.{extension}.z'
+
+    def start(self):
+        """Switch the database to WAL mode, pin the WAL and start a generation"""
+        if not os.path.exists(self.db_path):
+            raise FileNotFoundError(f'Database {self.db_path} does not exist')
+
+        self._writer = self._connect()
+        # Give up on the write lock quickly: while waiting the replicator still
+        # pins the WAL, which a RESTART checkpoint holding that lock may wait on
+        self._writer.execute(f'PRAGMA busy_timeout={WRITE_LOCK_TIMEOUT_MS}')
+        mode = self._writer.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+        if mode.lower() != 'wal':
+            raise RuntimeError(f'Could not switch {self.db_path} to WAL mode (journal_mode={mode})')
+
+        self._readers = [self._connect(), self._connect()]
+        self._new_generation()
+
+    def close(self):
+        for connection in self._readers + [self._writer]:
+            if connection is not None:
+                connection.close()
+        self._readers = []
+        self._writer = None
+
+    def _hold_read_lock(self):
+        """
+        Open a read transaction on the spare connection, then end the one
+        held so far: one of them pins the WAL at every moment
+        """
+        spare = self._readers[1 - self._active]
+        spare.execute('BEGIN')
+        spare.execute('SELECT COUNT(*) FROM sqlite_master').fetchone()
+
+        current = self._readers[self._active]
+        if current.in_transaction:
+            current.execute('COMMIT')
+        self._active = 1 - self._active
+
+    def _read_wal(self):
+        """
+        Header fields and frames of the current WAL after the shipped offset,
+        with the running checksum the first of those frames continues from
+
+        Returns:
+            tuple: (page size, salt, checksum, big endian, frames) or None
+                   while the WAL is empty or its header is not valid
+        """
+        with open(self.wal_path, 'rb') as wal:
+            header = wal.read(WAL_HEADER_SIZE)
+            if len(header) < WAL_HEADER_SIZE:
+                return None
+            magic, _, page_size = struct.unpack('>III', header[:12])
+            if magic not in WAL_MAGIC:
+                return None
+            big_endian = bool(magic & 1)
+            checksum = struct.unpack('>II', header[24:32])
+            if wal_checksum(header[:24], (0, 0), big_endian) != checksum:
+                return None
+
+            salt = header[16:24]
+            if salt == self.salt:
+                wal.seek(self.offset)
+                checksum = self.checksum
+            return page_size, salt, checksum, big_endian, wal.read()
+
+    def _new_generation(self):
+        """Start an unbroken stream: note where the WAL ends, then snapshot"""
+        self.generation = f'{datetime.utcnow():%Y%m%dT%H%M%SZ}-{uuid.uuid4().hex[:8]}'
+        self.seq = 0
+        self.salt = None
+        self.offset = WAL_HEADER_SIZE
+        self.checksum = None
+        self.last_snapshot = 0.0
+        self._caught_up = False
+        self._hold_read_lock()
+
+        # Frames already in the WAL are part of the snapshot
+        wal = self._read_wal()
+        if wal is not None:
+            self.page_size, self.salt, checksum, big_endian, data = wal
+            length, self.checksum = committed_length(data, self.page_size, self.salt, checksum, big_endian)
+            self.offset += length
+
+        self.snapshot()
+        self._caught_up = True
+
+    def sync(self):
+        """
+        Ship the frames committed since the last sync as one WAL segment
+
+        Returns:
+            int: WAL bytes shipped
+        """
+        self._hold_read_lock()
+        wal = self._read_wal()
+        if wal is None:
+            return 0
+        shipped_at = time.time()
+
+        page_size, salt, checksum, big_endian, data = wal
+        if salt != self.salt:
+            if self.salt is not None and not self._caught_up:
+                # Reset after a failed sync: frames may have been lost
+                print(f'WAL of {self.db_path} was reset before it was shipped, starting a new generation')
+                self._new_generation()
+                return 0
+            self.page_size = page_size
+            self.salt = salt
+            self.offset = WAL_HEADER_SIZE
+            self.checksum = checksum
+            self._checkpointed = False
+
+        length, checksum = committed_length(data, page_size, salt, checksum, big_endian)
+        if not length:
+            self._caught_up = True
+            return 0
+
+        self._caught_up = False
+        segment = zlib.compress(struct.pack('>I', page_size) + data[:length], 6)
+        self.storage.put(segment, self._generation_key('wal', 'wal', self.seq, shipped_at))
+        self.seq += 1
+        self.offset += length
+        self.checksum = checksum
+        self._caught_up = True
+        return length
+
+    def checkpoint(self):
+        """
+        Ship the tail of the WAL and checkpoint it under the write lock, so
+        the next writer restarts the WAL with nothing left unshipped
+
+        Returns:
+            bool: whether the whole WAL was checkpointed
+        """
+        try:
+            self._writer.execute('BEGIN IMMEDIATE')
+        except sqlite3.OperationalError:
+            # A long write transaction holds the lock: retry after the next sync
+            return False
+
+        try:
+            self.sync()
+            for reader in self._readers:
+                if reader.in_transaction:
+                    reader.execute('COMMIT')
+            busy, wal_frames, checkpointed = self._readers[0].execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+            self._checkpointed = not busy and wal_frames == checkpointed
+        finally:
+            self._writer.execute('ROLLBACK')
+            self._hold_read_lock()
+
+        return self._checkpointed
+
+    def snapshot(self):
+        """Upload a full copy of the database taken with the online backup API"""
+        fd, tmp_path = tempfile.mkstemp(prefix='.replica_', suffix='.db', dir=os.path.dirname(self.db_path))
+        os.close(fd)
+
+        try:
+            source = sqlite3.connect(self.db_path, timeout=self.busy_timeout)
+            target = sqlite3.connect(tmp_path)
+            try:
+                # A single step reads one consistent snapshot; in WAL mode it never blocks writers
+                source.backup(target)
+            finally:
+                target.close()
+                source.close()
+            taken_at = time.time()
+
+            compressor = zlib.compressobj(6)
+            blocks = []
+            with open(tmp_path, 'rb') as f:
+                while True:
+                    block = f.read(READ_SIZE)
+                    if not block:
+                        break
+                    blocks.append(compressor.compress(block))
+            blocks.append(compressor.flush())
+
+            key = self._generation_key('snapshots', 'db', self.seq, taken_at)
+            self.storage.put(b''.join(blocks), key)
+        finally:
+            os.remove(tmp_path)
+
+        self.last_snapshot = taken_at
+        return key
+
+    def enforce_retention(self):
+        """
+        Delete replica objects older than SQLITE_REPLICATION_RETENTION_HOURS,
+        keeping the newest snapshot before the cutoff so every point in the
+        retention window stays restorable
+
+        Returns:
+            int: objects deleted
+        """
+        cutoff = (time.time() - self.retention_hours * 3600) * 1000
+        generations = list_generations(self.storage, self.prefix)
+        names = list(generations)
+        expired = []
+
+        for index, name in enumerate(names):
+            objects = generations[name]
+            items = objects['snapshots'] + objects['wal']
+            covered = any(
+                at <= cutoff
+                for later in names[index + 1:]
+                for _, at, _ in generations[later]['snapshots']
+            )
+            if covered:
+                # A newer generation restores the whole window on its own
+                expired.extend(key for _, _, key in items)
+                continue
+
+            bases = [seq for seq, at, _ in objects['snapshots'] if at <= cutoff]
+            if bases:
+                expired.extend(key for seq, _, key in items if seq < bases[-1])
+
+        for key in expired:
+            self.storage.delete(key)
+        return len(expired)
+
+    def run(self, should_stop):
+        """Replicate until `should_stop()` is true, then ship the last frames"""
+        self.start()
+        try:
+            while not should_stop():
+                try:
+                    self.sync()
+                    frames = (self.offset - WAL_HEADER_SIZE) // (FRAME_HEADER_SIZE + self.page_size) if self.page_size else 0
+                    if frames >= self.checkpoint_pages and not self._checkpointed:
+                        self.checkpoint()
+                    if time.time() - self.last_snapshot >= self.snapshot_interval:
+                        self.snapshot()
+                        self.enforce_retention()
+                except Exception as e:
+                    print(f'Replication of {self.db_path} failed: {str(e)}')
+
+                time.sleep(self.interval)
+
+            self.sync()
+        finally:
+            self.close()
@@ -1,12 +1,14 @@
 from datetime import datetime, timedelta
 from src.database.db import db
 from src.models.complaint import User, Subscription, Payment, Settings, Notification
+from src.services.job_queue import enqueue_receipt_render
 
-def create_or_extend_subscription(user_id, payment_id, reviewed_by_id):
+def create_or_extend_subscription(user_id, payment_id, reviewed_by_id, review_notes=None):
     """
     خدمة توليد الاشتراك أو التمديد
     - إن كان لدى المستخدم اشتراك نشط، يبدأ التمديد من end_date الحالي
     - وإلا من تاريخ الاعتماد
+    - ملاحظات المراجعة تحفظ قبل توليد الإيصال لتظهر فيه
     """
     try:
         user = User.query.get(user_id)
@@ -46,6 +48,8 @@ def create_or_extend_subscription(user_id, payment_id, reviewed_by_id):
         payment.status = 'approved'
         payment.reviewed_by_id = reviewed_by_id
         payment.reviewed_at = datetime.utcnow()
+        if review_notes:
+            payment.review_notes = review_notes
         
         notification = Notification(
             user_id=user.user_id,
@@ -57,6 +61,8 @@ def create_or_extend_subscription(user_id, payment_id, reviewed_by_id):
         db.session.add(notification)
         db.session.commit()
         
+        enqueue_receipt_render(payment.payment_id)
+        
         return {
             'success': True,
             'subscription': new_subscription.to_dict(),
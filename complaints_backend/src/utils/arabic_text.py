@@ -0,0 +1,56 @@
+"""
+Arabic shaping and bidi reordering for outputs without complex text layout
+(matplotlib charts, SMS bodies).
+
+Status names, category names and template phrases repeat constantly, so
+short strings are memoized in a bounded LRU. Long free text (descriptions,
+comments, messages) bypasses the memo so user content cannot grow it.
+"""
+import os
+from functools import lru_cache
+from typing import Iterable, List, Optional
+from src.utils.lazy_import import lazy_module
+
+CACHE_SIZE = int(os.environ.get('ARABIC_SHAPING_CACHE_SIZE', 4096))
+MAX_CACHED_LENGTH = int(os.environ.get('ARABIC_SHAPING_MAX_CACHED_LENGTH', 64))
+
+arabic_reshaper = lazy_module('arabic_reshaper')
+bidi_algorithm = lazy_module('bidi.algorithm')
+
+
+def _shape(text: str) -> str:
+    return bidi_algorithm.get_display(arabic_reshaper.reshape(text))
+
+
+_shape_cached = lru_cache(maxsize=CACHE_SIZE)(_shape)
+
+cache_info = _shape_cached.cache_info
+cache_clear = _shape_cached.cache_clear
+
+
+def shape(text: Optional[str]) -> Optional[str]:
+    """
+    Reshape Arabic letters to their contextual forms and reorder for display.
+
+    ASCII text is returned unchanged; strings up to MAX_CACHED_LENGTH
+    characters are served from the LRU memo.
+    """
+    if not text or text.isascii():
+        return text
+    if len(text) <= MAX_CACHED_LENGTH:
+        return _shape_cached(text)
+    return _shape(text)
+
+
+def shape_many(texts: Iterable[Optional[str]]) -> List[Optional[str]]:
+    """
+    Shape a list of strings (labels, table cells), shaping each distinct
+    string once per call.
+    """
+    shaped = {}
+    result = []
+    for text in texts:
+        if text not in shaped:
+            shaped[text] = shape(text)
+        result.append(shaped[text])
+    return result
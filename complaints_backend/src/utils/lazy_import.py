@@ -0,0 +1,39 @@
+"""
+Deferred imports for heavy dependencies
+
+`pyotp = lazy_module('pyotp')` binds a proxy that imports the real module on
+first attribute access, so a web worker only pays for the 2FA, SMS or text
+shaping libraries once a request actually uses them.
+"""
+import importlib
+
+
+class LazyModule:
+    """Module proxy importing `name` on first attribute access"""
+
+    def __init__(self, name):
+        self.__dict__['_name'] = name
+        self.__dict__['_module'] = None
+
+    def _load(self):
+        module = self.__dict__['_module']
+        if module is None:
+            # importlib holds the per-module import lock, so concurrent first uses are safe
+            module = importlib.import_module(self.__dict__['_name'])
+            self.__dict__['_module'] = module
+        return module
+
+    @property
+    def loaded(self):
+        return self.__dict__['_module'] is not None
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f"<lazy module '{self.__dict__['_name']}' ({state})>"
+
+
+def lazy_module(name):
+    return LazyModule(name)
@@ -1,12 +1,12 @@
 import os
 import uuid
 import magic
-import redis
 import json
 from datetime import datetime, timedelta
 from typing import Tuple, Optional
 from werkzeug.utils import secure_filename
 from flask import current_app
+from src.core.redis_connection import get_redis
 
 ALLOWED_IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg'}
 ALLOWED_MIME_TYPES = {
@@ -159,20 +159,16 @@ class AccountLockoutService:
     ATTEMPT_WINDOW_MINUTES = 15
     
     def __init__(self):
-        redis_url = os.environ.get('REDIS_URL', '')
-        if redis_url:
-            try:
-                self.redis_client = redis.from_url(redis_url, decode_responses=True)
-                self.redis_available = True
-            except Exception as e:
-                print(f"Redis connection failed for lockout service: {e}. Using in-memory fallback.")
-                self.redis_client = None
-                self.redis_available = False
-                self.memory_store = {}
-        else:
-            self.redis_client = None
-            self.redis_available = False
-            self.memory_store = {}
+        self.memory_store = {}
+    
+    @property
+    def redis_client(self):
+        """Redis client of the current process, connected on first use"""
+        return get_redis(decode_responses=True)
+    
+    @property
+    def redis_available(self) -> bool:
+        return self.redis_client is not None
     
     def _get_attempts_key(self, username: str, ip_address: str) -> str:
         """Generate Redis key for login attempts"""
@@ -0,0 +1,123 @@
+"""
+اختبارات مصنع التطبيق (Application Factory Tests)
+تتضمن:
+- إنشاء التطبيق دون فتح اتصالات أو إنشاء الجداول
+- إنشاء المخطط عبر أمر الترحيل الصريح
+- إعادة ضبط اتصالات Redis في العملية الابنة بعد التفرع
+- عدم تشغيل المجدول عند إنشاء التطبيق بل في عملية الخدمة فقط
+"""
+import unittest
+import sys
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import inspect
+from src.main import create_app, run_migrations, start_background_tasks
+from src.database.db import db
+from src.core import redis_connection
+from src.services import job_queue
+
+
+class TestCreateApp(unittest.TestCase):
+    """اختبار مصنع التطبيق وأمر الترحيل"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmpdir, 'factory.db')
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}',
+        })
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.engine.dispose()
+        if os.path.exists(self.db_path):
+            os.remove(self.db_path)
+        os.rmdir(self.tmpdir)
+
+    def test_create_app_does_not_touch_database(self):
+        """إنشاء التطبيق لا ينشئ قاعدة البيانات ولا الجداول"""
+        self.assertFalse(os.path.exists(self.db_path))
+        self.assertEqual(self.app.config['SQLALCHEMY_DATABASE_URI'], f'sqlite:///{self.db_path}')
+        self.assertIn('migrate', self.app.cli.commands)
+
+    def test_scheduler_starts_only_in_serving_process(self):
+        """إنشاء التطبيق لا يشغل المجدول ولا يضيف دوال تفرع جديدة"""
+        callbacks = len(redis_connection._fork_callbacks)
+        with mock.patch.dict(os.environ, {'SCHEDULER_ENABLED': 'true'}), \
+             mock.patch('src.services.job_scheduler.start_scheduler') as start_scheduler:
+            app = create_app({'TESTING': True, 'SQLALCHEMY_DATABASE_URI': f'sqlite:///{self.db_path}'})
+            start_scheduler.assert_not_called()
+            self.assertEqual(len(redis_connection._fork_callbacks), callbacks)
+
+            start_background_tasks(app)
+            start_scheduler.assert_called_once_with(app)
+
+    def test_migrate_creates_schema(self):
+        """أمر الترحيل ينشئ الجداول"""
+        with mock.patch('src.main.MIGRATIONS_DIR', self.tmpdir):
+            run_migrations(self.app)
+
+        with self.app.app_context():
+            tables = inspect(db.engine).get_table_names()
+        self.assertIn('users', tables)
+        self.assertIn('complaints', tables)
+
+
+class TestForkReset(unittest.TestCase):
+    """اختبار إعادة ضبط الاتصالات بعد التفرع"""
+
+    def test_child_forgets_redis_connection(self):
+        """العملية الابنة تنسى اتصال Redis الخاص بالأب وتتصل عند أول استخدام"""
+        connection = mock.Mock()
+        with mock.patch.object(redis_connection, 'get_redis', return_value=None), \
+             mock.patch.object(job_queue, 'get_redis', return_value=connection):
+            job_queue._forget_connection()
+            self.assertIs(job_queue.redis_conn, connection)
+            self.assertTrue(job_queue.use_redis)
+            self.assertEqual(set(job_queue.lane_queues), set(job_queue.LANES))
+
+            redis_connection._clients[False] = connection
+            redis_connection._after_fork_in_child()
+            self.assertEqual(redis_connection._clients, {})
+            self.assertNotIn('redis_conn', vars(job_queue))
+
+        job_queue._forget_connection()
+
+    def test_concurrent_first_use_sees_all_queues(self):
+        """الطلبات المتزامنة عند أول اتصال ترى كل الطوابير مكتملة"""
+        def slow_redis():
+            time.sleep(0.05)
+            return mock.Mock()
+
+        errors = []
+
+        def use_queues():
+            try:
+                job_queue._connect()
+                if job_queue.use_redis:
+                    self.assertEqual(set(vars(job_queue)['lane_queues']), set(job_queue.LANES))
+            except Exception as e:
+                errors.append(e)
+
+        job_queue._forget_connection()
+        with mock.patch.object(job_queue, 'get_redis', side_effect=slow_redis) as get_redis:
+            threads = [threading.Thread(target=use_queues) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(get_redis.call_count, 1)
+        job_queue._forget_connection()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+"""
+اختبارات تشكيل النص العربي (Arabic Shaping Tests)
+تتضمن:
+- مطابقة نتيجة الذاكرة المؤقتة للتشكيل المباشر
+- تجاوز الذاكرة للنصوص الطويلة والنصوص اللاتينية
+- التشكيل الدفعي للقوائم
+"""
+import unittest
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.utils import arabic_text
+
+
+class TestArabicText(unittest.TestCase):
+    """اختبار طبقة التشكيل المشتركة"""
+
+    def setUp(self):
+        arabic_text.cache_clear()
+
+    def test_short_text_memoized(self):
+        """النصوص القصيرة تُشكَّل مرة واحدة وتُخدم من الذاكرة"""
+        shaped = arabic_text.shape('قيد المراجعة')
+        self.assertEqual(shaped, arabic_text._shape('قيد المراجعة'))
+        self.assertNotEqual(shaped, 'قيد المراجعة')
+
+        arabic_text.shape('قيد المراجعة')
+        info = arabic_text.cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 1))
+
+    def test_long_and_ascii_text_bypass_memo(self):
+        """النصوص الطويلة واللاتينية لا تدخل الذاكرة"""
+        long_text = 'وصف ' * arabic_text.MAX_CACHED_LENGTH
+        self.assertEqual(arabic_text.shape(long_text), arabic_text._shape(long_text))
+        self.assertEqual(arabic_text.shape('Invoice 42'), 'Invoice 42')
+        self.assertIsNone(arabic_text.shape(None))
+        self.assertEqual(arabic_text.cache_info().currsize, 0)
+
+    def test_shape_many(self):
+        """التشكيل الدفعي يحافظ على الترتيب"""
+        texts = ['جديدة', 'مغلقة', 'جديدة', '', 'OK']
+        self.assertEqual(arabic_text.shape_many(texts), [arabic_text._shape(t) if t and not t.isascii() else t for t in texts])
+        self.assertEqual(arabic_text.cache_info().currsize, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
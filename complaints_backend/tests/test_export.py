@@ -0,0 +1,672 @@
+"""
+اختبارات التصدير (Export Tests)
+تتضمن:
+- التصدير المتدفق إلى Excel بتمريرة واحدة
+- الأعمدة المرتبطة (التاجر، الفئة، الحالة) وعدد المرفقات والتعليقات
+- الفلاتر ورفض قيمها غير الصالحة وتنسيق RTL
+- تدفق CSV / NDJSON مع BOM وضغط gzip اختياري
+- التصدير غير المتزامن مع دمج الطلبات المتطابقة وتتبع التقدم
+- إعادة إدراج التصدير المتوقف بعد انتهاء مهلته
+- ذاكرة الملفات المُصدَّرة حسب نسخة البيانات وحذف الملفات المنتهية والتصديرات الفاشلة أو المتوقفة
+- التصدير التزايدي منذ مؤشر مع سجلات الحذف
+- التصدير العمودي (Parquet / Arrow) بأنواع أعمدة صحيحة
+- ذاكرة ملفات PDF حسب نسخة الكيان مع دعم ETag و Range
+- التقرير الشهري المحسوب مرة واحدة عند إغلاق الشهر
+- حزمة تقارير الشكاوى كملف zip متدفق
+"""
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+import sys
+import os
+import gzip
+import json
+import importlib.util
+import shutil
+import tempfile
+import jwt
+import io
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from openpyxl import load_workbook
+from src.database.db import db
+from src.main import app
+from src.models.complaint import (
+    User, Role, Complaint, ComplaintCategory, ComplaintStatus, ComplaintComment, Export,
+    Payment, PaymentMethod
+)
+from src.services import job_queue, export_service, pdf_renderer
+from src.services.export_service import ExportService
+from src.services.pdf_service import PDFService
+from src.core.storage import LocalStorage
+from werkzeug.security import generate_password_hash
+
+
+class ExportTestCase(unittest.TestCase):
+    """بيانات مشتركة لاختبارات التصدير"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = app
+        cls.app.config['TESTING'] = True
+        cls.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    def setUp(self):
+        self.files = []
+
+        with self.app.app_context():
+            db.create_all()
+
+            db.session.add(Role(role_id=1, role_name='Trader', description='تاجر'))
+            db.session.add(ComplaintCategory(category_id=1, category_name='جودة'))
+            db.session.add(ComplaintCategory(category_id=2, category_name='أسعار'))
+            db.session.add(ComplaintStatus(status_id=1, status_name='جديدة'))
+            db.session.add(ComplaintStatus(status_id=2, status_name='مغلقة'))
+            db.session.add(User(
+                user_id='export-trader',
+                username='export_trader',
+                email='export@test.com',
+                password_hash=generate_password_hash('password123'),
+                full_name='تاجر التصدير',
+                role_id=1
+            ))
+            db.session.commit()
+
+            for i in range(5):
+                db.session.add(Complaint(
+                    complaint_id=f'complaint-{i}',
+                    trader_id='export-trader',
+                    title=f'شكوى {i}',
+                    description='وصف الشكوى',
+                    category_id=1 + i % 2,
+                    status_id=1 + i % 2,
+                    submitted_at=datetime(2025, 1, 1 + i),
+                    last_updated_at=datetime(2025, 1, 1 + i)
+                ))
+            db.session.add_all([
+                ComplaintComment(complaint_id='complaint-0', user_id='export-trader', comment_text=f'تعليق {i}')
+                for i in range(2)
+            ])
+            db.session.commit()
+
+    def tearDown(self):
+        for path in self.files:
+            if os.path.exists(path):
+                os.remove(path)
+
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+
+class TestStreamingExcelExport(ExportTestCase):
+    """اختبار التصدير المتدفق إلى Excel"""
+
+    def _export(self, filters=None, chunk_size=None):
+        path = ExportService.write_excel('complaints', filters, chunk_size=chunk_size)
+        self.files.append(path)
+        return load_workbook(path).active
+
+    def test_complaints_workbook(self):
+        """الملف يحتوي الصفوف بالأعمدة المرتبطة والتنسيق"""
+        with self.app.app_context():
+            sheet = self._export(chunk_size=2)
+
+            rows = list(sheet.iter_rows(values_only=True))
+            headers = rows[0]
+            self.assertEqual(len(rows), 6)
+            self.assertEqual(headers[0], 'رقم الشكوى')
+
+            first = dict(zip(headers, rows[1]))
+            self.assertEqual(first['اسم التاجر'], 'تاجر التصدير')
+            self.assertEqual(first['الفئة'], 'جودة')
+            self.assertEqual(first['الحالة'], 'جديدة')
+            self.assertEqual(first['تاريخ التقديم'], '2025-01-01 00:00')
+            self.assertEqual(first['عدد التعليقات'], 2)
+            self.assertEqual(first['عدد المرفقات'], 0)
+
+            self.assertTrue(sheet.sheet_view.rightToLeft)
+            self.assertTrue(sheet['A1'].font.bold)
+            self.assertEqual(sheet['A2'].alignment.horizontal, 'right')
+            self.assertGreater(sheet.column_dimensions['A'].width, len('رقم الشكوى'))
+
+    def test_filters(self):
+        """الفلاتر تطبق على الاستعلام"""
+        with self.app.app_context():
+            sheet = self._export({'status_id': 2, 'start_date': datetime(2025, 1, 3)})
+
+            ids = [row[0] for row in sheet.iter_rows(min_row=2, values_only=True)]
+            self.assertEqual(ids, ['complaint-3'])
+
+
+    def test_summary_sheets(self):
+        """أوراق الملخص: الفئة × الحالة، وسيط أيام الحل، الحجم الشهري"""
+        with self.app.app_context():
+            for complaint_id, days in (('complaint-1', 2), ('complaint-3', 5)):
+                complaint = db.session.get(Complaint, complaint_id)
+                complaint.closed_at = complaint.submitted_at + timedelta(days=days)
+            db.session.get(Complaint, 'complaint-4').submitted_at = datetime(2025, 2, 10)
+            db.session.commit()
+
+            path = ExportService.export_complaints_to_excel(include_summary=True)
+            self.files.append(path)
+
+        workbook = load_workbook(path)
+        self.assertEqual(len(workbook.sheetnames), 4)
+        self.assertEqual(workbook.worksheets[0].max_row, 6)
+
+        pivot = list(workbook['الفئة × الحالة'].iter_rows(values_only=True))
+        self.assertEqual(pivot[0], ('الفئة', 'جديدة', 'مغلقة', 'المجموع'))
+        self.assertEqual(sorted(pivot[1:]), [('أسعار', 0, 2, 2), ('جودة', 3, 0, 3)])
+
+        resolution = list(workbook['أيام الحل حسب الفئة'].iter_rows(min_row=2, values_only=True))
+        self.assertEqual(resolution, [('أسعار', 2, 3.5)])
+
+        monthly = list(workbook['الحجم الشهري'].iter_rows(min_row=2, values_only=True))
+        self.assertEqual(monthly, [('2025-01', 4), ('2025-02', 1)])
+
+
+class TestStreamingTextExport(ExportTestCase):
+    """اختبار تدفق CSV و NDJSON"""
+
+    def test_csv_has_bom_and_header_first(self):
+        """أول جزء يحتوي BOM والعناوين قبل تنفيذ الاستعلام"""
+        with self.app.app_context():
+            stream = ExportService.stream_csv('complaints', chunk_size=2)
+            first = next(stream)
+            body = first + b''.join(stream)
+
+        self.assertTrue(first.startswith('\ufeff'.encode('utf-8')))
+        self.assertIn('رقم الشكوى'.encode('utf-8'), first)
+        lines = body.decode('utf-8-sig').strip().splitlines()
+        self.assertEqual(len(lines), 6)
+        self.assertIn('تاجر التصدير', lines[1])
+
+    def test_ndjson_gzip(self):
+        """NDJSON مضغوط بقيم خام ومفاتيح إنجليزية"""
+        with self.app.app_context():
+            body = b''.join(ExportService.stream_ndjson('complaints', {'category_id': 1}, compress=True, chunk_size=2))
+
+        records = [json.loads(line) for line in gzip.decompress(body).decode('utf-8').splitlines()]
+        self.assertEqual([record['complaint_id'] for record in records], ['complaint-0', 'complaint-2', 'complaint-4'])
+        self.assertEqual(records[0]['comments_count'], 2)
+        self.assertEqual(records[0]['submitted_at'], '2025-01-01T00:00:00')
+
+
+class AsyncExportTestCase(ExportTestCase):
+    """تصدير بدون Redis مع مستخدم ثانٍ"""
+
+    def setUp(self):
+        super().setUp()
+        self.redis_patch = mock.patch.object(job_queue, 'use_redis', False)
+        self.redis_patch.start()
+
+        with self.app.app_context():
+            db.session.add(User(
+                user_id='export-trader-2',
+                username='export_trader_2',
+                email='export2@test.com',
+                password_hash=generate_password_hash('password123'),
+                full_name='تاجر آخر',
+                role_id=1
+            ))
+            db.session.commit()
+
+    def tearDown(self):
+        self.redis_patch.stop()
+        super().tearDown()
+
+
+class TestAsyncExport(AsyncExportTestCase):
+    """اختبار التصدير غير المتزامن"""
+
+    def test_export_runs_without_redis(self):
+        """بدون Redis يُنفَّذ التصدير مباشرة ويكتمل"""
+        with self.app.app_context():
+            user = db.session.get(User, 'export-trader')
+            export = ExportService.submit_export(user, 'complaints', 'csv', {'start_date': datetime(2025, 1, 2)})
+            self.files.append(export.file_path)
+
+            self.assertEqual(export.status, 'completed')
+            self.assertEqual(export.total_rows, 4)
+            self.assertEqual(export.rows_written, 4)
+            self.assertEqual(export.to_dict()['progress'], 100)
+            self.assertEqual(export.to_dict()['download_url'], f'/api/export/{export.id}/download')
+            with open(export.file_path, encoding='utf-8-sig') as f:
+                self.assertEqual(len(f.read().strip().splitlines()), 5)
+
+    def test_identical_requests_are_joined(self):
+        """الطلبات المتطابقة تنضم إلى مهمة واحدة وتكتمل معاً"""
+        with self.app.app_context():
+            with mock.patch.object(job_queue, 'enqueue_export') as enqueue:
+                first = ExportService.submit_export(db.session.get(User, 'export-trader'), 'complaints', 'xlsx')
+                second = ExportService.submit_export(db.session.get(User, 'export-trader-2'), 'complaints', 'xlsx')
+                again = ExportService.submit_export(db.session.get(User, 'export-trader'), 'complaints', 'xlsx')
+
+            enqueue.assert_called_once_with(first.fingerprint)
+            self.assertNotEqual(first.id, second.id)
+            self.assertEqual(first.fingerprint, second.fingerprint)
+            self.assertEqual(again.id, first.id)
+            self.assertEqual(second.status, 'pending')
+
+            result = ExportService.run_export(first.fingerprint)
+            self.files.append(result['file_path'])
+
+            self.assertTrue(result['success'])
+            statuses = {export.status for export in Export.query.filter_by(fingerprint=first.fingerprint)}
+            self.assertEqual(statuses, {'completed'})
+
+    def test_abandoned_export_is_requeued(self):
+        """التصدير المتوقف بعد انتهاء مهلته يُعاد إدراجه ولا يُنضم إليه"""
+        with self.app.app_context():
+            with mock.patch.object(job_queue, 'enqueue_export'):
+                first = ExportService.submit_export(db.session.get(User, 'export-trader'), 'complaints', 'csv')
+            # The worker claimed it, then died without reporting back
+            first.status = 'running'
+            first.started_at = datetime.utcnow() - timedelta(seconds=export_service.EXPORT_LEASE_SECONDS + 1)
+            db.session.commit()
+
+            with mock.patch.object(job_queue, 'enqueue_export') as enqueue:
+                again = ExportService.submit_export(db.session.get(User, 'export-trader'), 'complaints', 'csv')
+                second = ExportService.submit_export(db.session.get(User, 'export-trader-2'), 'complaints', 'csv')
+
+            self.assertEqual(again.id, first.id)
+            self.assertEqual(enqueue.call_count, 2)
+
+            result = ExportService.run_export(first.fingerprint)
+            self.files.append(result['file_path'])
+            self.assertTrue(result['success'])
+            self.assertEqual(db.session.get(Export, second.id).status, 'completed')
+            self.assertEqual(db.session.get(Export, first.id).status, 'completed')
+
+            # A duplicate job finds nothing left to claim
+            self.assertFalse(ExportService.run_export(first.fingerprint)['success'])
+
+    def test_fingerprint_follows_data_version(self):
+        """تغيّر البيانات أو الفلاتر أو الصيغة يغيّر البصمة"""
+        with self.app.app_context():
+            fingerprint, rows = ExportService.fingerprint('complaints', 'csv', {'category_id': 1})
+            self.assertEqual(rows, 3)
+            self.assertNotEqual(fingerprint, ExportService.fingerprint('complaints', 'xlsx', {'category_id': 1})[0])
+            self.assertNotEqual(fingerprint, ExportService.fingerprint('complaints', 'csv', {'category_id': 2})[0])
+
+            complaint = db.session.get(Complaint, 'complaint-0')
+            complaint.last_updated_at = datetime(2025, 2, 1)
+            db.session.commit()
+            self.assertNotEqual(fingerprint, ExportService.fingerprint('complaints', 'csv', {'category_id': 1})[0])
+
+
+class TestExportArtifactCache(AsyncExportTestCase):
+    """اختبار إعادة استخدام الملفات المُصدَّرة وحذف المنتهية"""
+
+    def test_repeat_export_served_from_cache(self):
+        """الطلب المكرر يكتمل فوراً من نفس الملف دون إعادة التوليد"""
+        with self.app.app_context():
+            first = ExportService.submit_export(db.session.get(User, 'export-trader'), 'payments', 'ndjson')
+            self.files.append(first.file_path)
+
+            with mock.patch.object(job_queue, 'enqueue_export') as enqueue:
+                second = ExportService.submit_export(db.session.get(User, 'export-trader-2'), 'payments', 'ndjson')
+
+            enqueue.assert_not_called()
+            self.assertEqual(second.status, 'completed')
+            self.assertEqual(second.file_path, first.file_path)
+
+    def test_cached_excel_follows_data_version(self):
+        """ملف Excel يُعاد استخدامه حتى تتغير البيانات"""
+        with self.app.app_context():
+            path = ExportService.export_complaints_to_excel({'category_id': 2})
+            self.files.append(path)
+            mtime = os.path.getmtime(path)
+
+            self.assertEqual(ExportService.export_complaints_to_excel({'category_id': 2}), path)
+            self.assertEqual(os.path.getmtime(path), mtime)
+
+            db.session.get(Complaint, 'complaint-1').last_updated_at = datetime(2025, 3, 1)
+            db.session.commit()
+            changed = ExportService.export_complaints_to_excel({'category_id': 2})
+            self.files.append(changed)
+            self.assertNotEqual(changed, path)
+
+    def test_sweeper_deletes_expired_exports(self):
+        """حذف السجلات والملفات المنتهية مع إبقاء الملفات المستخدمة"""
+        with self.app.app_context():
+            user = db.session.get(User, 'export-trader')
+            expired = ExportService.submit_export(user, 'complaints', 'csv', {'category_id': 1})
+            live = ExportService.submit_export(user, 'complaints', 'csv', {'category_id': 2})
+            self.files += [expired.file_path, live.file_path]
+            expired_id, expired_path = expired.id, expired.file_path
+
+            expired.expires_at = datetime.utcnow() - timedelta(hours=1)
+            db.session.commit()
+
+            result = ExportService.sweep_expired(batch_size=1)
+
+            self.assertEqual(result['deleted_rows'], 1)
+            self.assertIsNone(db.session.get(Export, expired_id))
+            self.assertFalse(os.path.exists(expired_path))
+            self.assertTrue(os.path.exists(live.file_path))
+
+    def test_sweeper_deletes_failed_and_abandoned_exports(self):
+        """حذف التصديرات الفاشلة والمتوقفة بعد مدة الصلاحية وإبقاء الجارية"""
+        with self.app.app_context():
+            with mock.patch.object(ExportService, 'write_export', side_effect=RuntimeError('disk full')):
+                failed = ExportService.submit_export(db.session.get(User, 'export-trader'), 'complaints', 'csv')
+            self.assertEqual(failed.status, 'failed')
+            self.assertIsNotNone(failed.expires_at)
+
+            old = datetime.utcnow() - timedelta(hours=export_service.EXPORT_EXPIRY_HOURS + 1)
+            with mock.patch.object(job_queue, 'enqueue_export'):
+                abandoned = ExportService.submit_export(db.session.get(User, 'export-trader'), 'payments', 'csv')
+                running = ExportService.submit_export(db.session.get(User, 'export-trader'), 'users', 'csv')
+            abandoned.created_at = old
+            running.created_at = old
+            running.status = 'running'
+            running.started_at = datetime.utcnow()
+            failed.expires_at = datetime.utcnow() - timedelta(minutes=1)
+            abandoned_id, running_id, failed_id = abandoned.id, running.id, failed.id
+            db.session.commit()
+
+            result = ExportService.sweep_expired()
+
+            self.assertEqual(result['deleted_rows'], 2)
+            self.assertIsNone(db.session.get(Export, failed_id))
+            self.assertIsNone(db.session.get(Export, abandoned_id))
+            self.assertIsNotNone(db.session.get(Export, running_id))
+
+
+class TestDeltaExport(ExportTestCase):
+    """اختبار التصدير التزايدي"""
+
+    def setUp(self):
+        super().setUp()
+        self.lag_patch = mock.patch.object(export_service, 'DELTA_LAG_SECONDS', 0)
+        self.lag_patch.start()
+
+    def tearDown(self):
+        self.lag_patch.stop()
+        super().tearDown()
+
+    def _changes(self, since=None):
+        cursor, stream = ExportService.stream_changes('complaints', since, chunk_size=2)
+        operations = [json.loads(line) for line in b''.join(stream).decode('utf-8').splitlines()]
+        self.assertEqual(operations[-1], {'op': 'cursor', 'next': cursor})
+        return cursor, operations[:-1]
+
+    def test_delta_contains_only_changes_and_deletions(self):
+        """الدفعة التالية تحتوي المعدّل والمحذوف فقط"""
+        with self.app.app_context():
+            cursor, initial = self._changes()
+            self.assertEqual(len(initial), 5)
+            self.assertTrue(all(operation['op'] == 'upsert' for operation in initial))
+
+            db.session.get(Complaint, 'complaint-1').title = 'عنوان معدل'
+            db.session.delete(db.session.get(Complaint, 'complaint-2'))
+            db.session.commit()
+
+            next_cursor, changes = self._changes(ExportService.decode_cursor(cursor))
+
+            self.assertEqual(changes, [
+                {'op': 'upsert', 'record': changes[0]['record']},
+                {'op': 'delete', 'id': 'complaint-2'}
+            ])
+            self.assertEqual(changes[0]['record']['complaint_id'], 'complaint-1')
+            self.assertEqual(changes[0]['record']['title'], 'عنوان معدل')
+
+            _, empty = self._changes(ExportService.decode_cursor(next_cursor))
+            self.assertEqual(empty, [])
+
+    def test_invalid_cursor(self):
+        """المؤشر غير الصالح يُرفض"""
+        with self.assertRaises(ValueError):
+            ExportService.decode_cursor('not-a-cursor')
+
+
+@unittest.skipUnless(importlib.util.find_spec('pyarrow'), 'pyarrow is not installed')
+class TestColumnarExport(ExportTestCase):
+    """اختبار التصدير العمودي"""
+
+    def test_parquet_types_and_row_groups(self):
+        """أعمدة مصنفة وتواريخ حقيقية ومجموعات صفوف مضغوطة zstd"""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        from src.services import columnar_export
+
+        with self.app.app_context(), mock.patch.object(columnar_export, 'ROW_GROUP_SIZE', 2):
+            path = ExportService.write_export('complaints', 'parquet', {'category_id': 1}, chunk_size=1)
+            self.files.append(path)
+
+        parquet = pq.ParquetFile(path)
+        self.assertEqual(parquet.metadata.num_rows, 3)
+        self.assertEqual(parquet.metadata.num_row_groups, 2)
+        self.assertEqual(parquet.metadata.row_group(0).column(0).compression, 'ZSTD')
+
+        table = parquet.read()
+        self.assertTrue(pa.types.is_dictionary(table.schema.field('status_name').type))
+        self.assertTrue(pa.types.is_timestamp(table.schema.field('submitted_at').type))
+        self.assertEqual(table.column('comments_count').to_pylist(), [2, 0, 0])
+        self.assertEqual(table.column('category_name').to_pylist(), ['جودة'] * 3)
+
+    def test_arrow_stream(self):
+        """ملف Arrow IPC يُقرأ كجدول بنفس المخطط"""
+        import pyarrow as pa
+
+        with self.app.app_context():
+            path = ExportService.write_export('complaints', 'arrow', chunk_size=2)
+            self.files.append(path)
+
+        with pa.OSFile(path, 'rb') as source:
+            table = pa.ipc.open_stream(source).read_all()
+        self.assertEqual(table.num_rows, 5)
+        self.assertEqual(table.column('submitted_at')[0].as_py(), datetime(2025, 1, 1))
+
+
+
+class TestPDFArtifacts(ExportTestCase):
+    """اختبار تخزين ملفات PDF المولّدة وإعادة استخدامها"""
+
+    def setUp(self):
+        super().setUp()
+        self.storage_dir = tempfile.mkdtemp()
+        self.client = self.app.test_client()
+        self.renders = []
+
+        def fake_render(html, base_url=None):
+            self.renders.append(html)
+            return b'%PDF-1.7 ' + str(len(self.renders)).encode() * 64
+
+        patches = [
+            mock.patch.object(PDFService, '_storage', LocalStorage(self.storage_dir)),
+            mock.patch('src.services.pdf_renderer.render', side_effect=fake_render),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        with self.app.app_context():
+            db.session.add(Role(role_id=2, role_name='Higher Committee', description='اللجنة العليا'))
+            db.session.add(User(
+                user_id='export-admin',
+                username='export_admin',
+                email='admin@test.com',
+                password_hash=generate_password_hash('password123'),
+                full_name='مدير التصدير',
+                role_id=2
+            ))
+            db.session.add(PaymentMethod(method_id='method-1', name='تحويل', account_number='123', account_holder='الغرفة'))
+            db.session.add(Payment(
+                payment_id='payment-1',
+                user_id='export-trader',
+                method_id='method-1',
+                sender_name='تاجر التصدير',
+                sender_phone='777000000',
+                amount=50000,
+                payment_date=datetime(2025, 1, 10),
+                receipt_image_path='receipts/payment-1.png',
+                status='pending',
+                created_at=datetime(2025, 1, 10)
+            ))
+            db.session.commit()
+
+        token = jwt.encode(
+            {'user_id': 'export-admin', 'exp': datetime.utcnow() + timedelta(hours=1)},
+            self.app.config['SECRET_KEY'], algorithm='HS256'
+        )
+        self.headers = {'Authorization': f'Bearer {token}'}
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.storage_dir, ignore_errors=True)
+
+    def _artifacts(self, kind, entity_id):
+        return PDFService.storage().list(f'pdf_artifacts/{kind}/{entity_id}/')
+
+    def test_repeat_download_served_from_artifact(self):
+        """التنزيل المتكرر لا يعيد التوليد ويدعم ETag و Range"""
+        url = '/api/export/complaint/complaint-1/pdf'
+        first = self.client.get(url, headers=self.headers)
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first.data.startswith(b'%PDF'))
+        etag = first.headers['ETag']
+
+        second = self.client.get(url, headers=self.headers)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.headers['ETag'], etag)
+        self.assertEqual(len(self.renders), 1)
+
+        cached = self.client.get(url, headers={**self.headers, 'If-None-Match': etag})
+        self.assertEqual(cached.status_code, 304)
+
+        partial = self.client.get(url, headers={**self.headers, 'Range': 'bytes=0-3'})
+        self.assertEqual(partial.status_code, 206)
+        self.assertEqual(partial.data, b'%PDF')
+        self.assertEqual(len(self.renders), 1)
+
+        with self.app.app_context():
+            self.assertEqual(Export.query.filter_by(export_type='complaint_pdf').count(), 2)
+
+    def test_new_version_replaces_artifact(self):
+        """تحديث الشكوى ينشئ نسخة جديدة ويحذف القديمة"""
+        with self.app.app_context():
+            complaint = db.session.get(Complaint, 'complaint-1')
+            old_key = PDFService.complaint_report_artifact(complaint)
+            self.assertEqual(PDFService.complaint_report_artifact(complaint), old_key)
+
+            complaint.last_updated_at = datetime(2025, 2, 1)
+            db.session.commit()
+            new_key = PDFService.complaint_report_artifact(complaint)
+
+            self.assertNotEqual(new_key, old_key)
+            self.assertEqual(self._artifacts('complaint', 'complaint-1'), [new_key])
+        self.assertEqual(len(self.renders), 2)
+
+    def test_receipt_rendered_at_approval(self):
+        """يُولَّد الإيصال عند اعتماد الدفع ويُنزَّل دون توليد جديد"""
+        from src.services.subscription_service import create_or_extend_subscription
+
+        with self.app.app_context():
+            result = create_or_extend_subscription('export-trader', 'payment-1', 'export-admin')
+            self.assertTrue(result['success'])
+            self.assertEqual(len(self._artifacts('receipt', 'payment-1')), 1)
+        self.assertEqual(len(self.renders), 1)
+
+        response = self.client.get('/api/export/payment/payment-1/receipt/pdf', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.renders), 1)
+
+    def test_receipt_includes_review_notes(self):
+        """ملاحظات المراجعة تحفظ قبل توليد الإيصال فتظهر فيه"""
+        response = self.client.post(
+            '/api/admin/payments/payment-1/approve',
+            json={'notes': 'تم التحقق من الحوالة'},
+            headers=self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(self.renders), 1)
+        self.assertIn('تم التحقق من الحوالة', self.renders[0])
+
+    def test_monthly_report_dataset(self):
+        """إحصاءات الشهر من استعلامات مجمّعة"""
+        with self.app.app_context():
+            complaint = db.session.get(Complaint, 'complaint-1')
+            complaint.closed_at = datetime(2025, 1, 12, 12)
+            db.session.commit()
+
+            dataset = PDFService.monthly_report_dataset(1, 2025)
+
+        stats = dataset['stats']
+        self.assertEqual(dataset['month_name'], 'يناير')
+        self.assertEqual(stats['total_complaints'], 5)
+        self.assertEqual(stats['closed_complaints'], 2)
+        self.assertEqual(stats['resolution_rate'], 40.0)
+        self.assertEqual(stats['avg_processing_days'], 10.0)
+        self.assertEqual(
+            [(category['name'], category['count']) for category in stats['by_category']],
+            [('جودة', 3), ('أسعار', 2)]
+        )
+        self.assertEqual(stats['total_payments'], 1)
+        self.assertEqual(stats['pending_payments'], 1)
+        self.assertEqual(stats['total_revenue'], 0)
+
+    def test_closed_month_served_from_artifact(self):
+        """الشهر المغلق يُحسب ويُخزَّن مرة واحدة ثم يُقدَّم كملف"""
+        url = '/api/export/monthly-report/2025/1/pdf'
+        first = self.client.get(url, headers=self.headers)
+        second = self.client.get(url, headers=self.headers)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(len(self.renders), 1)
+        self.assertIn('data:image/svg+xml;base64,', self.renders[0])
+
+        storage = PDFService.storage()
+        with storage.open(PDFService.monthly_report_key(1, 2025, 'report.json')) as f:
+            self.assertEqual(json.load(f)['stats']['total_complaints'], 5)
+        self.assertTrue(storage.exists(PDFService.monthly_report_key(1, 2025, 'chart.svg')))
+
+    def test_pdf_bundle(self):
+        """الحزمة تعيد استخدام الملفات المخزنة وتولّد الباقي في المجمّع"""
+        executor = ThreadPoolExecutor(max_workers=2)
+        self.addCleanup(executor.shutdown)
+        pooled = []
+
+        def fake_render_html(html, base_url=None):
+            pooled.append(html)
+            return b'%PDF-pooled'
+
+        with self.app.app_context():
+            PDFService.complaint_report_artifact(db.session.get(Complaint, 'complaint-1'))
+
+        with mock.patch.object(pdf_renderer, 'render_html', fake_render_html), \
+                mock.patch.object(pdf_renderer, 'RENDER_MODE', 'pool'), \
+                mock.patch.object(pdf_renderer.RenderPool, '_get_executor', return_value=executor):
+            response = self.client.get('/api/export/complaints/pdf-bundle?category_id=2', headers=self.headers)
+            data = response.get_data()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.mimetype, 'application/zip')
+        self.assertEqual(len(self.renders), 1)
+        self.assertEqual(len(pooled), 1)
+
+        bundle = zipfile.ZipFile(io.BytesIO(data))
+        self.assertEqual(
+            sorted(bundle.namelist()),
+            ['complaint_report_complaint-1.pdf', 'complaint_report_complaint-3.pdf']
+        )
+        self.assertTrue(all(info.compress_type == zipfile.ZIP_STORED for info in bundle.infolist()))
+        self.assertEqual(bundle.read('complaint_report_complaint-3.pdf'), b'%PDF-pooled')
+        self.assertEqual(len(self._artifacts('complaint', 'complaint-3')), 1)
+
+    def test_invalid_filter_rejected(self):
+        """قيم الفلاتر غير الرقمية ترفض بخطأ 400 بدل خطأ الخادم"""
+        for query in ('status_id=abc', 'category_id=1.5'):
+            response = self.client.get(f'/api/export/complaints.csv?{query}', headers=self.headers)
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('error', response.get_json())
+
+
+if __name__ == '__main__':
+    unittest.main()
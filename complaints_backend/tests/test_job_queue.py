@@ -0,0 +1,151 @@
+"""
+اختبارات طابور المهام (Job Queue Tests)
+تتضمن:
+- اختيار مسار الأولوية للإشعارات
+- الإدراج الجماعي في رحلة واحدة إلى Redis
+- التنفيذ المتزامن عند عدم توفر Redis
+- تنفيذ الإشعارات المتزامنة ضمن سياق التطبيق المستدعي
+- التوسع التلقائي لعمليات العمال (Worker Supervisor)
+"""
+import unittest
+from unittest import mock
+import sys
+import os
+import shutil
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services import job_queue
+from src.database.db import db, DEFAULT_DATABASE_URI
+from src.main import create_app
+from src.models.complaint import User, Role, Notification
+from worker import WorkerPool
+from werkzeug.security import generate_password_hash
+
+
+def sample_job(value):
+    return {'success': True, 'value': value}
+
+
+class TestPriorityLanes(unittest.TestCase):
+    """اختبار مسارات الأولوية والإدراج الجماعي"""
+
+    def test_notification_lane(self):
+        """الإشعارات الحرجة تذهب للمسار الحرج"""
+        self.assertEqual(job_queue.lane_for_notification('account_locked'), 'critical')
+        self.assertEqual(job_queue.lane_for_notification('complaint_status_changed'), 'interactive')
+
+    def test_enqueue_many_uses_single_pipeline(self):
+        """الإدراج الجماعي يستخدم pipeline واحداً لجميع المهام"""
+        redis = mock.MagicMock()
+        pipe = redis.pipeline.return_value.__enter__.return_value
+        bulk_queue = mock.MagicMock()
+        bulk_queue.enqueue_many.return_value = [mock.Mock(id=f'job-{i}') for i in range(3)]
+
+        with mock.patch.object(job_queue, 'use_redis', True), \
+             mock.patch.object(job_queue, 'redis_conn', redis), \
+             mock.patch.object(job_queue, 'lane_queues', {'bulk': bulk_queue}):
+            result = job_queue.enqueue_many([(sample_job, {'value': i}) for i in range(3)], lane='bulk')
+
+        self.assertTrue(result['success'])
+        self.assertEqual(result['job_ids'], ['job-0', 'job-1', 'job-2'])
+        bulk_queue.enqueue_many.assert_called_once()
+        self.assertEqual(len(bulk_queue.enqueue_many.call_args[0][0]), 3)
+        self.assertIs(bulk_queue.enqueue_many.call_args[1]['pipeline'], pipe)
+        pipe.execute.assert_called_once()
+
+    def test_enqueue_many_runs_synchronously_without_redis(self):
+        """بدون Redis تُنفَّذ المهام مباشرة"""
+        with mock.patch.object(job_queue, 'use_redis', False):
+            result = job_queue.enqueue_many([(sample_job, {'value': i}) for i in range(2)])
+
+        self.assertTrue(result['success'])
+        self.assertEqual([r['value'] for r in result['results']], [0, 1])
+
+    def test_metrics_without_redis(self):
+        """المقاييس فارغة عند عدم توفر Redis"""
+        with mock.patch.object(job_queue, 'use_redis', False):
+            self.assertEqual(job_queue.get_queue_metrics(), {'use_redis': False, 'lanes': {}})
+
+
+class TestInlineJobs(unittest.TestCase):
+    """اختبار تنفيذ المهام مباشرة داخل سياق التطبيق"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.app = create_app({
+            'TESTING': True,
+            'SQLALCHEMY_DATABASE_URI': f'sqlite:///{os.path.join(self.tmpdir, "inline.db")}',
+        })
+        with self.app.app_context():
+            db.create_all()
+            db.session.add(Role(role_id=1, role_name='Trader', description='تاجر'))
+            db.session.add(User(
+                username='inline_trader',
+                email='inline@test.com',
+                password_hash=generate_password_hash('password123'),
+                full_name='تاجر',
+                role_id=1
+            ))
+            db.session.commit()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        shutil.rmtree(self.tmpdir)
+
+    def test_inline_notification_uses_caller_app(self):
+        """بدون Redis يُنشأ الإشعار في قاعدة التطبيق المستدعي دون تطبيق جديد"""
+        with self.app.app_context(), \
+             mock.patch.object(job_queue, 'use_redis', False), \
+             mock.patch.object(job_queue, '_create_job_app', side_effect=AssertionError('job app created')):
+            user = User.query.filter_by(username='inline_trader').first()
+            result = job_queue.enqueue_notifications([{
+                'user_id': user.user_id,
+                'notification_type': 'backup_failure',
+                'message': 'فشل النسخ الاحتياطي',
+                'channel': 'in_app'
+            }], lane='critical')
+
+            self.assertTrue(result['success'])
+            self.assertEqual(Notification.query.filter_by(user_id=user.user_id).count(), 1)
+
+    def test_job_app_default_database(self):
+        """تطبيق المهام يستخدم نفس قاعدة التطبيق الافتراضية"""
+        with mock.patch.dict(os.environ):
+            os.environ.pop('DATABASE_URL', None)
+            job_app = job_queue._create_job_app()
+        self.assertEqual(job_app.config['SQLALCHEMY_DATABASE_URI'], DEFAULT_DATABASE_URI)
+        self.assertTrue(DEFAULT_DATABASE_URI.endswith(os.path.join('src', 'database', 'app.db')))
+
+
+class TestWorkerPool(unittest.TestCase):
+    """اختبار حساب حجم مجموعات العمال"""
+
+    def test_parse_pools(self):
+        """قراءة إعداد WORKER_POOLS"""
+        pools = WorkerPool.parse('critical,interactive=1-4; bulk=0-8')
+
+        self.assertEqual([pool.queue_names for pool in pools], [['critical', 'interactive'], ['bulk']])
+        self.assertEqual([(pool.min_size, pool.max_size) for pool in pools], [(1, 4), (0, 8)])
+        with self.assertRaises(ValueError):
+            WorkerPool.parse('bulk=3-2')
+
+    def test_scales_with_depth_and_wait(self):
+        """التوسع حسب عمق الطابور وزمن الانتظار ضمن الحدين الأدنى والأعلى"""
+        pool = WorkerPool(['bulk'], 1, 8)
+        pool.processes = [object(), object()]
+
+        self.assertEqual(pool.desired_size(depth=100, oldest_wait=1), 5)
+        self.assertEqual(pool.desired_size(depth=1000, oldest_wait=1), 8)
+        self.assertEqual(pool.desired_size(depth=10, oldest_wait=120), 3)
+        self.assertEqual(pool.desired_size(depth=0, oldest_wait=None), 1)
+
+        pool.processes = [object()] * 6
+        self.assertEqual(pool.desired_size(depth=0, oldest_wait=None), 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
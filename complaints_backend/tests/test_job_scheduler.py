@@ -0,0 +1,164 @@
+"""
+اختبارات المجدول الداخلي (Job Scheduler Tests)
+تتضمن:
+- تحليل تعابير cron وحساب المواعيد
+- القفل الموزّع (بدون Redis) واسترداد الأقفال المنتهية
+- سجل التشغيل ومنع التشغيل المتزامن أو المكرر لنفس الموعد
+"""
+import unittest
+from unittest import mock
+from datetime import datetime, timedelta
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.db import db
+from src.main import app
+from src.models.complaint import JobRun, JobLock
+from src.services import job_queue
+from src.services.job_scheduler import (
+    CronSchedule, DistributedLock, ScheduledJob, JOBS, run_job, run_due_jobs
+)
+
+
+class TestCronSchedule(unittest.TestCase):
+    """اختبار تعابير cron"""
+
+    def test_matches_and_next_run(self):
+        """حساب الموعد القادم والسابق لتعبير يومي"""
+        schedule = CronSchedule('30 2 * * *')
+
+        self.assertTrue(schedule.matches(datetime(2026, 1, 5, 2, 30)))
+        self.assertFalse(schedule.matches(datetime(2026, 1, 5, 2, 31)))
+        self.assertEqual(schedule.next_after(datetime(2026, 1, 5, 2, 30)), datetime(2026, 1, 6, 2, 30))
+        self.assertEqual(schedule.latest_before(datetime(2026, 1, 5, 2, 29)), datetime(2026, 1, 4, 2, 30))
+
+    def test_steps_ranges_and_weekdays(self):
+        """الخطوات والنطاقات وأيام الأسبوع (0 = الأحد)"""
+        schedule = CronSchedule('*/15 9-17 * * 1-5')
+
+        self.assertEqual(schedule.minutes, {0, 15, 30, 45})
+        self.assertEqual(schedule.next_after(datetime(2026, 1, 2, 17, 45)), datetime(2026, 1, 5, 9, 0))
+
+    def test_invalid_expression(self):
+        """رفض التعابير غير الصالحة"""
+        with self.assertRaises(ValueError):
+            CronSchedule('61 * * * *')
+        with self.assertRaises(ValueError):
+            CronSchedule('* * *')
+
+
+class TestJobScheduler(unittest.TestCase):
+    """اختبار القفل الموزّع وسجل التشغيل"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = app
+        cls.app.config['TESTING'] = True
+        cls.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    def setUp(self):
+        self.calls = []
+
+        def sample_job():
+            self.calls.append(datetime.utcnow())
+            return {'success': True, 'rows_affected': 4}
+
+        self.patches = [
+            mock.patch.object(job_queue, 'use_redis', False),
+            mock.patch.dict(JOBS, {
+                'sample': ScheduledJob('sample', sample_job, schedule='0 2 * * *'),
+                'broken': ScheduledJob('broken', lambda: 1 / 0)
+            }, clear=True),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+        with self.app.app_context():
+            db.create_all()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_lock_is_exclusive_until_released(self):
+        """لا يمكن الحصول على القفل مرتين حتى يتم تحريره"""
+        with self.app.app_context():
+            first = DistributedLock('sample', 60)
+            second = DistributedLock('sample', 60)
+
+            self.assertTrue(first.acquire())
+            self.assertFalse(second.acquire())
+
+            first.release()
+            self.assertTrue(second.acquire())
+            second.release()
+
+    def test_expired_lock_is_taken_over(self):
+        """القفل المنتهي لحامل متوقف يمكن الاستيلاء عليه"""
+        with self.app.app_context():
+            db.session.add(JobLock(name='sample', owner='dead', expires_at=datetime.utcnow() - timedelta(seconds=1)))
+            db.session.commit()
+
+            lock = DistributedLock('sample', 60)
+            self.assertTrue(lock.acquire())
+            self.assertEqual(db.session.get(JobLock, 'sample').owner, lock.token)
+            lock.release()
+
+    def test_run_is_recorded(self):
+        """تسجيل المدة والسجلات المتأثرة والنتيجة"""
+        with self.app.app_context():
+            outcome = run_job('sample', triggered_by='manual:admin')
+
+            self.assertTrue(outcome['success'])
+            run = JobRun.query.filter_by(job_name='sample').one()
+            self.assertEqual(run.status, 'success')
+            self.assertEqual(run.rows_affected, 4)
+            self.assertIsNotNone(run.duration_ms)
+            self.assertEqual(run.triggered_by, 'manual:admin')
+            self.assertIsNone(db.session.get(JobLock, 'sample'))
+
+    def test_failed_job_is_recorded(self):
+        """تسجيل فشل المهمة مع رسالة الخطأ"""
+        with self.app.app_context():
+            outcome = run_job('broken')
+
+            self.assertFalse(outcome['success'])
+            run = JobRun.query.filter_by(job_name='broken').one()
+            self.assertEqual(run.status, 'failed')
+            self.assertIn('division by zero', run.error_message)
+
+    def test_concurrent_run_is_skipped(self):
+        """لا تعمل المهمة إذا كانت قيد التشغيل في نسخة أخرى"""
+        with self.app.app_context():
+            holder = DistributedLock('sample', 60)
+            holder.acquire()
+
+            outcome = run_job('sample')
+
+            self.assertTrue(outcome['skipped'])
+            self.assertEqual(self.calls, [])
+            holder.release()
+
+    def test_scheduled_slot_runs_once(self):
+        """الموعد المجدول لا يُنفَّذ أكثر من مرة عبر جميع النسخ"""
+        with self.app.app_context():
+            slot = datetime(2026, 1, 5, 2, 0)
+
+            first = run_due_jobs(slot)
+            second = run_due_jobs(slot)
+
+            self.assertEqual(list(first), ['sample'])
+            self.assertTrue(first['sample']['success'])
+            self.assertTrue(second['sample']['skipped'])
+            self.assertEqual(len(self.calls), 1)
+            self.assertEqual(run_due_jobs(datetime(2026, 1, 5, 3, 0)), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,348 @@
+"""
+اختبارات الإشعارات (Notification Tests)
+تتضمن:
+- تجميع الإشعارات غير الحرجة في ملخص (Digest)
+- تجاوز الإشعارات الحرجة للتجميع
+- عداد الإشعارات غير المقروءة ومطابقته
+- بث الإشعارات الفوري (SSE) والاستئناف عبر Last-Event-ID
+- تذكرة البث القصيرة مقبولة لمسار البث فقط
+"""
+import unittest
+from unittest import mock
+import sys
+import os
+import jwt
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.database.db import db
+from src.main import app
+from src.models.complaint import User, Role, Notification
+from src.services import job_queue, notification_stream
+from src.routes.auth import create_stream_ticket
+from src.services.notification_service import NotificationService
+from src.services.scheduler import reconcile_unread_notification_counts
+from werkzeug.security import generate_password_hash
+
+
+class FakeRedis:
+    """Minimal in-memory Redis list implementation for digest tests"""
+
+    def __init__(self):
+        self.lists = {}
+
+    def rpush(self, key, value):
+        self.lists.setdefault(key, []).append(value)
+        return len(self.lists[key])
+
+    def lrem(self, key, count, value):
+        self.lists.get(key, []).remove(value)
+
+    def pipeline(self):
+        redis = self
+
+        class Pipeline:
+            def __init__(self):
+                self.ops = []
+
+            def lrange(self, key, start, end):
+                self.ops.append(lambda: list(redis.lists.get(key, [])))
+
+            def delete(self, key):
+                self.ops.append(lambda: redis.lists.pop(key, None) is not None)
+
+            def execute(self):
+                return [op() for op in self.ops]
+
+        return Pipeline()
+
+
+class TestNotificationDigest(unittest.TestCase):
+    """اختبار تجميع الإشعارات"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = app
+        cls.app.config['TESTING'] = True
+        cls.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    def setUp(self):
+        self.redis = FakeRedis()
+        self.scheduled = []
+
+        def fake_enqueue_digest_flush(user_id, channel, delay_seconds):
+            self.scheduled.append((user_id, channel, delay_seconds))
+            return {'success': True, 'job_id': 'job-1'}
+
+        self.patches = [
+            mock.patch.object(job_queue, 'use_redis', True),
+            mock.patch.object(job_queue, 'redis_conn', self.redis),
+            mock.patch.object(job_queue, 'enqueue_digest_flush', fake_enqueue_digest_flush),
+            mock.patch.object(NotificationService, 'DIGEST_WINDOW_SECONDS', 300),
+        ]
+        for patch in self.patches:
+            patch.start()
+
+        with self.app.app_context():
+            db.create_all()
+
+            if not Role.query.filter_by(role_name='Trader').first():
+                db.session.add(Role(role_id=1, role_name='Trader', description='تاجر'))
+                db.session.commit()
+
+            if not User.query.filter_by(username='digest_trader').first():
+                db.session.add(User(
+                    username='digest_trader',
+                    email='digest@test.com',
+                    password_hash=generate_password_hash('password123'),
+                    full_name='تاجر الملخص',
+                    role_id=1
+                ))
+                db.session.commit()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_non_critical_notifications_are_buffered(self):
+        """الإشعارات غير الحرجة تُجمَّع ويُجدول إرسالها مرة واحدة"""
+        with self.app.app_context():
+            user = User.query.filter_by(username='digest_trader').first()
+
+            for i in range(3):
+                NotificationService.queue_notification(
+                    user=user,
+                    notification_type='complaint_status_changed',
+                    message=f'تحديث {i}',
+                    channel='email'
+                )
+
+            pending = Notification.query.filter_by(user_id=user.user_id, status='digest_pending').count()
+            self.assertEqual(pending, 3)
+            self.assertEqual(len(self.scheduled), 1)
+            self.assertEqual(self.scheduled[0][1], 'email')
+
+    def test_critical_notifications_bypass_digest(self):
+        """الإشعارات الحرجة تُرسل فوراً دون تجميع"""
+        with self.app.app_context():
+            user = User.query.filter_by(username='digest_trader').first()
+
+            notification = NotificationService.queue_notification(
+                user=user,
+                notification_type='account_locked',
+                message='تم قفل حسابك',
+                channel='email'
+            )
+
+            self.assertEqual(self.scheduled, [])
+            self.assertNotEqual(notification.status, 'digest_pending')
+
+    def test_flush_sends_single_digest_email(self):
+        """تفريغ الملخص يرسل بريداً واحداً لجميع الإشعارات المجمعة"""
+        with self.app.app_context():
+            user = User.query.filter_by(username='digest_trader').first()
+
+            for i in range(3):
+                NotificationService.queue_notification(
+                    user=user,
+                    notification_type='complaint_status_changed',
+                    message=f'تحديث {i}',
+                    channel='email'
+                )
+
+            with mock.patch.object(NotificationService, 'send_email', return_value={'success': True, 'error': None}) as send_email:
+                result = NotificationService.flush_digest(user.user_id, 'email')
+
+            self.assertEqual(result['delivered'], 3)
+            self.assertEqual(send_email.call_count, 1)
+            self.assertEqual(send_email.call_args[0][2], 'notification_digest')
+
+            sent = Notification.query.filter_by(user_id=user.user_id, status='sent').count()
+            self.assertEqual(sent, 3)
+
+
+class TestUnreadNotificationCounter(unittest.TestCase):
+    """اختبار عداد الإشعارات غير المقروءة"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = app
+        cls.app.config['TESTING'] = True
+        cls.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    def setUp(self):
+        with self.app.app_context():
+            db.create_all()
+
+            if not Role.query.filter_by(role_name='Trader').first():
+                db.session.add(Role(role_id=1, role_name='Trader', description='تاجر'))
+                db.session.commit()
+
+            if not User.query.filter_by(username='counter_trader').first():
+                db.session.add(User(
+                    username='counter_trader',
+                    email='counter@test.com',
+                    password_hash=generate_password_hash('password123'),
+                    full_name='تاجر العداد',
+                    role_id=1
+                ))
+                db.session.commit()
+
+    def tearDown(self):
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def _add_notifications(self, user, count):
+        for i in range(count):
+            db.session.add(Notification(user_id=user.user_id, message=f'إشعار {i}', type='new_comment'))
+        db.session.commit()
+
+    def test_insert_and_mark_read_update_counter(self):
+        """الإدراج يزيد العداد والتحديد كمقروء ينقصه"""
+        with self.app.app_context():
+            user = User.query.filter_by(username='counter_trader').first()
+            self._add_notifications(user, 3)
+
+            self.assertEqual(db.session.get(User, user.user_id).unread_notifications_count, 3)
+
+            notification = Notification.query.filter_by(user_id=user.user_id).first()
+            self.assertEqual(NotificationService.mark_read(user.user_id, notification.notification_id), 1)
+            self.assertEqual(NotificationService.mark_read(user.user_id, notification.notification_id), 0)
+            db.session.commit()
+
+            self.assertEqual(db.session.get(User, user.user_id).unread_notifications_count, 2)
+
+            NotificationService.mark_read(user.user_id)
+            db.session.commit()
+
+            self.assertEqual(db.session.get(User, user.user_id).unread_notifications_count, 0)
+
+    def test_reconciliation_repairs_drift(self):
+        """المطابقة اليومية تصلح أي انحراف في العداد"""
+        with self.app.app_context():
+            user = User.query.filter_by(username='counter_trader').first()
+            self._add_notifications(user, 2)
+
+            User.query.filter_by(user_id=user.user_id).update({'unread_notifications_count': 7})
+            db.session.commit()
+
+            result = reconcile_unread_notification_counts()
+
+            self.assertTrue(result['success'])
+            self.assertEqual(result['repaired_count'], 1)
+            self.assertEqual(db.session.get(User, user.user_id).unread_notifications_count, 2)
+
+
+
+class TestNotificationStream(unittest.TestCase):
+    """اختبار بث الإشعارات الفوري"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.app = app
+        cls.app.config['TESTING'] = True
+        cls.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+
+    def setUp(self):
+        self.patch = mock.patch.object(job_queue, 'use_redis', False)
+        self.patch.start()
+
+        with self.app.app_context():
+            db.create_all()
+
+            if not Role.query.filter_by(role_name='Trader').first():
+                db.session.add(Role(role_id=1, role_name='Trader', description='تاجر'))
+                db.session.commit()
+
+            if not User.query.filter_by(username='stream_trader').first():
+                db.session.add(User(
+                    username='stream_trader',
+                    email='stream@test.com',
+                    password_hash=generate_password_hash('password123'),
+                    full_name='تاجر البث',
+                    role_id=1
+                ))
+                db.session.commit()
+
+    def tearDown(self):
+        self.patch.stop()
+
+        with self.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_committed_notifications_are_published(self):
+        """الإشعار يُنشر للمشتركين بعد تأكيد المعاملة فقط"""
+        with self.app.app_context():
+            user = User.query.filter_by(username='stream_trader').first()
+            subscriber = notification_stream.broker.subscribe(user.user_id)
+
+            try:
+                db.session.add(Notification(user_id=user.user_id, message='ملغى', type='new_comment'))
+                db.session.flush()
+                db.session.rollback()
+                self.assertTrue(subscriber.empty())
+
+                db.session.add(Notification(user_id=user.user_id, message='جديد', type='new_comment'))
+                db.session.commit()
+
+                payload = subscriber.get_nowait()
+                self.assertEqual(payload['message'], 'جديد')
+                self.assertTrue(subscriber.empty())
+            finally:
+                notification_stream.broker.unsubscribe(user.user_id, subscriber)
+
+    def test_stream_replays_after_last_event_id(self):
+        """الاستئناف يعيد إرسال الإشعارات التالية لآخر حدث استلمه العميل"""
+        with self.app.app_context():
+            user = User.query.filter_by(username='stream_trader').first()
+            notifications = [
+                Notification(user_id=user.user_id, message=f'إشعار {i}', type='new_comment',
+                             created_at=datetime(2024, 1, 1, 12, i))
+                for i in range(3)
+            ]
+            db.session.add_all(notifications)
+            db.session.commit()
+            first_id = notifications[0].notification_id
+
+            with mock.patch.object(notification_stream, 'MAX_STREAM_SECONDS', 0):
+                frames = list(notification_stream.stream_notifications(user.user_id, first_id))
+
+            self.assertTrue(frames[0].startswith('retry:'))
+            self.assertEqual(len(frames), 3)
+            self.assertIn('إشعار 1', frames[1])
+            self.assertIn('إشعار 2', frames[2])
+            self.assertNotIn(f'id: {first_id}', ''.join(frames))
+
+    def test_stream_ticket_only_opens_stream(self):
+        """تذكرة البث لا تفتح إلا مسار البث، ورمز الوصول لا يقبل في الرابط"""
+        with self.app.app_context():
+            user = User.query.filter_by(username='stream_trader').first()
+            ticket = create_stream_ticket(user.user_id)
+            access_token = jwt.encode({'user_id': user.user_id}, self.app.config['SECRET_KEY'], algorithm='HS256')
+
+        client = self.app.test_client()
+        stream_headers = {'Accept': 'text/event-stream'}
+
+        # Authenticated, then stopped by the trader's missing subscription
+        response = client.get(f'/api/notifications/stream?ticket={ticket}', headers=stream_headers)
+        self.assertEqual(response.status_code, 403)
+
+        response = client.get(f'/api/notifications/stream?access_token={access_token}', headers=stream_headers)
+        self.assertEqual(response.status_code, 401)
+        response = client.get(f'/api/notifications/stream?ticket={access_token}', headers=stream_headers)
+        self.assertEqual(response.status_code, 401)
+        response = client.get('/api/notifications/unread-count', headers={'Authorization': f'Bearer {ticket}'})
+        self.assertEqual(response.status_code, 401)
+        response = client.get(f'/api/notifications/unread-count?ticket={ticket}', headers=stream_headers)
+        self.assertEqual(response.status_code, 401)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,106 @@
+"""
+اختبارات مجمّع توليد PDF (PDF Render Pool Tests)
+تتضمن:
+- رفض الطلبات عند امتلاء قائمة الانتظار وتحرير الأماكن بعد الانتهاء
+- مهلة التوليد داخل العامل دون إيقاف بقية العمليات
+- استبدال المجمّع العالق بعد انتهاء عمليات التوليد الأخرى
+"""
+import unittest
+from unittest import mock
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+import sys
+import os
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.services import pdf_renderer
+from src.services.pdf_renderer import RenderPool, RenderQueueFull, RenderTimeout
+
+
+class TestRenderPool(unittest.TestCase):
+    """اختبار المجمّع باستخدام منفّذ خيوط بدل عمليات WeasyPrint"""
+
+    def setUp(self):
+        self.release = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+        def fake_render(html, base_url=None):
+            self.release.wait(5)
+            return f'%PDF {html}'.encode()
+
+        patches = [
+            mock.patch.object(pdf_renderer, 'render_html', fake_render),
+            mock.patch.object(RenderPool, '_get_executor', return_value=self.executor),
+        ]
+        for patcher in patches:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def tearDown(self):
+        self.release.set()
+        self.executor.shutdown(wait=True)
+
+    def test_queue_full(self):
+        """يُرفض التوليد عند امتلاء قائمة الانتظار ويتحرر المكان بعد الانتهاء"""
+        pool = RenderPool(workers=1, max_pending=1)
+        first = pool.submit('a')
+
+        with self.assertRaises(RenderQueueFull):
+            pool.submit('b', queue_timeout=0.05)
+
+        self.release.set()
+        self.assertEqual(pool.result(first), b'%PDF a')
+        self.assertEqual(pool.result(pool.submit('c', queue_timeout=1)), b'%PDF c')
+
+    def test_render_timeout_resets_pool(self):
+        """تجاوز المهلة يرفع RenderTimeout ويستبدل المنفّذ"""
+        pool = RenderPool(workers=1, max_pending=2)
+        future = pool.submit('slow')
+
+        with mock.patch.object(pool, '_reset') as reset:
+            with self.assertRaises(RenderTimeout):
+                pool.result(future, timeout=0.05)
+        reset.assert_called_once_with(self.executor, future)
+
+    def test_stuck_pool_retires_after_other_renders(self):
+        """العمليات الأخرى تكتمل قبل إيقاف عمليات المجمّع العالق"""
+        pool = RenderPool(workers=2, max_pending=4)
+        stuck = pool.submit('stuck')
+        other = pool.submit('other')
+        process = mock.Mock()
+        self.executor._processes = {1: process}
+        pool._executor = self.executor
+
+        pool._reset(self.executor, stuck)
+        self.assertIsNone(pool._executor)
+        time.sleep(0.1)
+        process.kill.assert_not_called()
+
+        self.release.set()
+        self.assertEqual(pool.result(other), b'%PDF other')
+        for _ in range(50):
+            if process.kill.called:
+                break
+            time.sleep(0.02)
+        process.kill.assert_called_once_with()
+
+
+class TestRenderTimeout(unittest.TestCase):
+    """اختبار إيقاف التوليد الطويل داخل العامل نفسه"""
+
+    def test_worker_aborts_slow_render(self):
+        """العامل يوقف التوليد بعد المهلة ويبقى صالحاً للتوليد التالي"""
+        with mock.patch.object(pdf_renderer, 'render_html', lambda html, base_url=None: time.sleep(5)):
+            started = time.monotonic()
+            with self.assertRaises(RenderTimeout):
+                pdf_renderer.render_with_timeout('slow', timeout=0.1)
+            self.assertLess(time.monotonic() - started, 2)
+
+        with mock.patch.object(pdf_renderer, 'render_html', lambda html, base_url=None: b'%PDF'):
+            self.assertEqual(pdf_renderer.render_with_timeout('fast', timeout=0.1), b'%PDF')
+
+
+if __name__ == '__main__':
+    unittest.main()
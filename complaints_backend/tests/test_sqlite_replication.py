@@ -0,0 +1,195 @@
+"""
+اختبارات النسخ المتماثل المستمر لقاعدة SQLite (SQLite WAL Replication Tests)
+تتضمن:
+- شحن إطارات سجل WAL المؤكدة فقط إلى التخزين
+- التوقف عند أول إطار لا يطابق مجموعه التراكمي (checksum)
+- الاستعادة إلى آخر حالة وإلى نقطة زمنية محددة
+- عدم فقدان إطارات عند نقاط الحفظ (checkpoint) الخارجية
+- حذف النسخ الأقدم من فترة الاحتفاظ
+"""
+import unittest
+import sys
+import os
+import time
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.core.storage import LocalStorage
+from src.services.sqlite_replication import FRAME_HEADER_SIZE, SQLiteReplicator, list_generations, restore
+
+
+class TestSQLiteReplication(unittest.TestCase):
+    """اختبار شحن سجل WAL والاستعادة منه"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.tmpdir, 'app.db')
+        self.storage = LocalStorage(os.path.join(self.tmpdir, 'replica'))
+
+        self.app = sqlite3.connect(self.db_path, isolation_level=None)
+        self.app.execute('CREATE TABLE complaints (complaint_id INTEGER PRIMARY KEY, title TEXT)')
+        self.insert(50)
+
+        self.replicator = SQLiteReplicator(self.db_path, self.storage)
+        self.replicator.start()
+
+    def tearDown(self):
+        self.replicator.close()
+        self.app.close()
+        shutil.rmtree(self.tmpdir)
+
+    def insert(self, count):
+        with self.app:
+            self.app.execute('BEGIN')
+            self.app.executemany(
+                'INSERT INTO complaints (title) VALUES (?)',
+                [(f'شكوى {i} ' + 'x' * 500,) for i in range(count)]
+            )
+            self.app.execute('COMMIT')
+
+    def restored_count(self, **kwargs):
+        target = os.path.join(self.tmpdir, 'restored.db')
+        result = restore(self.storage, target, **kwargs)
+        connection = sqlite3.connect(target)
+        try:
+            self.assertEqual(connection.execute('PRAGMA quick_check').fetchone()[0], 'ok')
+            count = connection.execute('SELECT COUNT(*) FROM complaints').fetchone()[0]
+        finally:
+            connection.close()
+        os.remove(target)
+        return count, result
+
+    def test_restore_latest(self):
+        """الاستعادة تعيد اللقطة ثم كل المقاطع المشحونة"""
+        self.insert(100)
+        self.assertGreater(self.replicator.sync(), 0)
+        self.assertEqual(self.replicator.sync(), 0)
+        self.insert(30)
+        self.replicator.sync()
+
+        count, result = self.restored_count()
+        self.assertEqual(count, 180)
+        self.assertEqual(result['segments'], 2)
+
+    def test_open_transaction_is_not_shipped(self):
+        """المعاملة غير المؤكدة لا تشحن"""
+        # A tiny page cache spills the open transaction's pages into the WAL
+        self.app.execute('PRAGMA cache_size=1')
+        self.app.execute('BEGIN')
+        self.app.executemany('INSERT INTO complaints (title) VALUES (?)', [('x' * 5000,)] * 20)
+        self.assertGreater(os.path.getsize(self.replicator.wal_path), 10 * 5000)
+        self.replicator.sync()
+        self.app.execute('ROLLBACK')
+
+        count, _ = self.restored_count()
+        self.assertEqual(count, 50)
+
+    def test_point_in_time_restore(self):
+        """الاستعادة إلى نقطة زمنية تتجاهل ما شحن بعدها"""
+        self.insert(100)
+        self.replicator.sync()
+        time.sleep(0.01)
+        point = datetime.utcnow()
+        time.sleep(0.01)
+        self.insert(25)
+        self.replicator.sync()
+
+        self.assertEqual(self.restored_count(timestamp=point)[0], 150)
+        self.assertEqual(self.restored_count()[0], 175)
+
+    def test_checkpoint_restarts_wal_without_gaps(self):
+        """نقطة الحفظ الخاصة بالناسخ تعيد بدء السجل دون فقدان إطارات"""
+        self.insert(100)
+        self.assertTrue(self.replicator.checkpoint())
+        generation = self.replicator.generation
+
+        # The next writer restarts the WAL from its first frame
+        self.insert(40)
+        self.replicator.sync()
+        self.assertEqual(self.replicator.generation, generation)
+        self.insert(10)
+        self.replicator.sync()
+
+        self.assertEqual(self.restored_count()[0], 200)
+
+    def test_checkpoint_then_open_transaction(self):
+        """سجل أعيد بدؤه بمعاملة مفتوحة يشحن بعد تأكيدها"""
+        self.insert(100)
+        self.assertTrue(self.replicator.checkpoint())
+
+        self.app.execute('PRAGMA cache_size=1')
+        self.app.execute('BEGIN')
+        self.app.executemany('INSERT INTO complaints (title) VALUES (?)', [('x' * 5000,)] * 20)
+        self.assertEqual(self.replicator.sync(), 0)
+        self.app.execute('COMMIT')
+        self.assertGreater(self.replicator.sync(), 0)
+
+        self.assertEqual(self.restored_count()[0], 170)
+
+    def test_stops_at_frame_with_bad_checksum(self):
+        """الإطار التالف لا يشحن ولا أي إطار بعده"""
+        self.insert(100)
+        self.replicator.sync()
+        self.insert(10)
+        self.insert(10)
+
+        # Tear the first unshipped frame, as a crash during its write would
+        with open(self.replicator.wal_path, 'r+b') as wal:
+            wal.seek(self.replicator.offset + FRAME_HEADER_SIZE + 100)
+            byte = wal.read(1)[0]
+            wal.seek(-1, os.SEEK_CUR)
+            wal.write(bytes([byte ^ 0xFF]))
+
+        self.assertEqual(self.replicator.sync(), 0)
+        self.assertEqual(self.restored_count()[0], 150)
+
+    def test_external_checkpoint_cannot_reset_unshipped_wal(self):
+        """نقطة حفظ من اتصال التطبيق لا تحذف إطارات لم تشحن بعد"""
+        self.insert(100)
+        self.app.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+        self.insert(20)
+        self.replicator.sync()
+
+        self.assertEqual(self.restored_count()[0], 170)
+
+    def test_new_snapshot_starts_replay(self):
+        """اللقطة الجديدة تصبح نقطة بداية الإعادة"""
+        self.insert(100)
+        self.replicator.sync()
+        self.replicator.snapshot()
+        self.insert(5)
+        self.replicator.sync()
+
+        count, result = self.restored_count()
+        self.assertEqual(count, 155)
+        self.assertEqual(result['segments'], 1)
+
+    def test_retention_keeps_restore_window(self):
+        """حذف النسخ القديمة مع إبقاء ما يلزم لاستعادة فترة الاحتفاظ"""
+        self.insert(10)
+        self.replicator.sync()
+        old_generation = self.replicator.generation
+
+        now = time.time()
+        with mock.patch('src.services.sqlite_replication.time.time', return_value=now + 3600):
+            self.replicator._new_generation()
+            self.insert(10)
+            self.replicator.sync()
+
+        self.replicator.retention_hours = 1
+        with mock.patch('src.services.sqlite_replication.time.time', return_value=now + 5400):
+            self.assertEqual(self.replicator.enforce_retention(), 0)
+        with mock.patch('src.services.sqlite_replication.time.time', return_value=now + 7260):
+            self.assertEqual(self.replicator.enforce_retention(), 2)
+
+        self.assertNotIn(old_generation, list_generations(self.storage, self.replicator.prefix))
+        self.assertEqual(self.restored_count()[0], 70)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,32 +1,222 @@
 #!/usr/bin/env python
 """
-Background worker for processing notification and maintenance jobs
+Background worker supervisor for processing notification and maintenance jobs
 Run with: python worker.py
+
+Forks a pool of RQ worker processes per group of queues and scales each pool
+between its minimum and maximum size from queue depth and head-of-line wait.
+Workers exit after WORKER_MAX_JOBS jobs and are replaced, which caps memory
+growth. SIGTERM/SIGINT stop the supervisor gracefully: every worker finishes
+its current job before exiting.
+
+Configuration:
+    WORKER_POOLS              Pools as "queues=min-max" separated by ';'
+                              (default: "critical,interactive,notifications=1-4;bulk,maintenance=1-8")
+    WORKER_MAX_JOBS           Jobs processed by a worker before it is recycled (default: 500)
+    WORKER_JOBS_PER_PROCESS   Queued jobs per worker process when scaling (default: 20)
+    WORKER_SCALE_UP_WAIT      Head-of-line wait in seconds that adds a worker (default: 30)
+    WORKER_SCALE_INTERVAL     Seconds between scaling decisions (default: 5)
+    WORKER_SHUTDOWN_TIMEOUT   Seconds to wait for workers on shutdown (default: 60)
 """
 import os
 import sys
+import math
+import time
+import signal
+import multiprocessing
+from datetime import datetime, timezone
 
 sys.path.insert(0, os.path.dirname(__file__))
 
 from redis import Redis
-from rq import Worker, Queue, Connection
+from rq import Worker, Queue
 
 redis_url = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
 
+DEFAULT_POOLS = 'critical,interactive,notifications=1-4;bulk,maintenance=1-8'
+MAX_JOBS = int(os.environ.get('WORKER_MAX_JOBS', 500))
+JOBS_PER_PROCESS = int(os.environ.get('WORKER_JOBS_PER_PROCESS', 20))
+SCALE_UP_WAIT = float(os.environ.get('WORKER_SCALE_UP_WAIT', 30))
+SCALE_INTERVAL = float(os.environ.get('WORKER_SCALE_INTERVAL', 5))
+SHUTDOWN_TIMEOUT = float(os.environ.get('WORKER_SHUTDOWN_TIMEOUT', 60))
+
+
+def run_worker(queue_names, max_jobs):
+    """Worker process entry point: own Redis connection, exits after max_jobs"""
+    connection = Redis.from_url(redis_url)
+    queues = [Queue(name, connection=connection) for name in queue_names]
+    worker = Worker(queues, connection=connection)
+    worker.work(with_scheduler=True, max_jobs=max_jobs)
+
+
+class WorkerPool:
+    """A group of worker processes consuming the same queues, in priority order"""
+
+    def __init__(self, queue_names, min_size, max_size):
+        if min_size < 0 or max_size < max(min_size, 1):
+            raise ValueError(f'Invalid pool size {min_size}-{max_size} for {",".join(queue_names)}')
+
+        self.queue_names = queue_names
+        self.min_size = min_size
+        self.max_size = max_size
+        self.processes = []
+        self.draining = []
+
+    @classmethod
+    def parse(cls, spec):
+        """Build pools from a WORKER_POOLS specification"""
+        pools = []
+        for entry in filter(None, (part.strip() for part in spec.split(';'))):
+            queues, _, sizes = entry.partition('=')
+            min_size, _, max_size = (sizes or '1-1').partition('-')
+            pools.append(cls(
+                [name.strip() for name in queues.split(',') if name.strip()],
+                int(min_size),
+                int(max_size or min_size)
+            ))
+        return pools
+
+    @property
+    def name(self):
+        return ','.join(self.queue_names)
+
+    def desired_size(self, depth, oldest_wait):
+        """
+        Number of processes for the current backlog
+
+        Args:
+            depth: Jobs waiting across the pool's queues
+            oldest_wait: Seconds the oldest waiting job has been queued (None if empty)
+        """
+        current = len(self.processes)
+        desired = math.ceil(depth / JOBS_PER_PROCESS)
+
+        if oldest_wait is not None and oldest_wait > SCALE_UP_WAIT:
+            desired = max(desired, current + 1)
+        elif desired < current:
+            # Scale down one process per interval to avoid flapping
+            desired = current - 1
+
+        return max(self.min_size, min(self.max_size, desired))
+
+    @staticmethod
+    def _alive(processes):
+        alive = []
+        for process in processes:
+            if process.is_alive():
+                alive.append(process)
+            else:
+                process.join()
+        return alive
+
+    def reap(self):
+        """Forget processes that exited (recycled after MAX_JOBS, crashed or drained)"""
+        self.processes = self._alive(self.processes)
+        self.draining = self._alive(self.draining)
+
+    def resize(self, size):
+        while len(self.processes) < size:
+            process = multiprocessing.Process(
+                target=run_worker,
+                args=(self.queue_names, MAX_JOBS),
+                name=f'rq-worker[{self.name}]'
+            )
+            process.start()
+            self.processes.append(process)
+
+        while len(self.processes) > size:
+            # Warm shutdown: RQ finishes the current job on SIGTERM
+            process = self.processes.pop()
+            os.kill(process.pid, signal.SIGTERM)
+            self.draining.append(process)
+
+
+class WorkerSupervisor:
+    """Scales worker pools and shuts them down gracefully"""
+
+    def __init__(self, pools, connection):
+        self.pools = pools
+        self.connection = connection
+        self.stopping = False
+
+    def queue_stats(self, pool):
+        """Total depth and oldest job wait across a pool's queues"""
+        depth = 0
+        oldest_wait = None
+        now = datetime.now(timezone.utc)
+
+        for name in pool.queue_names:
+            queue = Queue(name, connection=self.connection)
+            depth += queue.count
+
+            head = queue.get_job_ids(0, 1)
+            job = queue.fetch_job(head[0]) if head else None
+            if job and job.enqueued_at:
+                wait = (now - job.enqueued_at).total_seconds()
+                oldest_wait = wait if oldest_wait is None else max(oldest_wait, wait)
+
+        return depth, oldest_wait
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        for pool in self.pools:
+            print(f'Pool [{pool.name}]: {pool.min_size}-{pool.max_size} workers')
+            pool.resize(pool.min_size)
+
+        while not self.stopping:
+            for pool in self.pools:
+                pool.reap()
+                try:
+                    depth, oldest_wait = self.queue_stats(pool)
+                    size = pool.desired_size(depth, oldest_wait)
+                except Exception as e:
+                    print(f'Failed to read queue stats for [{pool.name}]: {str(e)}')
+                    size = max(pool.min_size, len(pool.processes))
+
+                if size != len(pool.processes):
+                    print(f'Scaling [{pool.name}] from {len(pool.processes)} to {size} workers')
+                pool.resize(size)
+
+            time.sleep(SCALE_INTERVAL)
+
+        self.shutdown()
+
+    def shutdown(self):
+        print('Stopping workers...')
+        # Draining workers already received SIGTERM; a second one would force a cold shutdown
+        for pool in self.pools:
+            for process in pool.processes:
+                if process.is_alive():
+                    os.kill(process.pid, signal.SIGTERM)
+
+        processes = [process for pool in self.pools for process in pool.processes + pool.draining]
+
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for process in processes:
+            process.join(max(0, deadline - time.monotonic()))
+            if process.is_alive():
+                print(f'Worker {process.pid} did not stop in time, killing it')
+                process.kill()
+                process.join()
+
+
 if __name__ == '__main__':
     try:
         redis_conn = Redis.from_url(redis_url)
         redis_conn.ping()
-        
-        with Connection(redis_conn):
-            queues = ['notifications', 'maintenance']
-            worker = Worker(queues)
-            
-            print(f'Starting RQ worker for queues: {", ".join(queues)}')
-            print(f'Redis URL: {redis_url}')
-            
-            worker.work()
-            
+
+        pools = WorkerPool.parse(os.environ.get('WORKER_POOLS', DEFAULT_POOLS))
+
+        print(f'Starting RQ worker supervisor with {len(pools)} pools')
+        print(f'Redis URL: {redis_url}')
+
+        WorkerSupervisor(pools, redis_conn).run()
+
     except Exception as e:
         print(f'Failed to start worker: {str(e)}')
         print('Make sure Redis is running and REDIS_URL is configured correctly')
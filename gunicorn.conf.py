@@ -0,0 +1,11 @@
+"""
+Gunicorn hooks, loaded automatically when gunicorn starts from this directory
+
+Threads must not run in the --preload master: workers would be forked while
+they hold locks. Each worker starts its own background tasks once it is up.
+"""
+
+
+def post_worker_init(worker):
+    from src.main import start_background_tasks
+    start_background_tasks(worker.wsgi)
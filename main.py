@@ -3,7 +3,8 @@ import os
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'complaints_backend'))
 
-from src.main import app  # type: ignore
+from src.main import app, start_background_tasks  # type: ignore
 
 if __name__ == '__main__':
+    start_background_tasks(app)
     app.run()